@@ -3,7 +3,9 @@
 """
 
 from abc import ABC, abstractmethod
+import os
 from collections import namedtuple
+from typing import Iterator, Optional
 
 from reportlab.lib.units import mm
 from reportlab.pdfgen.canvas import Canvas
@@ -19,26 +21,73 @@ class BaseReportRenderer(ABC):
     def __init__(
             self,
             pdf_file_path: str,
-            page_size: tuple[float, float]
+            page_size: tuple[float, float],
+            max_pages_per_file: Optional[int] = None
     ):
-        self._canvas = Canvas(
-            filename=pdf_file_path,
-            pagesize=page_size
-        )
+        """
+        :param max_pages_per_file: Сколько страниц записывать в один файл.
+            reportlab держит в памяти все готовые страницы до сохранения файла,
+            поэтому для многостраничных отчётов с ограниченным расходом памяти
+            отчёт разбивается на несколько файлов: первый - pdf_file_path,
+            следующие - с номером части в имени, например report_002.pdf.
+            None - все страницы в одном файле.
+        """
+        if max_pages_per_file is not None and max_pages_per_file < 1:
+            raise ValueError("max_pages_per_file must be positive")
+        self._pdf_file_path = pdf_file_path
+        self._page_size = page_size
+        self._max_pages_per_file = max_pages_per_file
+        # Пути к записанным файлам отчёта
+        self.file_paths: list[str] = []
+        self._start_file()
         self._page_width_pt, self._page_height_pt = page_size
         self._page_margin_pt = 10 * mm
 
+    def _start_file(self) -> None:
+        self._canvas_file_path = self._get_part_file_path(len(self.file_paths))
+        self._canvas = Canvas(
+            filename=self._canvas_file_path,
+            pagesize=self._page_size
+        )
+
+    def _get_part_file_path(self, part_index: int) -> str:
+        if part_index == 0:
+            return self._pdf_file_path
+        root, extension = os.path.splitext(self._pdf_file_path)
+        return f"{root}_{part_index + 1:03d}{extension}"
+
     def render_and_save(self) -> None:
         """
-        Шаблонный метод для создания одностраничного отчёта.
+        Шаблонный метод для создания отчёта.
 
         Все операции по наполнению страницы в подклассах
         добавляются в метод _draw_content.
+        Многостраничные отчёты переопределяют метод _draw_pages.
+        """
+        num_file_pages = 0
+        for _ in self._draw_pages():
+            self._canvas.showPage()
+            num_file_pages += 1
+            if self._max_pages_per_file is not None and num_file_pages >= self._max_pages_per_file:
+                # Следующая страница начинается в новом файле; если её не будет, файл не сохраняется
+                self._save_canvas()
+                self._start_file()
+                num_file_pages = 0
+        if num_file_pages > 0 or not self.file_paths:
+            self._save_canvas()
+
+    def _save_canvas(self) -> None:
+        self._canvas.save()
+        self.file_paths.append(self._canvas_file_path)
+
+    def _draw_pages(self) -> Iterator[None]:
+        """
+        Наполняет страницы отчёта по очереди.
+        После наполнения каждой страницы нужно вернуть управление (yield),
+        и страница будет завершена. По умолчанию отчёт одностраничный.
         """
         self._draw_content()
-        c = self._canvas
-        c.showPage()
-        c.save()
+        yield
 
     @abstractmethod
     def _draw_content(self) -> None:
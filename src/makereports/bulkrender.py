@@ -0,0 +1,216 @@
+"""
+Скрипт для массового создания отчётов в нескольких процессах.
+После запуска он создаст заданное количество отчётов со случайными данными
+в папке pdf_storage/bulk (или в указанной папке) и выведет скорость создания.
+
+Данные отчётов (TableReportData или ChartReportData) передаются в процессы пачками,
+а шрифты регистрируются один раз при запуске каждого процесса, а не для каждого отчёта.
+Данные читаются из переданного итератора по мере создания отчётов,
+поэтому их можно генерировать на лету, не держа в памяти все сразу.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional, Union
+
+from reportlab.lib.pagesizes import A4, landscape, portrait
+
+import pdf_storage
+from makereports.chartsreport import ChartReportData, ChartsReportDataGenerator, ChartsReportRenderer
+from makereports.fontstyles import DEFAULT_FONT_CACHE_DIR, register_fonts
+from makereports.tablereport import TableReportData, TableReportDataGenerator, TableReportRenderer
+
+OUTPUT_DIR_PATH = str(pdf_storage.PDF_STORAGE_PATH / "bulk")
+DEFAULT_FILE_NAME_TEMPLATE = "report_{index:06d}.pdf"
+DEFAULT_BATCH_SIZE = 16
+# Как часто выводить промежуточную скорость, в секундах
+PROGRESS_INTERVAL_S = 5.0
+
+ReportData = Union[TableReportData, ChartReportData]
+
+
+@dataclass
+class RenderResult:
+    """
+    Результат создания одного отчёта.
+    Содержит только простые типы, чтобы его можно было передать между процессами.
+    """
+    index: int
+    file_path: str
+    error: Optional[str] = None
+    elapsed_s: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+@dataclass
+class BulkRenderStats:
+    """
+    Итоги массового создания отчётов.
+    """
+    num_reports: int = 0
+    num_failed: int = 0
+    elapsed_s: float = 0.0
+
+    @property
+    def reports_per_second(self) -> float:
+        return self.num_reports / self.elapsed_s if self.elapsed_s > 0 else 0.0
+
+
+def render_report(report_data: ReportData, pdf_file_path: str) -> None:
+    """
+    Создаёт один отчёт с тем же размером страницы, что и в скриптах tablereport.py и chartsreport.py.
+    """
+    if isinstance(report_data, TableReportData):
+        renderer = TableReportRenderer(report_data, pdf_file_path, landscape(A4))
+    elif isinstance(report_data, ChartReportData):
+        renderer = ChartsReportRenderer(report_data, pdf_file_path, portrait(A4))
+    else:
+        raise TypeError(f"Неизвестный тип данных отчёта: {type(report_data).__name__}")
+    renderer.render_and_save()
+
+
+def _render_batch(batch: list[tuple[int, ReportData, str]]) -> list[RenderResult]:
+    # Функция выполняется в дочернем процессе, поэтому исключения не пробрасываются,
+    # а записываются в результат
+    results = []
+    for index, report_data, pdf_file_path in batch:
+        result = RenderResult(index=index, file_path=pdf_file_path)
+        start = time.perf_counter()
+        try:
+            render_report(report_data, pdf_file_path)
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        result.elapsed_s = time.perf_counter() - start
+        results.append(result)
+    return results
+
+
+def _iter_batches(
+        reports: Iterable[ReportData],
+        output_dir: str,
+        file_name_template: str,
+        batch_size: int
+) -> Iterator[list[tuple[int, ReportData, str]]]:
+    jobs = ((index, report_data, os.path.join(output_dir, file_name_template.format(index=index)))
+            for index, report_data in enumerate(reports))
+    while batch := list(islice(jobs, batch_size)):
+        yield batch
+
+
+def iter_render_results(
+        reports: Iterable[ReportData],
+        output_dir: str,
+        max_workers: Optional[int] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        file_name_template: str = DEFAULT_FILE_NAME_TEMPLATE,
+        font_cache_dir: Optional[str] = None
+) -> Iterator[RenderResult]:
+    """
+    Создаёт отчёты в пуле процессов и возвращает результаты в порядке следования данных.
+
+    :param reports: Данные отчётов, например, генератор. Читаются по мере создания отчётов.
+    :param output_dir: Папка для отчётов, создаётся при необходимости.
+    :param max_workers: Количество процессов, по умолчанию - по числу ядер.
+        Если 1, то отчёты создаются в текущем процессе.
+    :param batch_size: Сколько отчётов передаётся в процесс за один раз.
+        Создание небольшого отчёта занимает миллисекунды, поэтому задания выгодно передавать пачками.
+    :param file_name_template: Шаблон имени файла с полем index - номером отчёта, начиная с 0.
+    :param font_cache_dir: Каталог дискового кэша разобранных шрифтов, чтобы процессы
+        не разбирали файлы шрифтов заново, см. fontstyles.load_font().
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    batches = _iter_batches(reports, output_dir, file_name_template, batch_size)
+    if max_workers == 1:
+        register_fonts(font_cache_dir)
+        for batch in batches:
+            yield from _render_batch(batch)
+        return
+
+    max_workers = max_workers or os.cpu_count() or 1
+    # Ограничиваем количество пачек, ожидающих обработки,
+    # чтобы не читать из итератора и не держать в памяти данные всех отчётов
+    max_pending = 2 * max_workers
+    pending: deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=register_fonts,
+                             initargs=(font_cache_dir,)) as executor:
+        for batch in batches:
+            pending.append(executor.submit(_render_batch, batch))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def render_reports(
+        reports: Iterable[ReportData],
+        output_dir: str,
+        max_workers: Optional[int] = None,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        file_name_template: str = DEFAULT_FILE_NAME_TEMPLATE,
+        font_cache_dir: Optional[str] = None,
+        log: Optional[Callable[[str], None]] = print
+) -> BulkRenderStats:
+    """
+    Создаёт все отчёты и подсчитывает скорость, см. iter_render_results().
+
+    :param log: Функция для вывода ошибок и промежуточной скорости, None - не выводить.
+    """
+    stats = BulkRenderStats()
+    start = last_progress_time = time.perf_counter()
+    for result in iter_render_results(reports, output_dir, max_workers, batch_size,
+                                      file_name_template, font_cache_dir):
+        stats.num_reports += 1
+        if not result.ok:
+            stats.num_failed += 1
+            if log is not None:
+                log(f"ERROR {result.file_path}: {result.error}")
+        now = time.perf_counter()
+        stats.elapsed_s = now - start
+        if log is not None and now - last_progress_time >= PROGRESS_INTERVAL_S:
+            last_progress_time = now
+            log(f"Создано отчётов: {stats.num_reports}, {stats.reports_per_second:.01f} отчётов/с")
+    stats.elapsed_s = time.perf_counter() - start
+    return stats
+
+
+def generate_random_reports(num_reports: int, report_type: str = "table") -> Iterator[ReportData]:
+    """
+    :param num_reports: Количество отчётов.
+    :param report_type: "table" - табличные отчёты, "charts" - отчёты с графиками.
+    :return: Генератор данных отчётов со случайными значениями.
+    """
+    for _ in range(num_reports):
+        if report_type == "table":
+            data_generator = TableReportDataGenerator()
+            data_generator.create_random_data()
+        elif report_type == "charts":
+            data_generator = ChartsReportDataGenerator()
+            data_generator.create_random_data(clip_charts=True)
+        else:
+            raise ValueError(f"Неизвестный тип отчёта: {report_type}")
+        yield data_generator.data
+
+
+def main():
+    num_reports = int(input("Количество отчётов (по умолчанию 1000): ") or 1000)
+    report_type = input("Тип отчётов: table или charts (по умолчанию table): ") or "table"
+    output_dir = input("Введите путь к папке для отчётов или нажмите Enter "
+                       f"(по умолчанию \"{OUTPUT_DIR_PATH}\"): ") or OUTPUT_DIR_PATH
+    workers_str = input("Количество процессов (по умолчанию - по числу ядер): ")
+    max_workers = int(workers_str) if workers_str else None
+
+    stats = render_reports(generate_random_reports(num_reports, report_type), output_dir, max_workers,
+                           font_cache_dir=DEFAULT_FONT_CACHE_DIR)
+    print(f"Создано отчётов: {stats.num_reports - stats.num_failed}, с ошибками: {stats.num_failed}, "
+          f"время: {stats.elapsed_s:.03f} s, {stats.reports_per_second:.01f} отчётов/с")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,19 +2,21 @@
 Скрипт для создания простейшего отчёта с графиками.
 После запуска он создаст файл chart_report.pdf в папке pdf_storage.
 На примере этого отчёта в статье показан эффект обрезки по контуру.
+Графики с большим количеством точек можно прорежать, см. параметр decimation_dpi
+у ChartsReportRenderer.
 """
 
 import random
 from dataclasses import dataclass, field
 from math import sin, pi
 
+import numpy as np
 from reportlab.lib.pagesizes import A4, portrait
 from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
 
 import pdf_storage
 from makereports.basereport import BaseReportRenderer, Rect
-from makereports.fontstyles import FontStylesReportMixin, FONT_BOLD
+from makereports.fontstyles import FontStylesReportMixin, FONT_BOLD, string_width
 
 
 @dataclass
@@ -87,13 +89,49 @@ class ChartsReportDataGenerator:
         return chart
 
 
+def decimate_line_points(points_pt: np.ndarray, columns_per_pt: float) -> np.ndarray:
+    """
+    Прорежает точки ломаной так, чтобы при выводе с заданным разрешением она выглядела так же.
+    Для каждого столбца пикселей остаются не более 4 точек: первая, последняя,
+    с наименьшим и с наибольшим y (алгоритм M4). Соседние столбцы соединяются теми же
+    отрезками, что и в исходной ломаной, поэтому пики и провалы не теряются.
+
+    :param points_pt: Массив точек (n, 2) в координатах страницы.
+    :param columns_per_pt: Количество столбцов пикселей на пункт, например 300 / 72 для 300 dpi.
+    :return: Выбранные точки в исходном порядке. Если x не возрастает (ломаная идёт назад),
+        или точек и так мало, то возвращаются все точки.
+    """
+    x = points_pt[:, 0]
+    if len(points_pt) < 3 or np.any(np.diff(x) < 0):
+        return points_pt
+
+    columns = np.floor((x - x[0]) * columns_per_pt).astype(np.int64)
+    if len(points_pt) <= 4 * (columns[-1] + 1):
+        return points_pt
+
+    # x возрастает, поэтому точки одного столбца идут подряд
+    starts = np.flatnonzero(np.r_[True, columns[1:] != columns[:-1]])
+    ends = np.r_[starts[1:], len(points_pt)] - 1
+    # Сортировка по y внутри столбцов: первая точка группы - минимум, последняя - максимум
+    order = np.lexsort((points_pt[:, 1], columns))
+    selected = np.unique(np.concatenate((starts, ends, order[starts], order[ends])))
+    return points_pt[selected]
+
+
 class ChartsReportRenderer(BaseReportRenderer, FontStylesReportMixin):
     def __init__(
             self,
             report_data: ChartReportData,
             pdf_file_path: str,
-            page_size: tuple[float, float]
+            page_size: tuple[float, float],
+            decimation_dpi: float | None = None
     ):
+        """
+        :param decimation_dpi: Разрешение для прореживания точек графиков, см. decimate_line_points().
+            None - выводить все точки. Ломаная из миллиона точек намного детальнее,
+            чем можно различить на странице, а каждая точка - отдельная команда в потоке данных.
+            Прореживание сокращает время создания отчёта, размер файла и время его разбора.
+        """
         BaseReportRenderer.__init__(
             self,
             pdf_file_path=pdf_file_path,
@@ -101,6 +139,7 @@ class ChartsReportRenderer(BaseReportRenderer, FontStylesReportMixin):
         )
 
         self._data = report_data
+        self._decimation_dpi = decimation_dpi
 
     def _draw_content(self) -> None:
         self._register_fonts()
@@ -152,17 +191,17 @@ class ChartsReportRenderer(BaseReportRenderer, FontStylesReportMixin):
             y_scale = (chart_rect.y1 - chart_rect.y0) / (chart_data.y_max - chart_data.y_min)
             y_zero_pt = (0 - chart_data.y_min) * y_scale + chart_rect.y0
 
-            def _scale(point: tuple[float, float]) -> tuple[float, float]:
-                x, y = point
-                return (x * x_scale + x_zero_pt,
-                        y * y_scale + y_zero_pt)
+            points_pt = np.asarray(pts, dtype=float) * (x_scale, y_scale) + (x_zero_pt, y_zero_pt)
+            if self._decimation_dpi is not None:
+                points_pt = decimate_line_points(points_pt, self._decimation_dpi / 72)
 
             c.setStrokeColorRGB(*chart_data.line_color)
             c.setLineWidth(chart_data.line_width_pt)
             path = c.beginPath()
-            path.moveTo(*_scale(pts[0]))
-            for pt in pts[1:]:
-                path.lineTo(*_scale(pt))
+            (x0, y0), *next_points = points_pt.tolist()
+            path.moveTo(x0, y0)
+            for x, y in next_points:
+                path.lineTo(x, y)
             c.drawPath(path, stroke=1, fill=0)
 
         # Restore graphic state without clipping
@@ -171,7 +210,7 @@ class ChartsReportRenderer(BaseReportRenderer, FontStylesReportMixin):
     def _draw_chart_title(self, text: str, x_centre_pt: float, y_baseline_pt: float) -> None:
         c = self._canvas
         c.setFont(FONT_BOLD, 16)
-        title_width = pdfmetrics.stringWidth(text, FONT_BOLD, 16)
+        title_width = string_width(text, FONT_BOLD, 16)
         c.drawString(
             x=x_centre_pt - title_width / 2,
             y=y_baseline_pt,
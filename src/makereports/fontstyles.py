@@ -4,11 +4,28 @@
 (обычно входит в дистрибутив LibreOffice).
 Если у вас нет таких шрифтов, или отличается системный путь к ним,
 можно добавить собственные варианты в словарь в этом модуле.
+
+Поиск файлов шрифтов, их разбор и регистрация в reportlab выполняются один раз в процессе.
+Разобранные шрифты можно дополнительно сохранять в дисковый кэш (параметр cache_dir),
+тогда новые процессы, например, в пуле процессов bulkrender.py, не разбирают файлы шрифтов заново.
+Записи кэша читаются через pickle, поэтому каталог кэша должен быть доступен только
+текущему пользователю: по умолчанию это каталог в личном кэше пользователя с правами 0700,
+а каталог и записи с другим владельцем или с доступом для других пользователей не читаются.
+Ширины строк, по которым выравнивается текст, тоже кэшируются (string_width()).
 """
 
+import functools
+import hashlib
 import os
+import pickle
+import stat
+import tempfile
 from itertools import chain
+from pathlib import Path
+from typing import Optional
+from weakref import WeakKeyDictionary
 
+import reportlab
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 
@@ -27,25 +44,189 @@ _FONT_PATHS = {
 }
 
 
+def _get_user_cache_dir() -> str:
+    if os.name == "nt":
+        return os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    return os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+
+
+# Каталог дискового кэша шрифтов, который используют запускаемые скрипты
+DEFAULT_FONT_CACHE_DIR = os.path.join(_get_user_cache_dir(), "makereports", "fonts")
+# Версия формата: при изменении структуры записей старые файлы кэша перестают находиться
+FONT_CACHE_FORMAT_VERSION = 1
+FONT_CACHE_FILE_SUFFIX = ".ttfont"
+STRING_WIDTH_CACHE_SIZE = 2 ** 16
+
+# Шрифты регистрируются в reportlab глобально, поэтому достаточно сделать это один раз в процессе
+_fonts_registered = False
+# Разобранные шрифты по (название, путь к файлу)
+_loaded_fonts: dict[tuple[str, str], TTFont] = {}
+
+
+@functools.lru_cache(maxsize=None)
+def _find_font_files() -> tuple[tuple[str, str], ...]:
+    font_file_paths = _FONT_PATHS
+    verified_fonts = {}
+    for font_type, font_locations in font_file_paths.items():
+        for file_path in font_locations:
+            if os.path.isfile(file_path):
+                verified_fonts[font_type] = file_path
+
+    if set(font_file_paths.keys()) != set(verified_fonts.keys()):
+        raise EnvironmentError(
+            "Необходимые шрифты для создания отчёта не были обнаружены в системе. "
+            f"Поиск производился по пути: {list(chain(*font_file_paths.values()))}. "
+            f"Вы можете добавить собственные пути к шрифтам в модуль {os.path.abspath(__file__)}"
+        )
+    return tuple(verified_fonts.items())
+
+
+def find_font_files() -> dict[str, str]:
+    """
+    Ищет файлы шрифтов по путям из _FONT_PATHS. Поиск выполняется один раз в процессе.
+
+    :return: Пути к файлам шрифтов по названиям шрифтов (FONT_REGULAR, FONT_BOLD).
+    """
+    return dict(_find_font_files())
+
+
+def _make_font_cache_key(font_name: str, file_path: str) -> str:
+    # Запись кэша становится недействительной при изменении файла шрифта или версии reportlab
+    stat = os.stat(file_path)
+    key_hasher = hashlib.sha256()
+    for part in (font_name, os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size,
+                 reportlab.Version, FONT_CACHE_FORMAT_VERSION):
+        key_hasher.update(f"{part}\n".encode())
+    return key_hasher.hexdigest()
+
+
+def _is_private(file_stat: os.stat_result) -> bool:
+    # В Windows права на личные каталоги пользователя задаются списками доступа, а не битами режима
+    if os.name == "nt":
+        return True
+    return file_stat.st_uid == os.getuid() and not file_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def prepare_font_cache_dir(cache_dir: str) -> Path:
+    """
+    Создаёт каталог дискового кэша шрифтов с правами 0700 и проверяет, что записывать в него
+    может только текущий пользователь: иначе другой пользователь мог бы подложить
+    запись кэша и выполнить свой код при её чтении через pickle.
+
+    :raise PermissionError: Если каталог принадлежит другому пользователю или доступен ему на запись.
+    """
+    os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+    dir_stat = os.lstat(cache_dir)
+    if not stat.S_ISDIR(dir_stat.st_mode) or not _is_private(dir_stat):
+        raise PermissionError(
+            f"Каталог кэша шрифтов {cache_dir} должен принадлежать текущему пользователю "
+            "и не должен быть доступен на запись другим пользователям"
+        )
+    return Path(cache_dir)
+
+
+def _read_cached_font(entry_path: Path) -> Optional[TTFont]:
+    try:
+        entry_stat = os.lstat(entry_path)
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISREG(entry_stat.st_mode) or not _is_private(entry_stat):
+        # Чужую запись не читаем; каталог принадлежит текущему пользователю, поэтому её можно удалить
+        entry_path.unlink(missing_ok=True)
+        return None
+    try:
+        attributes = pickle.loads(entry_path.read_bytes())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+        # Испорченную запись удаляем, она будет создана заново
+        entry_path.unlink(missing_ok=True)
+        return None
+    font = TTFont.__new__(TTFont)
+    font.__dict__.update(attributes)
+    # Состояние подмножеств шрифта для документов не сохраняется, у каждого процесса оно своё
+    font.state = WeakKeyDictionary()
+    return font
+
+
+def _write_cached_font(entry_path: Path, font: TTFont) -> None:
+    attributes = {name: value for name, value in vars(font).items() if name != "state"}
+    file_descriptor, temp_path = tempfile.mkstemp(dir=entry_path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "wb") as f:
+            pickle.dump(attributes, f, protocol=pickle.HIGHEST_PROTOCOL)
+        # Замена атомарна, поэтому другие процессы никогда не прочитают недописанный файл
+        os.replace(temp_path, entry_path)
+    except BaseException:
+        Path(temp_path).unlink(missing_ok=True)
+        raise
+
+
+def load_font(font_name: str, file_path: str, cache_dir: Optional[str] = None) -> TTFont:
+    """
+    Разбирает файл шрифта TTF. Каждый файл разбирается один раз в процессе.
+
+    :param font_name: Название, под которым шрифт регистрируется в reportlab.
+    :param file_path: Путь к файлу шрифта.
+    :param cache_dir: Каталог дискового кэша разобранных шрифтов, None - без дискового кэша.
+        Чтение из кэша в несколько раз быстрее разбора файла шрифта.
+        Если шрифт уже разобран в процессе, но записи в этом каталоге нет, то она создаётся.
+        См. также prepare_font_cache_dir().
+    """
+    font = _loaded_fonts.get((font_name, file_path))
+    if font is not None and cache_dir is None:
+        return font
+
+    entry_path = None
+    if cache_dir is not None:
+        entry_path = (prepare_font_cache_dir(cache_dir)
+                      / f"{_make_font_cache_key(font_name, file_path)}{FONT_CACHE_FILE_SUFFIX}")
+        if font is not None:
+            if not entry_path.exists():
+                _write_cached_font(entry_path, font)
+            return font
+        font = _read_cached_font(entry_path)
+    if font is None:
+        font = TTFont(font_name, file_path)
+        if entry_path is not None:
+            _write_cached_font(entry_path, font)
+
+    _loaded_fonts[(font_name, file_path)] = font
+    return font
+
+
+def register_fonts(cache_dir: Optional[str] = None) -> None:
+    """
+    Регистрирует шрифты отчётов в reportlab, если это ещё не сделано в текущем процессе.
+    Повторная регистрация заново ищет файлы шрифтов и разбирает их,
+    что для небольших отчётов занимает больше времени, чем само создание отчёта.
+
+    :param cache_dir: Каталог дискового кэша разобранных шрифтов, см. load_font().
+        Если шрифты уже зарегистрированы, то они только сохраняются в этот кэш, если их там нет.
+    """
+    global _fonts_registered
+    if _fonts_registered and cache_dir is None:
+        return
+    fonts = [load_font(font_type, file_path, cache_dir) for font_type, file_path in find_font_files().items()]
+    if not _fonts_registered:
+        for font in fonts:
+            pdfmetrics.registerFont(font)
+        _fonts_registered = True
+
+
+@functools.lru_cache(maxsize=STRING_WIDTH_CACHE_SIZE)
+def string_width(text: str, font_name: str, font_size: float) -> float:
+    """
+    То же, что и pdfmetrics.stringWidth(), но с кэшем: в отчётах одни и те же строки
+    (заголовки, подписи, повторяющиеся значения) измеряются многократно.
+    """
+    return pdfmetrics.stringWidth(text, font_name, font_size)
+
+
 class FontStylesReportMixin:
     @staticmethod
     def _find_font_files() -> dict[str, str]:
-        font_file_paths = _FONT_PATHS
-        verified_fonts = {}
-        for font_type, font_locations in font_file_paths.items():
-            for file_path in font_locations:
-                if os.path.isfile(file_path):
-                    verified_fonts[font_type] = file_path
-
-        if set(font_file_paths.keys()) != set(verified_fonts.keys()):
-            raise EnvironmentError(
-                "Необходимые шрифты для создания отчёта не были обнаружены в системе. "
-                f"Поиск производился по пути: {list(chain(*font_file_paths.values()))}. "
-                f"Вы можете добавить собственные пути к шрифтам в модуль {os.path.abspath(__file__)}"
-            )
-        return verified_fonts
+        return find_font_files()
 
     def _register_fonts(self) -> None:
-        fonts = self._find_font_files()
-        for font_type, file_path in fonts.items():
-            pdfmetrics.registerFont(TTFont(font_type, file_path))
+        register_fonts()
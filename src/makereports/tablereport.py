@@ -4,6 +4,8 @@
 На примере этого отчёта в статье показано начало работы с pdfminer
 и создание page object.
 Также на примере этого отчёта работает образец тестов в parsereports/tests.py.
+Большие таблицы можно выводить на несколько страниц и файлов, см. параметры paginate
+и max_pages_per_file у TableReportRenderer.
 """
 
 import datetime as dt
@@ -11,14 +13,15 @@ import random
 import string
 from collections import OrderedDict, namedtuple
 from dataclasses import dataclass, field
+from itertools import islice
+from typing import Iterable, Iterator, Sequence
 
 from reportlab.lib.pagesizes import A4, landscape
 from reportlab.lib.units import mm
-from reportlab.pdfbase import pdfmetrics
 
 import pdf_storage
 from makereports.basereport import BaseReportRenderer, Rect
-from makereports.fontstyles import FontStylesReportMixin, FONT_BOLD, FONT_REGULAR
+from makereports.fontstyles import FontStylesReportMixin, FONT_BOLD, FONT_REGULAR, string_width
 
 _CellBorders = namedtuple("_CellBorders", "left right bottom top")
 
@@ -30,6 +33,10 @@ class TableData:
     row_headers: list[str] = field(default_factory=list)
     col_headers: list[str] = field(default_factory=list)
     data: list[list[str]] = field(default_factory=list)
+    # Источник строк (заголовок строки, значения) вместо row_headers и data,
+    # например, генератор для таблиц, которые не помещаются в память.
+    # Поддерживается только при постраничном выводе, его можно прочитать только один раз
+    row_source: Iterable[tuple[str, Sequence[str]]] | None = None
 
     def get_full_table(self) -> list[list[str]]:
         table = [["", *self.col_headers]]
@@ -37,6 +44,11 @@ class TableData:
                      for row_header, row in zip(self.row_headers, self.data))
         return table
 
+    def iter_rows(self) -> Iterator[tuple[str, Sequence[str]]]:
+        if self.row_source is not None:
+            return iter(self.row_source)
+        return zip(self.row_headers, self.data)
+
 
 @dataclass
 class TableReportData:
@@ -55,8 +67,13 @@ class TableReportDataGenerator:
     def create_random_data(
             self,
             num_cols: int | None = None,
-            num_rows: int | None = None
+            num_rows: int | None = None,
+            streamed: bool = False
     ) -> None:
+        """
+        :param streamed: Создавать строки таблицы не сразу, а по мере вывода (TableData.row_source),
+            для проверки вывода больших таблиц в постраничном режиме.
+        """
         data = self.data
         data.title = "Данные наблюдений"
         data.patient_name = "Иванов И.И."
@@ -67,13 +84,23 @@ class TableReportDataGenerator:
         num_rows = num_rows or 24
         data.table_data = TableData(
             num_cols=num_cols,
-            num_rows=num_rows,
-            row_headers=[f"{h:02d}:00" for h in range(num_rows)]
+            num_rows=num_rows
         )
         data.table_data.col_headers = ["".join(random.choices(string.ascii_uppercase, k=3))
                                        for _ in range(num_cols)]
-        data.table_data.data = [[("%02.2f" % random.uniform(-999.99, 999.99))
-                                 for _ in range(num_cols)] for _ in range(num_rows)]
+        rows = self._iter_random_rows(num_cols, num_rows)
+        if streamed:
+            # Строки создаются по мере вывода, см. TableData.row_source.
+            # Случайные числа берутся в том же порядке, что и без streamed
+            data.table_data.row_source = rows
+        else:
+            data.table_data.row_headers = [f"{h:02d}:00" for h in range(num_rows)]
+            data.table_data.data = [row for _, row in rows]
+
+    @staticmethod
+    def _iter_random_rows(num_cols: int, num_rows: int) -> Iterator[tuple[str, list[str]]]:
+        for row_index in range(num_rows):
+            yield f"{row_index:02d}:00", [("%02.2f" % random.uniform(-999.99, 999.99)) for _ in range(num_cols)]
 
 
 class TableReportRenderer(BaseReportRenderer, FontStylesReportMixin):
@@ -81,28 +108,96 @@ class TableReportRenderer(BaseReportRenderer, FontStylesReportMixin):
             self,
             report_data: TableReportData,
             pdf_file_path: str,
-            page_size: tuple[float, float]
+            page_size: tuple[float, float],
+            paginate: bool = False,
+            batch_cells: bool = False,
+            max_pages_per_file: int | None = None
     ):
+        """
+        :param paginate: Постраничный вывод. Без него вся таблица выводится на одну страницу
+            и обрезается по её границам. В постраничном режиме строки и колонки, которые
+            не помещаются на страницу, переносятся на следующие страницы, а на каждой странице
+            повторяются справочные сведения, заголовки колонок и заголовки строк.
+            Страницы идут сначала по колонкам, затем по строкам. Строки читаются
+            из TableData.iter_rows() по мере вывода, поэтому в памяти держатся только строки
+            текущей страницы. Но reportlab хранит все готовые страницы до сохранения файла,
+            и расход памяти ограничен, только если задан max_pages_per_file.
+        :param batch_cells: Пакетный вывод таблицы. Без него каждая ячейка выводится отдельно:
+            свой текстовый объект с переключением шрифта и отдельные линии границ.
+            В пакетном режиме тексты всех ячеек с одним шрифтом выводятся одним текстовым объектом,
+            а границы - одним контуром из линий во всю ширину и высоту таблицы.
+            Внешний вид отчёта тот же, а поток данных страницы в несколько раз короче,
+            поэтому отчёт быстрее создаётся и разбирается.
+        :param max_pages_per_file: Разбиение отчёта на несколько файлов, см. BaseReportRenderer.
+        """
         BaseReportRenderer.__init__(
             self,
             pdf_file_path=pdf_file_path,
-            page_size=page_size
+            page_size=page_size,
+            max_pages_per_file=max_pages_per_file
         )
 
         self._data = report_data
         if report_data.table_data is None:
             raise ValueError("Table data must be initialized")
+        if report_data.table_data.row_source is not None and not paginate:
+            raise ValueError("Row source is only supported in paginated mode")
+        self._paginate = paginate
+        self._batch_cells = batch_cells
 
         self._side_panel_width_ratio = 0.3
         self._table_cell_width_pt = 20 * mm
+        self._table_font_size = 10
+        self._table_text_offset_pt = 2 * mm
         self._table_cell_height_pt = 7 * mm
 
     def _draw_content(self) -> None:
         self._register_fonts()
         self._clip_page_margins()
         self._draw_side_panel()
-        table_position = self._calculate_table_position()
-        self._draw_data_table(table_position)
+        full_table_data = self._data.table_data.get_full_table()
+        table_position = self._calculate_table_position(len(full_table_data))
+        self._draw_data_table(table_position, full_table_data)
+
+    def _draw_pages(self) -> Iterator[None]:
+        if not self._paginate:
+            yield from BaseReportRenderer._draw_pages(self)
+            return
+
+        self._register_fonts()
+        table_data = self._data.table_data
+        rows_per_page, cols_per_page = self._calculate_page_capacity()
+        col_ranges = [range(first_col, min(first_col + cols_per_page, table_data.num_cols))
+                      for first_col in range(0, table_data.num_cols, cols_per_page)] or [range(0)]
+
+        rows = table_data.iter_rows()
+        page_rows = list(islice(rows, rows_per_page))
+        while True:
+            for col_range in col_ranges:
+                self._clip_page_margins()
+                self._draw_side_panel()
+                page_table_data = [["", *(table_data.col_headers[col_index] for col_index in col_range)]]
+                page_table_data.extend([row_header, *(row[col_index] for col_index in col_range)]
+                                       for row_header, row in page_rows)
+                table_position = self._calculate_table_position(len(page_table_data))
+                self._draw_data_table(table_position, page_table_data)
+                yield
+            page_rows = list(islice(rows, rows_per_page))
+            if not page_rows:
+                break
+
+    def _calculate_page_capacity(self) -> tuple[int, int]:
+        """
+        :return: Сколько строк и колонок данных (без заголовков) помещается на одну страницу.
+        """
+        view_box = self._calculate_page_view_box()
+        side_panel_width_pt = self._side_panel_width_ratio * (view_box.x1 - view_box.x0)
+        table_width_pt = view_box.x1 - view_box.x0 - side_panel_width_pt
+        table_height_pt = view_box.y1 - view_box.y0
+        # Одна строка и одна колонка на каждой странице заняты заголовками
+        rows_per_page = int(table_height_pt // self._table_cell_height_pt) - 1
+        cols_per_page = int(table_width_pt // self._table_cell_width_pt) - 1
+        return max(rows_per_page, 1), max(cols_per_page, 1)
 
     def _draw_side_panel(self) -> None:
         title_base_line_distance_pt = 20 * mm
@@ -137,12 +232,12 @@ class TableReportRenderer(BaseReportRenderer, FontStylesReportMixin):
             y -= data_line_distance_pt
             c.drawString(x=self._page_margin_pt + data_column_width_pt, y=y, text=text)
 
-    def _calculate_table_position(self) -> Rect:
+    def _calculate_table_position(self, num_table_rows: int) -> Rect:
         view_box = self._calculate_page_view_box()
         side_panel_width_pt = self._side_panel_width_ratio * (view_box.x1 - view_box.x0)
         table_x0 = view_box.x0 + side_panel_width_pt
 
-        table_height_pt = self._table_cell_height_pt * (len(self._data.table_data.data) + 1)
+        table_height_pt = self._table_cell_height_pt * num_table_rows
         table_vdistance_from_margin_pt = (view_box.y1 - view_box.y0 - table_height_pt) / 2
 
         return Rect(
@@ -154,7 +249,8 @@ class TableReportRenderer(BaseReportRenderer, FontStylesReportMixin):
 
     def _draw_data_table(
             self,
-            table_position: Rect
+            table_position: Rect,
+            full_table_data: list[list[str]]
     ) -> None:
         self._add_clipping_rectangle(table_position)
 
@@ -162,7 +258,11 @@ class TableReportRenderer(BaseReportRenderer, FontStylesReportMixin):
         self._canvas.setStrokeColorRGB(0, 0, 0)
         self._canvas.setLineWidth(0.1)
 
-        full_table_data = self._data.table_data.get_full_table()
+        if self._batch_cells:
+            self._draw_table_texts(table_position, full_table_data)
+            self._draw_table_grid(table_position, full_table_data)
+            return
+
         for row_index, row in enumerate(full_table_data):
             cell_top = table_position.y1 - self._table_cell_height_pt * row_index
 
@@ -186,6 +286,70 @@ class TableReportRenderer(BaseReportRenderer, FontStylesReportMixin):
                     )
                 )
 
+    def _draw_table_texts(
+            self,
+            table_position: Rect,
+            full_table_data: list[list[str]]
+    ) -> None:
+        c = self._canvas
+        font_size = self._table_font_size
+        # One text object per font, so the font is set only once
+        text_objects = {}
+        for font in (FONT_BOLD, FONT_REGULAR):
+            text_objects[font] = c.beginText()
+            text_objects[font].setFont(font, font_size)
+
+        for row_index, row in enumerate(full_table_data):
+            cell_bottom = table_position.y1 - self._table_cell_height_pt * (row_index + 1)
+            for col_index, value in enumerate(row):
+                text = str(value)
+                if not text:
+                    continue
+                cell_left = table_position.x0 + self._table_cell_width_pt * col_index
+                font = FONT_BOLD if 0 in (row_index, col_index) else FONT_REGULAR
+                text_object = text_objects[font]
+                text_object.setTextOrigin(
+                    self._calculate_centered_text_position(
+                        rect=Rect(
+                            x0=cell_left,
+                            y0=cell_bottom,
+                            x1=cell_left + self._table_cell_width_pt,
+                            y1=cell_bottom + self._table_cell_height_pt
+                        ),
+                        font=font,
+                        font_size=font_size,
+                        text=text
+                    ),
+                    cell_bottom + self._table_text_offset_pt
+                )
+                text_object.textOut(text)
+
+        for text_object in text_objects.values():
+            c.drawText(text_object)
+
+    def _draw_table_grid(
+            self,
+            table_position: Rect,
+            full_table_data: list[list[str]]
+    ) -> None:
+        # Same borders as in _draw_cell: lines between cells only, each line across the whole table
+        num_rows = len(full_table_data)
+        num_cols = max((len(row) for row in full_table_data), default=0)
+        table_x1 = table_position.x0 + self._table_cell_width_pt * num_cols
+        table_y0 = table_position.y1 - self._table_cell_height_pt * num_rows
+
+        c = self._canvas
+        grid = c.beginPath()
+        for row_index in range(1, num_rows):
+            y = table_position.y1 - self._table_cell_height_pt * row_index
+            grid.moveTo(table_position.x0, y)
+            grid.lineTo(table_x1, y)
+        for col_index in range(1, num_cols):
+            x = table_position.x0 + self._table_cell_width_pt * col_index
+            grid.moveTo(x, table_y0)
+            grid.lineTo(x, table_position.y1)
+        c.drawPath(grid, stroke=1, fill=0)
+
     @staticmethod
     def _calculate_centered_text_position(
             rect: Rect,
@@ -194,7 +358,7 @@ class TableReportRenderer(BaseReportRenderer, FontStylesReportMixin):
             text: str
     ) -> float:
         rect_width = rect.x1 - rect.x0
-        text_width = pdfmetrics.stringWidth(text, font, font_size)
+        text_width = string_width(text, font, font_size)
         return rect.x0 + (rect_width - text_width) / 2
 
     def _draw_cell(
@@ -206,7 +370,7 @@ class TableReportRenderer(BaseReportRenderer, FontStylesReportMixin):
     ) -> None:
         c = self._canvas
         # Draw text
-        font_size = 10
+        font_size = self._table_font_size
         c.setFont(font, font_size)
         c.drawString(
             x=self._calculate_centered_text_position(
@@ -215,7 +379,7 @@ class TableReportRenderer(BaseReportRenderer, FontStylesReportMixin):
                 font_size=font_size,
                 text=text
             ),
-            y=position.y0 + 2 * mm,
+            y=position.y0 + self._table_text_offset_pt,
             text=text
         )
         # Draw borders: only actually used cases are added
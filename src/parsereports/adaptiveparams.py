@@ -0,0 +1,166 @@
+"""
+Этот модуль содержит определения для адаптивного выбора параметров анализа страниц.
+
+Перед разбором каждой страницы её поток данных быстро просматривается без интерпретации
+(см. модуль contentstream): считается примерное количество символов, графических объектов
+и изображений. По этим данным и по списку нужных вызывающему коду типов объектов
+для страницы выбираются самые дешёвые параметры, которые ещё дают объекты этих типов:
+- если текстовые объекты (LTText...) не нужны или на странице нет текста,
+  то анализ разметки pdfminer не выполняется совсем (laparams=None),
+- поиск вертикального текста (detect_vertical) выполняется, только если нужны
+  вертикальные строки и блоки текста (или типы объектов не заданы),
+- на плотных страницах (например, с большими таблицами) отключаются иерархическая группировка
+  блоков текста (boxes_flow) и пересортировка дерева PDFQuery (resort).
+  Типы и содержимое объектов от этого не меняются, меняются только порядок блоков текста
+  и вложенность элементов в дереве PDFQuery: они остаются такими, какими их создал pdfminer.
+Эвристики только отключаются: то, что выключено в исходных параметрах PDFQuery, не включается.
+"""
+
+import copy
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from pdfminer.layout import LAParams
+from pdfminer.pdfpage import PDFPage
+
+from parsereports.contentstream import get_form, get_page_streams, iter_content_operations
+
+# Операторы вывода текста; символы берутся из строковых операндов
+TEXT_SHOW_OPERATORS = {"Tj", "TJ", "'", "\""}
+# Операторы закраски и обводки контура: каждый создаёт один графический объект pdfminer
+PAINT_OPERATORS = {"S", "s", "f", "F", "f*", "B", "B*", "b", "b*"}
+# Площадь квадратного дюйма в пунктах
+_SQUARE_INCH = 72.0 * 72.0
+
+
+@dataclass
+class PageDensity:
+    """
+    Результат предварительного просмотра страницы.
+    """
+    page_index: int
+    # Площадь страницы (MediaBox) в квадратных пунктах
+    area: float
+    # Примерное количество символов: по количеству байт в строках,
+    # поэтому для двухбайтовых шрифтов оценка завышена вдвое
+    num_chars: int = 0
+    num_text_operations: int = 0
+    # Количество закрашенных или обведённых контуров (линий, прямоугольников, кривых)
+    num_graphics: int = 0
+    num_images: int = 0
+
+    @property
+    def num_objects(self) -> int:
+        return self.num_chars + self.num_graphics + self.num_images
+
+    @property
+    def objects_per_square_inch(self) -> float:
+        return self.num_objects * _SQUARE_INCH / self.area if self.area > 0 else float(self.num_objects)
+
+
+def _count_chars(operator: str, operands: list) -> int:
+    if not operands:
+        return 0
+    if operator == "TJ":
+        items = operands[-1] if isinstance(operands[-1], list) else []
+        return sum(len(item) for item in items if isinstance(item, bytes))
+    return len(operands[-1]) if isinstance(operands[-1], bytes) else 0
+
+
+def scan_page(page_index: int, page: PDFPage, follow_forms: bool = True) -> PageDensity:
+    """
+    Просматривает поток данных страницы без интерпретации и анализа разметки.
+    Это занимает миллисекунды, на порядки быстрее полного разбора страницы.
+
+    :param page_index: Номер страницы, начиная с 0.
+    :param page: Страница pdfminer.
+    :param follow_forms: Учитывать ли объекты из рисунков (Form XObject).
+    """
+    x0, y0, x1, y1 = page.mediabox
+    density = PageDensity(page_index, area=abs((x1 - x0) * (y1 - y0)))
+    for operator, operands in iter_content_operations(get_page_streams(page), page.resources, follow_forms):
+        if operator in TEXT_SHOW_OPERATORS:
+            density.num_text_operations += 1
+            density.num_chars += _count_chars(operator, operands)
+        elif operator in PAINT_OPERATORS:
+            density.num_graphics += 1
+        elif operator == "BI":
+            density.num_images += 1
+        elif operator == "Do" and get_form(page.resources, operands) is None:
+            # Рисунки разворачиваются в операторы, остальные внешние объекты считаем изображениями
+            density.num_images += 1
+    return density
+
+
+@dataclass(frozen=True)
+class PageParams:
+    """
+    Параметры, выбранные для одной страницы.
+    """
+    # Параметры анализа разметки pdfminer, None - анализ не выполняется
+    laparams: Optional[LAParams]
+    # Пересортировка дерева PDFQuery по координатам объектов
+    resort: bool
+    # Считается ли страница плотной
+    dense: bool
+
+
+@dataclass(frozen=True)
+class AdaptiveParams:
+    """
+    Настройки адаптивного выбора параметров.
+    """
+    # Названия классов pdfminer, которые нужны вызывающему коду, None - объекты любых типов
+    element_tags: Optional[tuple[str, ...]] = None
+    # Начиная с какого количества объектов на квадратный дюйм страница считается плотной.
+    # Для сравнения: на странице табличного отчёта, созданного makereports/tablereport.py,
+    # их около 20, а на странице отчёта с графиками - меньше одного
+    dense_objects_per_square_inch: float = 10.0
+
+    def __post_init__(self):
+        if self.element_tags is not None:
+            # Упорядочиваем, чтобы repr был стабильным (он используется в ключе кэша страниц)
+            object.__setattr__(self, "element_tags", tuple(sorted(set(self.element_tags))))
+
+    @classmethod
+    def create(
+            cls,
+            element_tags: Optional[Iterable[str]] = None,
+            dense_objects_per_square_inch: float = 10.0
+    ) -> "AdaptiveParams":
+        """
+        :param element_tags: Названия классов pdfminer, например ("LTLine", "LTTextLineHorizontal"),
+            None - объекты любых типов.
+        :param dense_objects_per_square_inch: Порог плотности страницы.
+        """
+        return cls(
+            element_tags=tuple(element_tags) if element_tags is not None else None,
+            dense_objects_per_square_inch=dense_objects_per_square_inch
+        )
+
+    @property
+    def needs_text_layout(self) -> bool:
+        return self.element_tags is None or any(tag.startswith("LTText") for tag in self.element_tags)
+
+    @property
+    def needs_vertical_text(self) -> bool:
+        return self.element_tags is None or any("Vertical" in tag for tag in self.element_tags)
+
+    def choose(self, density: PageDensity, base_laparams: Optional[LAParams], base_resort: bool) -> PageParams:
+        """
+        :param density: Результат просмотра страницы, см. scan_page().
+        :param base_laparams: Исходные параметры анализа разметки, с которыми создан PDFQuery.
+        :param base_resort: Исходное значение параметра resort PDFQuery.
+        :return: Параметры для разбора страницы.
+        """
+        dense = density.objects_per_square_inch >= self.dense_objects_per_square_inch
+        resort = base_resort and not dense
+        if base_laparams is None or not self.needs_text_layout or density.num_chars == 0:
+            return PageParams(laparams=None, resort=resort, dense=dense)
+
+        laparams = copy.copy(base_laparams)
+        laparams.detect_vertical = base_laparams.detect_vertical and self.needs_vertical_text
+        # Порядок блоков текста, который задаёт группировка, при пересортировке дерева всё равно теряется
+        if dense or resort:
+            laparams.boxes_flow = None
+        return PageParams(laparams=laparams, resort=resort, dense=dense)
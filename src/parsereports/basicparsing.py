@@ -3,10 +3,105 @@
 которые используются в разных примерах.
 """
 
-from typing import Optional, Any, Dict
+import dataclasses
+import mmap
+import os
+from typing import Optional, Any, BinaryIO, Dict, Iterator
 
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams, LTPage
+from pdfminer.pdfinterp import PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
 from pdfquery import PDFQuery
-from pdfquery.pdfquery import LayoutElement
+from pdfquery.pdfquery import LayoutElement, obj_to_string
+
+from parsereports.adaptiveparams import AdaptiveParams, PageParams, scan_page
+from parsereports.elementindex import PageIndex
+from parsereports.elementfilter import ElementFilter, SelectivePageAggregator
+from parsereports.layoutcache import LayoutCache
+from parsereports.profiling import ParseProfiler, profile_stage
+
+
+# Параметры PDFQuery со всеми эвристиками анализа
+FULL_PARAMS = dict(
+    merge_tags=('LTChar', 'LTAnno'),
+    round_floats=True,
+    round_digits=3,
+    normalize_spaces=True,
+    resort=True,
+    # Атрибуты "laparams" соответствуют параметрам конструктора класса pdfminer.layout.LAParams
+    laparams=dict(
+        line_overlap=0.5,
+        char_margin=2.0,
+        line_margin=0.5,
+        word_margin=0.1,
+        boxes_flow=0.5,
+        detect_vertical=True,
+        all_texts=True
+    )
+)
+
+# Параметры PDFQuery с отключёнными медленными эвристиками.
+# Замедления, вызванные эвристиками, наиболее заметны на отчётах,
+# на которых много мелких близко расположенных элементов, например, на таблицах.
+FAST_PARAMS = dict(
+    round_floats=False,
+    normalize_spaces=False,
+    resort=False,
+    laparams=dict(
+        boxes_flow=None,
+        detect_vertical=False,
+        all_texts=True
+    )
+)
+
+
+def open_pdf_file(pdf_file_path: str, use_mmap: bool = False) -> BinaryIO:
+    """
+    Открывает документ для чтения парсером pdfminer.
+
+    :param pdf_file_path: Путь к документу.
+    :param use_mmap: Отобразить файл в память вместо обычного буферизованного чтения.
+        Данные тогда читаются напрямую из страничного кэша ОС, без собственного буфера
+        у каждого открытого файла, а несколько процессов, читающих один и тот же файл,
+        используют общие страницы памяти. Для больших файлов это экономит память и системные вызовы.
+        Файл нулевой длины отобразить в память нельзя, он всегда открывается для обычного чтения.
+    :return: Файловый объект (или объект mmap с таким же интерфейсом чтения),
+        который нужно закрыть после завершения работы.
+    """
+    pdf_file = open(pdf_file_path, "rb")
+    if not use_mmap or os.fstat(pdf_file.fileno()).st_size == 0:
+        return pdf_file
+    with pdf_file:
+        # mmap хранит собственную копию дескриптора, поэтому сам файл можно сразу закрыть
+        return mmap.mmap(pdf_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def make_page_element(
+        pq: PDFQuery,
+        page_index: int,
+        page_layout: LTPage,
+        profiler: Optional[ParseProfiler] = None
+) -> LayoutElement:
+    """
+    Превращает результат анализа страницы в pdfminer в элемент дерева PDFQuery.
+    Повторяет то, что делает PDFQuery.get_tree() для каждой страницы.
+
+    :param pq: Объект PDFQuery, настройки которого используются для построения дерева.
+    :param page_index: Номер страницы, начиная с 0.
+    :param page_layout: Результат анализа страницы, см. PDFQuery.get_layout().
+    :param profiler: Профилировщик для замера этапов tree и clean_text.
+    :return: Элемент LTPage, который можно добавить в корень дерева.
+    """
+    with profile_stage(profiler, "tree", page_index) as record:
+        num_elements_before = len(pq._elements)
+        page_element = pq._xmlize(page_layout)
+        page_element.set("page_index", obj_to_string(page_index))
+        page_element.set("page_label", pq.doc.get_page_number(page_index))
+        record.num_elements = len(pq._elements) - num_elements_before
+    with profile_stage(profiler, "clean_text", page_index):
+        pq._clean_text(page_element)
+    return page_element
 
 
 class BasicPdfParser:
@@ -17,44 +112,305 @@ class BasicPdfParser:
     def __init__(
             self,
             pdf_file_path: str,
-            pq_params: Optional[Dict[str, Any]] = None
+            pq_params: Optional[Dict[str, Any]] = None,
+            lazy: bool = False,
+            layout_cache: Optional[LayoutCache] = None,
+            use_mmap: bool = False,
+            element_filter: Optional[ElementFilter] = None,
+            profiler: Optional[ParseProfiler] = None,
+            adaptive_params: Optional[AdaptiveParams] = None,
+            index_grid_size: Optional[float] = None
     ):
         """
 
         :param pdf_file_path: Путь к документу.
         :param pq_params: Параметры конструктора PDFQuery,
             см. возможные параметры в документации класса PDFQuery.
+        :param lazy: Ленивый режим. Если включён, то при открытии документа
+            страницы не обрабатываются, а каждая страница разбирается
+            и добавляется в дерево элементов только при первом обращении к ней.
+            Это выгодно для длинных документов, в которых проверяются
+            только отдельные страницы.
+        :param layout_cache: Дисковый кэш страниц. Если задан, то страницы,
+            уже разобранные ранее для того же содержимого файла и тех же параметров,
+            берутся из кэша, а остальные после разбора сохраняются в кэш.
+            Ограничения для элементов из кэша описаны в модуле layoutcache.
+        :param use_mmap: Читать документ через отображение файла в память, см. open_pdf_file().
+        :param element_filter: Выборочное извлечение: если задан фильтр, то на страницах
+            остаются только объекты из заданной области и/или заданных типов.
+            Остальные объекты отбрасываются до анализа разметки и построения дерева,
+            поэтому проверки отдельных частей страницы (легенды, картинок и т.п.) выполняются быстрее.
+        :param profiler: Профилировщик для замера времени и количества элементов
+            на каждом этапе разбора каждой страницы, см. модуль profiling.
+            Если задан, то страницы всегда загружаются по одной, как в ленивом режиме.
+        :param adaptive_params: Адаптивный режим: перед разбором каждой страницы её поток данных
+            быстро просматривается, и для страницы выбираются самые дешёвые параметры анализа,
+            которые ещё дают объекты нужных типов, см. модуль adaptiveparams.
+            pq_params при этом задают исходные параметры, эвристики в них только отключаются.
+            Если типы объектов не заданы, но задан element_filter с типами, то берутся типы из него.
+            В адаптивном режиме страницы всегда загружаются по одной, как в ленивом режиме.
+        :param index_grid_size: Размер ячейки сетки (в пунктах) для поиска элементов по области
+            в индексах страниц, None - без сетки, см. get_page_index().
         """
         self._file_path = pdf_file_path
         self._pq: Optional[PDFQuery] = None
         self._pq_params = pq_params or {}
+        self._lazy = lazy
+        self._loaded_pages: set[int] = set()
+        self._layout_cache = layout_cache
+        self._document_key: Optional[str] = None
+        self._use_mmap = use_mmap
+        self._element_filter = element_filter
+        self._profiler = profiler
+        # Номер страницы, которая сейчас разбирается, для замера этапа layout
+        self._profiled_page_index: Optional[int] = None
+        if (adaptive_params is not None and adaptive_params.element_tags is None
+                and element_filter is not None and element_filter.tags is not None):
+            adaptive_params = dataclasses.replace(adaptive_params, element_tags=element_filter.tags)
+        self._adaptive_params = adaptive_params
+        # Параметры, выбранные для каждой разобранной страницы в адаптивном режиме
+        self.page_params: dict[int, PageParams] = {}
+        self._base_laparams: Optional[LAParams] = None
+        self._base_resort = True
+        self._index_grid_size = index_grid_size
+        self._page_indexes: dict[int, PageIndex] = {}
 
     @property
     def pq(self) -> PDFQuery:
         """
         :return: Объект PDFQuery, готовый к работе.
             После завершения работы необходимо вызвать close().
+            В ленивом режиме дерево элементов содержит только те страницы,
+            которые уже были загружены (см. load_pages()).
         """
         self.init_pq()
         return self._pq
 
     def init_pq(self) -> None:
         if self._pq is None:
-            self._pq = PDFQuery(self._file_path, **self._pq_params)
-            self._pq.load()
+            self._pq = self._create_pq()
+            if (self._lazy or self._layout_cache is not None or self._profiler is not None
+                    or self._adaptive_params is not None):
+                # Явно переданный None означает, что создаётся
+                # только корень дерева без страниц.
+                # Страницы потом загружаются по одной через _load_page_element()
+                self._pq.load(None)
+                if not self._lazy:
+                    self.load_pages(*range(len(self._pq._cached_pages())))
+            else:
+                self._pq.load()
+                self._loaded_pages.update(range(len(self._pq._pages)))
+
+    def _create_pq(self) -> PDFQuery:
+        with profile_stage(self._profiler, "open"):
+            pdf_file = open_pdf_file(self._file_path, self._use_mmap)
+            try:
+                pq = PDFQuery(pdf_file, **self._pq_params)
+            except BaseException:
+                pdf_file.close()
+                raise
+        # Исходные параметры, с которыми PDFQuery создал устройство pdfminer.
+        # В адаптивном режиме от них отталкивается выбор параметров для каждой страницы.
+        # Они одинаковы для всех создаваемых экземпляров PDFQuery
+        self._base_laparams = pq.device.laparams
+        self._base_resort = pq.resort
+        self._create_device(pq)
+        return pq
+
+    def _create_device(self, pq: PDFQuery) -> None:
+        """
+        Заменяет устройство pdfminer, собирающее объекты страницы, и интерпретатор PDFQuery новыми.
+        Устройство создаётся с исходными параметрами анализа разметки,
+        а при выборочном извлечении отбрасывает объекты, не подходящие под фильтр.
+        """
+        rsrcmgr = pq.device.rsrcmgr
+        if self._element_filter is not None:
+            pq.device = SelectivePageAggregator(rsrcmgr, self._element_filter, laparams=self._base_laparams)
+        else:
+            pq.device = PDFPageAggregator(rsrcmgr, laparams=self._base_laparams)
+        pq.interpreter = PDFPageInterpreter(rsrcmgr, pq.device)
+        if self._profiler is not None:
+            self._profile_layout_analysis(pq)
+
+    def _profile_layout_analysis(self, pq: PDFQuery) -> None:
+        # Анализ разметки pdfminer выполняет в конце обработки страницы, в методе end_page() устройства.
+        # Замеряем его отдельно, чтобы в этап interpret попало только время интерпретации
+        device = pq.device
+        end_page = device.end_page
+
+        def _end_page(page: PDFPage) -> None:
+            with self._profiler.stage("layout", self._profiled_page_index) as record:
+                end_page(page)
+                record.num_elements = len(device.result)
+
+        device.end_page = _end_page
+
+    def load_pages(self, *page_indices: int) -> None:
+        """
+        Разбирает указанные страницы и добавляет их в дерево элементов,
+        если они не были загружены ранее.
+        Без ленивого режима все страницы загружаются сразу, и метод ничего не делает.
+        Если задан кэш, то страницы по возможности берутся из него.
+
+        :param page_indices: Номера страниц, начиная с 0.
+        """
+        self.init_pq()
+        pq = self._pq
+        root = pq.tree.getroot()
+        for page_index in page_indices:
+            if page_index in self._loaded_pages:
+                continue
+            if page_index < 0:
+                raise IndexError(f"Номер страницы не может быть отрицательным: {page_index}")
+            try:
+                page = pq.get_page(page_index)
+            except StopIteration:
+                raise IndexError(f"В документе нет страницы с номером {page_index}") from None
+
+            page_element = self._load_page_element(pq, page_index, page)
+
+            # Страницы в дереве держим в порядке номеров, как при полной загрузке
+            position = sum(1 for loaded_index in self._loaded_pages if loaded_index < page_index)
+            root.insert(position, page_element)
+            self._loaded_pages.add(page_index)
+
+    def _parse_page_element(self, pq: PDFQuery, page_index: int, page: PDFPage) -> LayoutElement:
+        self._profiled_page_index = page_index
+        if self._adaptive_params is not None:
+            self._apply_page_params(pq, page_index, page)
+        with profile_stage(self._profiler, "interpret", page_index):
+            page_layout = pq.get_layout(page)
+        return make_page_element(pq, page_index, page_layout, self._profiler)
+
+    def _apply_page_params(self, pq: PDFQuery, page_index: int, page: PDFPage) -> None:
+        with profile_stage(self._profiler, "scan", page_index) as record:
+            density = scan_page(page_index, page)
+            record.num_elements = density.num_objects
+        page_params = self._adaptive_params.choose(density, self._base_laparams, self._base_resort)
+        # Параметры анализа разметки хранятся в устройстве pdfminer, а resort - в самом PDFQuery,
+        # и те и другие читаются заново при разборе каждой страницы
+        pq.device.laparams = page_params.laparams
+        pq.resort = page_params.resort
+        self.page_params[page_index] = page_params
+
+    def _load_page_element(self, pq: PDFQuery, page_index: int, page: PDFPage) -> LayoutElement:
+        cache = self._layout_cache
+        if cache is None:
+            return self._parse_page_element(pq, page_index, page)
+
+        if self._document_key is None:
+            key_params = self._pq_params
+            if self._element_filter is not None:
+                key_params = {**key_params, "element_filter": self._element_filter}
+            if self._adaptive_params is not None:
+                key_params = {**key_params, "adaptive_params": self._adaptive_params}
+            self._document_key = cache.make_document_key(self._file_path, key_params)
+        # PDFQuery хранит ссылки на все элементы, чтобы не терялось свойство layout
+        with profile_stage(self._profiler, "cache", page_index):
+            page_element = cache.get_page(self._document_key, page_index, pq._elements)
+        if page_element is None:
+            page_element = self._parse_page_element(pq, page_index, page)
+            with profile_stage(self._profiler, "cache", page_index):
+                cache.put_page(self._document_key, page_index, page_element)
+        return page_element
+
+    def iter_pages(self, first_page_index: int = 0) -> Iterator[tuple[int, list[LayoutElement]]]:
+        """
+        Разбирает документ постранично и возвращает объекты каждой страницы по очереди.
+        В отличие от get_all_page_elements(), разобранные страницы нигде не накапливаются:
+        после перехода к следующей странице объекты предыдущей освобождаются,
+        если вызывающий код сам не хранит ссылки на них.
+        Поэтому расход памяти не зависит от количества страниц в документе.
+
+        Для обхода используется отдельный экземпляр PDFQuery, поэтому метод
+        не влияет на дерево элементов в свойстве pq и не требует вызова close().
+
+        :param first_page_index: Номер страницы, с которой начинается обход.
+        :return: Генератор пар (номер страницы, список всех объектов страницы).
+        """
+        pq = self._create_pq()
+        # По умолчанию pdfminer запоминает все разобранные объекты документа
+        # (потоки данных страниц и т.п.), для постраничного обхода это не нужно
+        pq.doc.caching = False
+        try:
+            for page_index, page in enumerate(PDFPage.create_pages(pq.doc)):
+                if page_index < first_page_index:
+                    continue
+                # Для каждой страницы создаётся новое устройство, чтобы в нём
+                # не оставался результат анализа предыдущей страницы.
+                # PDFQuery хранит ссылки на все созданные элементы, поэтому
+                # элементы каждой страницы собираются в отдельный список:
+                # после перехода к следующей странице их хранит только вызывающий код
+                self._create_device(pq)
+                pq._elements = []
+                page_element = self._load_page_element(pq, page_index, page)
+                page_elements = list(page_element.iterdescendants())
+
+                yield page_index, page_elements
+                del page_element, page_elements
+        finally:
+            pq.file.close()
 
     def close(self) -> None:
         """
         Закрывает документ.
         Необходимо делать это явно, т.к. PDFQuery всегда держит файл открытым для чтения.
+        Вместо явного вызова можно использовать парсер как контекстный менеджер.
         """
         pq = self._pq
         if pq is not None and pq.file is not None:
             pq.file.close()
 
+    def __enter__(self) -> "BasicPdfParser":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def get_page_index(self, page_index: int) -> PageIndex:
+        """
+        Возвращает индекс элементов страницы, при необходимости загружая страницу.
+        Индекс строится один раз при первом обращении, после чего выборка элементов
+        по типам, по области страницы и повторные запросы по селекторам
+        выполняются без обхода дерева, см. модуль elementindex.
+
+        :param page_index: Номер страницы, начиная с 0.
+        """
+        index = self._page_indexes.get(page_index)
+        if index is None:
+            self.load_pages(page_index)
+            page_index_str = obj_to_string(page_index)
+            page_element = next(element for element in self.pq.tree.getroot()
+                                if element.get("page_index") == page_index_str)
+            index = PageIndex(page_element, self._index_grid_size)
+            self._page_indexes[page_index] = index
+        return index
+
     def get_all_page_elements(self, page_index: int) -> list[LayoutElement]:
         """
         :param page_index: Номер страницы, начиная с 0.
         :return: Список всех объектов, отрендеренных на странице.
         """
-        return self.pq.pq(f"LTPage[page_index=\"{page_index}\"] *")
+        index = self.get_page_index(page_index)
+        with profile_stage(self._profiler, "query", page_index) as record:
+            page_elements = self.pq.pq(index.elements)
+            record.num_elements = len(page_elements)
+        return page_elements
+
+    def find_elements(self, page_index: int, *tags: str) -> list[LayoutElement]:
+        """
+        :param page_index: Номер страницы, начиная с 0.
+        :param tags: Названия классов pdfminer, например "LTImage".
+        :return: Все объекты страницы указанных типов в порядке документа.
+        """
+        return self.get_page_index(page_index).find_elements(*tags)
+
+    def query(self, page_index: int, selector: str) -> list[LayoutElement]:
+        """
+        То же, что и pq.pq("LTPage[page_index=\"...\"] " + selector), но селектор компилируется
+        один раз, а результат запоминается для повторных запросов.
+
+        :param page_index: Номер страницы, начиная с 0.
+        :param selector: CSS-селектор, в том числе с расширениями PDFQuery (:in_bbox и т.п.).
+        """
+        return self.get_page_index(page_index).query(selector)
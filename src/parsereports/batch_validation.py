@@ -0,0 +1,156 @@
+"""
+Пакетная проверка табличных отчётов.
+Скрипт разбирает все PDF-файлы из папки (или из переданного списка)
+в нескольких процессах и для каждого файла выполняет анализ TableReportAnalyzer.
+По умолчанию обрабатываются файлы из папки pdf_storage,
+табличный отчёт в ней создаётся скриптом makereports/tablereport.py.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Union
+
+import pdf_storage
+from parsereports.basicparsing import BasicPdfParser
+from parsereports.tablereport_analysis import TableReportAnalyzer
+
+INPUT_DIR_PATH = str(pdf_storage.PDF_STORAGE_PATH)
+PAGE_INDEX = 0
+
+
+@dataclass
+class ReportValidationResult:
+    """
+    Результат анализа одного файла.
+    Содержит только простые типы, чтобы его можно было передать между процессами.
+    """
+    file_path: str
+    num_rows: int = 0
+    num_cols: int = 0
+    legend_labels: list[str] = field(default_factory=list)
+    error: Optional[str] = None
+    elapsed_s: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def collect_pdf_files(inputs: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]]) -> list[str]:
+    """
+    :param inputs: Путь к папке, путь к файлу или список таких путей.
+    :return: Отсортированный список путей ко всем найденным PDF-файлам.
+        Папки просматриваются без вложенных подпапок.
+    """
+    if isinstance(inputs, (str, os.PathLike)):
+        inputs = [inputs]
+
+    file_paths = []
+    for input_path in map(Path, inputs):
+        if input_path.is_dir():
+            file_paths.extend(sorted(str(path) for path in input_path.glob("*.pdf")))
+        else:
+            file_paths.append(str(input_path))
+    return file_paths
+
+
+def analyze_report_file(
+        file_path: str,
+        pq_params: Optional[dict[str, Any]] = None,
+        page_index: int = PAGE_INDEX,
+        use_mmap: bool = False
+) -> ReportValidationResult:
+    """
+    Разбирает одну страницу файла и анализирует её как табличный отчёт.
+    Функция выполняется в дочернем процессе, поэтому исключения не пробрасываются,
+    а записываются в результат.
+    """
+    result = ReportValidationResult(file_path=file_path)
+    start = time.monotonic()
+    try:
+        with BasicPdfParser(file_path, pq_params, lazy=True, use_mmap=use_mmap) as parser:
+            analyzer = TableReportAnalyzer()
+            analyzer.analyze(parser.get_all_page_elements(page_index))
+        page = analyzer.page_object
+        result.num_rows = page.table.num_rows
+        result.num_cols = page.table.num_cols
+        result.legend_labels = [legend_field.label.text.rstrip() for legend_field in page.legend.fields
+                                if legend_field.label is not None and legend_field.label.text]
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.elapsed_s = time.monotonic() - start
+    return result
+
+
+def _analyze_report_files(file_paths: list[str], **analyze_params: Any) -> list[ReportValidationResult]:
+    return [analyze_report_file(file_path, **analyze_params) for file_path in file_paths]
+
+
+def iter_batch_results(
+        inputs: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]],
+        max_workers: Optional[int] = None,
+        chunksize: int = 1,
+        pq_params: Optional[dict[str, Any]] = None,
+        page_index: int = PAGE_INDEX,
+        use_mmap: bool = False
+) -> Iterator[ReportValidationResult]:
+    """
+    Анализирует файлы в пуле процессов и возвращает результаты по мере готовности,
+    в том же порядке, в котором были найдены файлы.
+
+    :param inputs: Путь к папке, путь к файлу или список таких путей.
+    :param max_workers: Количество процессов, по умолчанию - по числу ядер.
+    :param chunksize: Сколько файлов передаётся в процесс за один раз.
+        Для большого количества мелких файлов увеличение этого параметра
+        снижает накладные расходы на передачу заданий между процессами.
+    :param pq_params: Параметры PDFQuery, см. BasicPdfParser.
+    :param page_index: Номер анализируемой страницы, начиная с 0.
+    :param use_mmap: Читать файлы через отображение в память, см. BasicPdfParser.
+    """
+    file_paths = collect_pdf_files(inputs)
+    if not file_paths:
+        return
+
+    worker = partial(_analyze_report_files, pq_params=pq_params, page_index=page_index, use_mmap=use_mmap)
+    max_workers = max_workers or os.cpu_count() or 1
+    # Ограничиваем количество пачек, ожидающих обработки, чтобы результаты
+    # не накапливались в памяти, пока вызывающий код не успевает их забирать
+    max_pending = 2 * max_workers
+    pending: deque[Future] = deque()
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        for chunk_start in range(0, len(file_paths), chunksize):
+            pending.append(executor.submit(worker, file_paths[chunk_start:chunk_start + chunksize]))
+            if len(pending) >= max_pending:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def main():
+    input_path = input("Введите путь к папке или файлу PDF или нажмите Enter "
+                       f"(по умолчанию будет прочитана папка \"{INPUT_DIR_PATH}\"): ") or INPUT_DIR_PATH
+    workers_str = input("Количество процессов (по умолчанию - по числу ядер): ")
+    max_workers = int(workers_str) if workers_str else None
+
+    num_files, num_failed = 0, 0
+    start = time.monotonic()
+    for result in iter_batch_results(input_path, max_workers=max_workers):
+        num_files += 1
+        if result.ok:
+            print(f"OK    {result.file_path}: таблица {result.num_rows}x{result.num_cols}, "
+                  f"{result.elapsed_s:.03f} s")
+        else:
+            num_failed += 1
+            print(f"ERROR {result.file_path}: {result.error}")
+    total_time = time.monotonic() - start
+
+    print(f"Обработано файлов: {num_files}, с ошибками: {num_failed}, время: {total_time:.03f} s")
+
+
+if __name__ == '__main__':
+    main()
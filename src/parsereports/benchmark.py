@@ -0,0 +1,259 @@
+"""
+Скрипт замеряет производительность парсинга PDF с различными наборами
+включённых опций PDFQuery: без параметров, FULL_PARAMS и FAST_PARAMS.
+
+Для измерений создаются табличные отчёты возрастающего размера
+(с помощью классов из makereports/tablereport.py), поэтому заранее
+создавать файлы не нужно, но нужны шрифты для создания отчётов.
+Время измеряется отдельно для каждого этапа:
+- open - открытие документа и чтение его структуры,
+- layout - интерпретация страниц и анализ их разметки в pdfminer,
+- tree - построение дерева элементов PDFQuery,
+- query - запрос всех элементов первой страницы,
+- analyze - анализ страницы с помощью TableReportAnalyzer.
+
+Результаты выводятся на консоль и сохраняются в JSON-файл,
+который удобно сравнивать между версиями проекта.
+Пример запуска:
+
+    python -m parsereports.benchmark --sizes 8x24 16x48 --runs 5 --output bench.json
+"""
+
+import argparse
+import datetime as dt
+import json
+import os
+import platform
+import tempfile
+import time
+import tracemalloc
+from importlib import metadata
+from typing import Any, Callable, Optional
+
+from pdfquery import PDFQuery
+from reportlab.lib.pagesizes import A4, landscape
+
+from makereports.tablereport import TableReportDataGenerator, TableReportRenderer
+from parsereports.basicparsing import FAST_PARAMS, FULL_PARAMS, make_page_element
+from parsereports.tablereport_analysis import TableReportAnalyzer
+
+PARAMS_SETS: dict[str, dict[str, Any]] = {
+    "default": {},
+    "full": FULL_PARAMS,
+    "fast": FAST_PARAMS,
+}
+STAGES = ("open", "layout", "tree", "query", "analyze")
+# Размеры таблиц в формате (колонки, строки)
+DEFAULT_SIZES = ((8, 24), (16, 48), (32, 96))
+NUM_MEASUREMENTS = 5
+PERCENTILES = (50, 90, 95)
+
+
+def percentile(values: list[float], percent: float) -> float:
+    """
+    Процентиль с линейной интерполяцией между соседними значениями.
+    """
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * percent / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values: list[float]) -> dict[str, float]:
+    summary = {
+        "min": min(values),
+        "mean": sum(values) / len(values),
+        "max": max(values),
+    }
+    for percent in PERCENTILES:
+        summary[f"p{percent}"] = percentile(values, percent)
+    return summary
+
+
+def create_table_report(pdf_file_path: str, num_cols: int, num_rows: int) -> None:
+    data_generator = TableReportDataGenerator()
+    data_generator.create_random_data(num_cols=num_cols, num_rows=num_rows)
+    TableReportRenderer(
+        report_data=data_generator.data,
+        pdf_file_path=pdf_file_path,
+        page_size=landscape(A4)
+    ).render_and_save()
+
+
+def run_stages(
+        pdf_file_path: str,
+        pq_params: dict[str, Any],
+        on_stage_done: Callable[[str], None]
+) -> int:
+    """
+    Выполняет все этапы парсинга и анализа первой страницы.
+    После каждого этапа вызывается on_stage_done с названием этапа.
+
+    :return: Количество элементов на первой странице.
+    """
+    pq = PDFQuery(pdf_file_path, **pq_params)
+    try:
+        pq.load(None)
+        on_stage_done("open")
+
+        layouts = [pq.get_layout(page) for page in pq._cached_pages()]
+        on_stage_done("layout")
+
+        root = pq.tree.getroot()
+        for page_index, page_layout in enumerate(layouts):
+            root.append(make_page_element(pq, page_index, page_layout))
+        on_stage_done("tree")
+
+        elements = pq.pq("LTPage[page_index=\"0\"] *")
+        on_stage_done("query")
+
+        TableReportAnalyzer().analyze(elements)
+        on_stage_done("analyze")
+    finally:
+        pq.file.close()
+    return len(elements)
+
+
+def measure_stage_times(pdf_file_path: str, pq_params: dict[str, Any]) -> tuple[dict[str, float], int]:
+    stage_times = {}
+    last_time = time.perf_counter()
+
+    def _on_stage_done(stage: str) -> None:
+        nonlocal last_time
+        now = time.perf_counter()
+        stage_times[stage] = now - last_time
+        last_time = now
+
+    num_elements = run_stages(pdf_file_path, pq_params, _on_stage_done)
+    return stage_times, num_elements
+
+
+def measure_peak_memory(pdf_file_path: str, pq_params: dict[str, Any]) -> int:
+    """
+    Пиковый объём памяти, выделенной интерпретатором Python за время всех этапов.
+    Измеряется в отдельном прогоне, т.к. tracemalloc сильно замедляет работу.
+    Память, выделенная внутри lxml, в этот объём не входит.
+    """
+    tracemalloc.start()
+    try:
+        run_stages(pdf_file_path, pq_params, lambda stage: None)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_file(
+        pdf_file_path: str,
+        pq_params: dict[str, Any],
+        num_measurements: int
+) -> dict[str, Any]:
+    runs: dict[str, list[float]] = {stage: [] for stage in (*STAGES, "total")}
+    num_elements = 0
+    for _ in range(num_measurements):
+        stage_times, num_elements = measure_stage_times(pdf_file_path, pq_params)
+        for stage, stage_time in stage_times.items():
+            runs[stage].append(stage_time)
+        runs["total"].append(sum(stage_times.values()))
+
+    return {
+        "num_elements": num_elements,
+        "stages": {stage: summarize(values) for stage, values in runs.items()},
+        "peak_memory_bytes": measure_peak_memory(pdf_file_path, pq_params),
+    }
+
+
+def run_benchmark(
+        sizes: tuple[tuple[int, int], ...] = DEFAULT_SIZES,
+        params_names: tuple[str, ...] = tuple(PARAMS_SETS.keys()),
+        num_measurements: int = NUM_MEASUREMENTS,
+        log: Optional[Callable[[str], None]] = print
+) -> dict[str, Any]:
+    """
+    :param sizes: Размеры создаваемых таблиц в формате (колонки, строки).
+    :param params_names: Названия наборов параметров из PARAMS_SETS.
+    :param num_measurements: Количество замеров для каждого файла и набора параметров.
+    :param log: Функция для вывода промежуточных результатов, None - не выводить.
+    :return: Результаты в виде словаря, который можно сохранить в JSON.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for num_cols, num_rows in sizes:
+            pdf_file_path = os.path.join(temp_dir, f"table_{num_cols}x{num_rows}.pdf")
+            create_table_report(pdf_file_path, num_cols, num_rows)
+            for params_name in params_names:
+                result = benchmark_file(pdf_file_path, PARAMS_SETS[params_name], num_measurements)
+                result.update(
+                    num_cols=num_cols,
+                    num_rows=num_rows,
+                    num_cells=(num_cols + 1) * (num_rows + 1),
+                    file_size_bytes=os.path.getsize(pdf_file_path),
+                    params=params_name
+                )
+                results.append(result)
+                if log is not None:
+                    log(format_result(result))
+
+    # Кривая масштабирования: медиана полного времени в зависимости от количества ячеек
+    scaling = {
+        params_name: [[result["num_cells"], result["stages"]["total"]["p50"]]
+                      for result in results if result["params"] == params_name]
+        for params_name in params_names
+    }
+
+    return {
+        "created": dt.datetime.now().isoformat(timespec="seconds"),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            **{package: _package_version(package) for package in ("pdfminer.six", "pdfquery", "lxml")},
+        },
+        "num_measurements": num_measurements,
+        "results": results,
+        "scaling": scaling,
+    }
+
+
+def format_result(result: dict[str, Any]) -> str:
+    stages = result["stages"]
+    stage_texts = ", ".join(f"{stage} {stages[stage]['p50']:.03f}" for stage in STAGES)
+    return (f"{result['num_cols']}x{result['num_rows']} {result['params']:>7}: "
+            f"total p50 {stages['total']['p50']:.03f} s, p90 {stages['total']['p90']:.03f} s "
+            f"({stage_texts}), "
+            f"{result['num_elements']} elements, peak memory {result['peak_memory_bytes'] / 2 ** 20:.1f} MiB")
+
+
+def _package_version(package: str) -> Optional[str]:
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def _parse_size(text: str) -> tuple[int, int]:
+    num_cols, num_rows = text.lower().split("x")
+    return int(num_cols), int(num_rows)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Замеры производительности парсинга табличных отчётов")
+    arg_parser.add_argument("--sizes", nargs="+", type=_parse_size,
+                            default=list(DEFAULT_SIZES),
+                            help="размеры таблиц в формате КОЛОНКИxСТРОКИ, например 8x24")
+    arg_parser.add_argument("--params", nargs="+", choices=list(PARAMS_SETS.keys()),
+                            default=list(PARAMS_SETS.keys()),
+                            help="наборы параметров PDFQuery")
+    arg_parser.add_argument("--runs", type=int, default=NUM_MEASUREMENTS,
+                            help="количество замеров для каждого варианта")
+    arg_parser.add_argument("--output", default="benchmark.json",
+                            help="путь к JSON-файлу с результатами")
+    args = arg_parser.parse_args()
+
+    report = run_benchmark(tuple(args.sizes), tuple(args.params), args.runs)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print("Результаты сохранены в файл " + args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,448 @@
+"""
+Этот модуль содержит средства для чтения потоков данных (content stream) страниц
+без интерпретации и анализа разметки в pdfminer.
+
+Потоки раскодируются по частям: данные со сжатием Flate (его использует большинство генераторов PDF,
+в том числе reportlab) раскодируются кусками фиксированного размера, а разбор операторов
+идёт по мере раскодирования. Поэтому даже для страниц с очень большими потоками данных
+в памяти не хранится весь раскодированный поток или весь список операторов.
+
+Формат потока данных описан в спецификации PDF (https://pdfa.org/), раздел "Content Streams".
+Каждый оператор записывается после своих операндов, например: "10 20 m 30 40 l S".
+"""
+
+import re
+import zlib
+from dataclasses import dataclass, field
+from itertools import chain
+from typing import Any, Iterable, Iterator, Optional
+
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdftypes import LITERALS_FLATE_DECODE, PDFStream, resolve1
+from pdfminer.psparser import LIT, PSLiteral
+
+# Размер кусков, на которые разбиваются данные при раскодировании
+CHUNK_SIZE = 64 * 2 ** 10
+
+_FLATE_FILTER_NAMES = {str(literal.name) for literal in LITERALS_FLATE_DECODE}
+_WHITESPACE = b"\x00\t\n\x0c\r "
+
+# Токены, которые можно распознать регулярным выражением.
+# Строки в круглых скобках и данные встроенных изображений разбираются отдельно.
+_TOKEN_RE = re.compile(rb"""
+    (?P<whitespace>[\x00\t\n\x0c\r ]+)
+    | (?P<comment>%[^\r\n]*)
+    | (?P<number>[+-]?(?:\d+\.?\d*|\.\d+))(?![^\x00\t\n\x0c\r ()<>\[\]{}/%])
+    | (?P<name>/[^\x00\t\n\x0c\r ()<>\[\]{}/%]*)
+    | (?P<dict_start><<)
+    | (?P<dict_end>>>)
+    | (?P<hex_string><[0-9A-Fa-f\x00\t\n\x0c\r ]*>)
+    | (?P<array_start>\[)
+    | (?P<array_end>\])
+    | (?P<keyword>[^\x00\t\n\x0c\r ()<>\[\]{}/%]+)
+""", re.VERBOSE)
+_NAME_ESCAPE_RE = re.compile(rb"#([0-9A-Fa-f]{2})")
+_STRING_ESCAPES = {
+    ord("n"): b"\n", ord("r"): b"\r", ord("t"): b"\t", ord("b"): b"\b", ord("f"): b"\f",
+    ord("("): b"(", ord(")"): b")", ord("\\"): b"\\",
+}
+# Конец данных встроенного изображения: оператор EI, отделённый пробельными символами
+_INLINE_IMAGE_END_RE = re.compile(rb"[\x00\t\n\x0c\r ]EI(?=[\x00\t\n\x0c\r ]|$)")
+_KEYWORD_VALUES = {b"true": True, b"false": False, b"null": None}
+# Токены, которые не могут продолжаться в следующем куске данных
+_COMPLETE_TOKEN_KINDS = {"dict_start", "dict_end", "hex_string", "array_start", "array_end"}
+
+
+class ContentStreamError(ValueError):
+    """
+    Ошибка синтаксиса в потоке данных страницы.
+    """
+
+
+def iter_stream_chunks(stream: PDFStream, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Раскодирует поток по частям.
+    Поток без фильтров или только с фильтром FlateDecode без предиктора раскодируется кусками
+    не больше chunk_size байт. Для остальных фильтров поток раскодируется pdfminer целиком,
+    а затем тоже возвращается кусками.
+
+    :param stream: Поток документа, например, поток данных страницы.
+    :param chunk_size: Наибольший размер куска раскодированных данных.
+    :return: Генератор кусков раскодированных данных.
+    """
+    if stream.rawdata is None:
+        # Поток уже раскодирован ранее
+        data = stream.data or b""
+        for position in range(0, len(data), chunk_size):
+            yield data[position:position + chunk_size]
+        return
+
+    filters = stream.get_filters()
+    is_flate = (len(filters) == 1 and isinstance(filters[0][0], PSLiteral)
+                and str(filters[0][0].name) in _FLATE_FILTER_NAMES and not filters[0][1])
+    if filters and not is_flate:
+        yield from iter_stream_chunks(_decoded_copy(stream), chunk_size)
+        return
+
+    data = stream.rawdata
+    if stream.decipher:
+        data = stream.decipher(stream.objid, stream.genno, data, stream.attrs)
+    if not is_flate:
+        for position in range(0, len(data), chunk_size):
+            yield data[position:position + chunk_size]
+        return
+
+    decompressor = zlib.decompressobj()
+    for position in range(0, len(data), chunk_size):
+        chunk = decompressor.decompress(data[position:position + chunk_size], chunk_size)
+        yield chunk
+        # Ограничение размера выходных данных оставляет часть входных данных необработанной
+        while decompressor.unconsumed_tail:
+            yield decompressor.decompress(decompressor.unconsumed_tail, chunk_size)
+        if decompressor.eof:
+            break
+    yield decompressor.flush()
+
+
+def iter_streams_chunks(streams: Iterable[PDFStream], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Раскодирует несколько потоков, следующих друг за другом, как один поток.
+    Между потоками добавляется перевод строки: по спецификации граница потоков
+    не может разделять токен, но и не обязана быть отделена пробельным символом.
+    """
+    for stream in streams:
+        yield from iter_stream_chunks(stream, chunk_size)
+        yield b"\n"
+
+
+def _decoded_copy(stream: PDFStream) -> PDFStream:
+    # Раскодируем копию, чтобы раскодированные данные не оставались в кэше объектов документа
+    stream_copy = PDFStream(stream.attrs, stream.rawdata, stream.decipher)
+    stream_copy.set_objid(stream.objid, stream.genno)
+    stream_copy.decode()
+    return stream_copy
+
+
+def _decode_name(token: bytes) -> PSLiteral:
+    name = _NAME_ESCAPE_RE.sub(lambda match: bytes((int(match.group(1), 16),)), token[1:])
+    return LIT(name.decode("latin-1"))
+
+
+def _find_string_end(buffer: bytes, start: int) -> int:
+    """
+    :param start: Позиция открывающей скобки.
+    :return: Позиция после закрывающей скобки или -1, если строка не закончилась в буфере.
+    """
+    depth = 0
+    position = start
+    length = len(buffer)
+    while position < length:
+        char = buffer[position]
+        if char == 0x5c:  # "\"
+            position += 2
+            continue
+        if char == 0x28:  # "("
+            depth += 1
+        elif char == 0x29:  # ")"
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    return -1
+
+
+def _decode_string(raw: bytes) -> bytes:
+    result = bytearray()
+    position = 0
+    length = len(raw)
+    while position < length:
+        char = raw[position]
+        if char != 0x5c:
+            result.append(char)
+            position += 1
+            continue
+        position += 1
+        if position >= length:
+            break
+        char = raw[position]
+        if char in _STRING_ESCAPES:
+            result += _STRING_ESCAPES[char]
+            position += 1
+        elif 0x30 <= char <= 0x37:
+            # Восьмеричный код символа, до трёх цифр
+            end = position
+            while end < length and end - position < 3 and 0x30 <= raw[end] <= 0x37:
+                end += 1
+            result.append(int(raw[position:end], 8) & 0xff)
+            position = end
+        elif char == 0x0d:
+            # Перенос строки после обратной косой черты игнорируется
+            position += 2 if raw[position + 1:position + 2] == b"\n" else 1
+        elif char == 0x0a:
+            position += 1
+        else:
+            result.append(char)
+            position += 1
+    return bytes(result)
+
+
+def _decode_hex_string(token: bytes) -> bytes:
+    digits = bytes(char for char in token[1:-1] if char not in _WHITESPACE)
+    if len(digits) % 2:
+        digits += b"0"
+    return bytes.fromhex(digits.decode("ascii"))
+
+
+def iter_operations(chunks: Iterable[bytes]) -> Iterator[tuple[str, list[Any]]]:
+    """
+    Разбирает поток данных на операторы с операндами.
+    Операнды представлены значениями Python: числа - int или float, имена - PSLiteral
+    (как в pdfminer), строки - bytes, массивы - list, словари - dict с ключами-строками.
+    Встроенное изображение возвращается как один оператор "BI" с операндами
+    [словарь параметров, данные изображения].
+
+    :param chunks: Куски раскодированного потока данных, например, из iter_stream_chunks().
+        Токены и строки могут быть разделены между кусками.
+    :return: Генератор пар (оператор, список операндов).
+    """
+    operands: list[Any] = []
+    # Стек незакрытых массивов и словарей, в которые добавляются значения
+    containers: list[tuple[str, list[Any]]] = []
+    buffer = b""
+    position = 0
+    in_inline_image = False
+
+    def _add_value(value: Any) -> None:
+        (containers[-1][1] if containers else operands).append(value)
+
+    for chunk in chain(chunks, (None,)):
+        is_final = chunk is None
+        if not is_final:
+            if not chunk:
+                continue
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        length = len(buffer)
+        while position < length:
+            if in_inline_image:
+                # Данные изображения начинаются после одного пробельного символа за оператором ID
+                end_match = _INLINE_IMAGE_END_RE.search(buffer, position + 1)
+                if end_match is None:
+                    if not is_final:
+                        break
+                    raise ContentStreamError("Не найден конец встроенного изображения (EI)")
+                image_params = dict(zip((str(key.name) for key in operands[0::2]), operands[1::2]))
+                yield "BI", [image_params, buffer[position + 1:end_match.start()]]
+                operands = []
+                position = end_match.end()
+                in_inline_image = False
+                continue
+
+            if buffer[position] == 0x28:  # "("
+                end = _find_string_end(buffer, position)
+                if end < 0:
+                    if not is_final:
+                        break
+                    raise ContentStreamError("Строка не закрыта")
+                _add_value(_decode_string(buffer[position + 1:end - 1]))
+                position = end
+                continue
+
+            match = _TOKEN_RE.match(buffer, position)
+            if match is None:
+                if not is_final and buffer[position] in b"<>":
+                    # Шестнадцатеричная строка или ">>" продолжаются в следующем куске
+                    break
+                raise ContentStreamError(f"Неожиданный символ {buffer[position:position + 1]!r}")
+            kind = match.lastgroup
+            if match.end() == length and not is_final and kind not in _COMPLETE_TOKEN_KINDS:
+                # Токен может продолжаться в следующем куске
+                break
+            token = match.group()
+            position = match.end()
+
+            if kind in ("whitespace", "comment"):
+                continue
+            if kind == "number":
+                _add_value(float(token) if b"." in token else int(token))
+            elif kind == "name":
+                _add_value(_decode_name(token))
+            elif kind == "hex_string":
+                _add_value(_decode_hex_string(token))
+            elif kind in ("array_start", "dict_start"):
+                containers.append((kind, []))
+            elif kind in ("array_end", "dict_end"):
+                expected_kind = "array_start" if kind == "array_end" else "dict_start"
+                if not containers or containers[-1][0] != expected_kind:
+                    raise ContentStreamError(f"Непарная скобка {token!r}")
+                _, values = containers.pop()
+                if kind == "dict_end":
+                    values = dict(zip((str(key.name) for key in values[0::2]), values[1::2]))
+                _add_value(values)
+            elif token in _KEYWORD_VALUES:
+                _add_value(_KEYWORD_VALUES[token])
+            else:
+                operator = token.decode("latin-1")
+                if containers:
+                    raise ContentStreamError(f"Оператор {operator} внутри массива или словаря")
+                if operator == "BI":
+                    operands = []
+                elif operator == "ID":
+                    in_inline_image = True
+                else:
+                    yield operator, operands
+                    operands = []
+
+    if containers:
+        raise ContentStreamError("Массив или словарь не закрыт в конце потока")
+
+
+def get_page_streams(page: PDFPage) -> list[PDFStream]:
+    """
+    :return: Потоки данных страницы. Атрибут Contents может быть
+        как одним потоком, так и массивом потоков, которые следуют друг за другом.
+    """
+    return [stream for stream in map(resolve1, page.contents) if isinstance(stream, PDFStream)]
+
+
+def iter_content_operations(
+        streams: Iterable[PDFStream],
+        resources: Optional[dict],
+        follow_forms: bool = True,
+        chunk_size: int = CHUNK_SIZE
+) -> Iterator[tuple[str, list[Any]]]:
+    """
+    Разбирает потоки данных страницы (или рисунка) как один общий поток.
+
+    :param streams: Потоки данных, например, из get_page_streams().
+    :param resources: Ресурсы страницы, в которых ищутся рисунки (Form XObject).
+    :param follow_forms: Если включено, то после оператора Do, выводящего рисунок,
+        возвращаются операторы из потока данных этого рисунка (рекурсивно).
+    :param chunk_size: Размер кусков при раскодировании, см. iter_stream_chunks().
+    """
+    operations = _iter_operations_with_forms(iter_streams_chunks(streams, chunk_size), resources,
+                                             follow_forms, chunk_size, [])
+    return ((operator, operands) for operator, operands, _ in operations)
+
+
+def get_xobject(resources: Optional[dict], operands: list[Any], subtype: str) -> Optional[PDFStream]:
+    """
+    :param resources: Ресурсы страницы или рисунка.
+    :param operands: Операнды оператора Do.
+    :param subtype: Тип внешнего объекта: "Form" или "Image".
+    :return: Внешний объект, который выводит оператор, или None, если это объект другого типа.
+    """
+    if not operands or not isinstance(operands[-1], PSLiteral):
+        return None
+    xobjects = resolve1((resources or {}).get("XObject")) or {}
+    xobject = resolve1(xobjects.get(str(operands[-1].name)))
+    if isinstance(xobject, PDFStream) and resolve1(xobject.attrs.get("Subtype")) is LIT(subtype):
+        return xobject
+    return None
+
+
+def get_form(resources: Optional[dict], operands: list[Any]) -> Optional[PDFStream]:
+    """
+    :param resources: Ресурсы страницы или рисунка.
+    :param operands: Операнды оператора Do.
+    :return: Рисунок (Form XObject), который выводит оператор, или None, если это не рисунок.
+    """
+    return get_xobject(resources, operands, "Form")
+
+
+def _iter_operations_with_forms(
+        chunks: Iterable[bytes],
+        resources: Optional[dict],
+        follow_forms: bool,
+        chunk_size: int,
+        form_stack: list[int]
+) -> Iterator[tuple[str, list[Any], Optional[dict]]]:
+    # Вместе с оператором возвращаются ресурсы, в которых ищутся его внешние объекты
+    for operator, operands in iter_operations(chunks):
+        yield operator, operands, resources
+        if not follow_forms or operator != "Do":
+            continue
+        form = get_form(resources, operands)
+        # Защита от циклических ссылок рисунков друг на друга
+        if form is None or id(form) in form_stack:
+            continue
+        form_stack.append(id(form))
+        form_resources = resolve1(form.attrs.get("Resources")) or resources
+        yield from _iter_operations_with_forms(iter_stream_chunks(form, chunk_size), form_resources,
+                                               follow_forms, chunk_size, form_stack)
+        form_stack.pop()
+
+
+@dataclass
+class PageOperatorStats:
+    """
+    Статистика операторов в потоке данных одной страницы.
+    """
+    page_index: int
+    num_operations: int = 0
+    # Количество вызовов каждого оператора
+    operator_counts: dict[str, int] = field(default_factory=dict)
+    # Количество выводов рисунков (Form XObject), изображений (Image XObject) и встроенных изображений
+    num_forms: int = 0
+    num_images: int = 0
+    num_inline_images: int = 0
+    # Размер раскодированных потоков данных страницы без учёта рисунков
+    content_size_bytes: int = 0
+
+    def most_common(self, count: int = 10) -> list[tuple[str, int]]:
+        return sorted(self.operator_counts.items(), key=lambda item: (-item[1], item[0]))[:count]
+
+
+def collect_page_stats(
+        page_index: int,
+        page: PDFPage,
+        follow_forms: bool = True,
+        chunk_size: int = CHUNK_SIZE
+) -> PageOperatorStats:
+    """
+    :param page_index: Номер страницы, начиная с 0.
+    :param page: Страница pdfminer.
+    :param follow_forms: Учитывать ли операторы из рисунков, см. iter_content_operations().
+    :param chunk_size: Размер кусков при раскодировании, см. iter_stream_chunks().
+    """
+    stats = PageOperatorStats(page_index)
+
+    def _iter_counted_chunks() -> Iterator[bytes]:
+        for stream in get_page_streams(page):
+            for chunk in iter_stream_chunks(stream, chunk_size):
+                stats.content_size_bytes += len(chunk)
+                yield chunk
+            yield b"\n"
+
+    counts = stats.operator_counts
+    for operator, operands, resources in _iter_operations_with_forms(_iter_counted_chunks(), page.resources,
+                                                                     follow_forms, chunk_size, []):
+        counts[operator] = counts.get(operator, 0) + 1
+        # Оператор Do выводит и рисунки, и изображения
+        if operator == "Do":
+            if get_form(resources, operands) is not None:
+                stats.num_forms += 1
+            elif get_xobject(resources, operands, "Image") is not None:
+                stats.num_images += 1
+
+    stats.num_operations = sum(counts.values())
+    stats.num_inline_images = counts.get("BI", 0)
+    return stats
+
+
+def iter_page_stats(
+        doc: PDFDocument,
+        follow_forms: bool = True,
+        chunk_size: int = CHUNK_SIZE
+) -> Iterator[PageOperatorStats]:
+    """
+    Собирает статистику операторов для всех страниц документа по очереди.
+    После каждой страницы кэш разобранных объектов документа очищается,
+    поэтому память не растёт с количеством страниц.
+    """
+    for page_index, page in enumerate(PDFPage.create_pages(doc)):
+        yield collect_page_stats(page_index, page, follow_forms, chunk_size)
+        doc._cached_objs.clear()
+        doc._parsed_objs.clear()
@@ -0,0 +1,113 @@
+"""
+Этот модуль содержит определения для выборочного извлечения объектов страницы.
+
+Фильтр применяется на уровне "устройства" pdfminer: объекты, не прошедшие фильтр,
+отбрасываются сразу после интерпретации страницы, до анализа разметки
+(группировки символов в строки и блоки текста) и до построения дерева PDFQuery.
+Поэтому эти, самые долгие, этапы выполняются только для нужной части страницы.
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, Optional
+
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams, LTChar, LTComponent, LTFigure, LTLayoutContainer
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+
+
+@dataclass(frozen=True)
+class ElementFilter:
+    """
+    Условия отбора объектов страницы.
+
+    Текстовые объекты (LTTextBox..., LTTextLine...) создаются pdfminer уже после фильтрации
+    из отдельных символов. Поэтому, если в tags указан "LTChar" или любой тип,
+    начинающийся с "LTText", то сохраняются символы, а строки и блоки текста строятся из них как обычно.
+    Рисунки (LTFigure) сохраняются, если в них остались объекты, прошедшие фильтр,
+    или если они явно указаны в tags.
+    """
+    # Область страницы (x0, y0, x1, y1): сохраняются только объекты, целиком лежащие в ней,
+    # как при запросе PDFQuery с селектором :in_bbox
+    bbox: Optional[tuple[float, float, float, float]] = None
+    # Названия классов pdfminer, например ("LTLine", "LTTextLineHorizontal")
+    tags: Optional[tuple[str, ...]] = None
+
+    def __post_init__(self):
+        if self.bbox is not None:
+            object.__setattr__(self, "bbox", tuple(float(value) for value in self.bbox))
+        if self.tags is not None:
+            # Упорядочиваем, чтобы repr фильтра был стабильным (он используется в ключе кэша страниц)
+            object.__setattr__(self, "tags", tuple(sorted(set(self.tags))))
+
+    @classmethod
+    def create(
+            cls,
+            bbox: Optional[Iterable[float]] = None,
+            tags: Optional[Iterable[str]] = None
+    ) -> "ElementFilter":
+        """
+        :param bbox: Область страницы (x0, y0, x1, y1), None - вся страница.
+        :param tags: Названия классов pdfminer, None - объекты любых типов.
+        """
+        return cls(
+            bbox=tuple(bbox) if bbox is not None else None,
+            tags=tuple(tags) if tags is not None else None
+        )
+
+    @property
+    def keeps_text(self) -> bool:
+        return self.tags is None or any(tag == "LTChar" or tag.startswith("LTText") for tag in self.tags)
+
+    def is_in_bbox(self, item: LTComponent) -> bool:
+        if self.bbox is None:
+            return True
+        x0, y0, x1, y1 = self.bbox
+        return item.x0 >= x0 and item.y0 >= y0 and item.x1 <= x1 and item.y1 <= y1
+
+    def accepts(self, item: LTComponent) -> bool:
+        """
+        :param item: Объект страницы pdfminer до анализа разметки.
+        :return: True, если объект нужно сохранить.
+        """
+        if isinstance(item, LTFigure):
+            if len(item) > 0:
+                return True
+            return self.tags is not None and "LTFigure" in self.tags and self.is_in_bbox(item)
+        if self.tags is not None:
+            if isinstance(item, LTChar):
+                if not self.keeps_text:
+                    return False
+            elif type(item).__name__ not in self.tags:
+                return False
+        return self.is_in_bbox(item)
+
+
+class SelectivePageAggregator(PDFPageAggregator):
+    """
+    Вариант PDFPageAggregator, который перед анализом разметки
+    отбрасывает объекты, не прошедшие фильтр.
+    """
+
+    def __init__(
+            self,
+            rsrcmgr: PDFResourceManager,
+            element_filter: ElementFilter,
+            pageno: int = 1,
+            laparams: Optional[LAParams] = None
+    ):
+        PDFPageAggregator.__init__(self, rsrcmgr, pageno=pageno, laparams=laparams)
+        self.element_filter = element_filter
+
+    def end_figure(self, name: str) -> None:
+        # Объекты рисунка фильтруются до того, как рисунок добавится в родительский контейнер,
+        # чтобы пустой после фильтрации рисунок тоже был отброшен
+        self._filter_items(self.cur_item)
+        PDFPageAggregator.end_figure(self, name)
+
+    def end_page(self, page: PDFPage) -> None:
+        self._filter_items(self.cur_item)
+        PDFPageAggregator.end_page(self, page)
+
+    def _filter_items(self, container: LTLayoutContainer) -> None:
+        container._objs = [item for item in container if self.element_filter.accepts(item)]
@@ -0,0 +1,179 @@
+"""
+Этот модуль содержит индексы элементов страницы и кэш скомпилированных селекторов.
+
+Каждый запрос PDFQuery вида pq.pq("LTPage[page_index=\"0\"] LTImage") заново переводит
+CSS-селектор в XPath, компилирует его и обходит всё дерево документа.
+Для повторяющихся запросов к уже загруженным страницам это лишняя работа:
+- скомпилированные селекторы кэшируются (compile_selector()),
+- для каждой страницы один раз строится индекс PageIndex: список всех элементов,
+  элементы по типам и, при необходимости, сетка по координатам,
+  а результаты запросов по селекторам запоминаются.
+Индекс строится по уже загруженной странице и предполагает, что дерево элементов
+после этого не меняется.
+"""
+
+import functools
+import heapq
+import math
+from typing import Iterable, Iterator, Optional
+
+from lxml import etree
+from pdfquery.pdfquery import LayoutElement
+from pdfquery.pdftranslator import PDFQueryTranslator
+
+SELECTOR_CACHE_SIZE = 256
+# Префикс XPath, с которым PyQuery выполняет селекторы
+DEFAULT_XPATH_PREFIX = "descendant-or-self::"
+
+_TRANSLATOR = PDFQueryTranslator()
+_BBOX_ATTRIBUTES = ("x0", "y0", "x1", "y1")
+
+Bbox = tuple[float, float, float, float]
+
+
+@functools.lru_cache(maxsize=SELECTOR_CACHE_SIZE)
+def compile_selector(selector: str, prefix: str = DEFAULT_XPATH_PREFIX) -> etree.XPath:
+    """
+    Переводит CSS-селектор с расширениями PDFQuery (:in_bbox, :overlaps_bbox) в XPath
+    так же, как это делает PyQuery, и компилирует его.
+
+    :param selector: CSS-селектор.
+    :param prefix: Префикс XPath: DEFAULT_XPATH_PREFIX - как в PyQuery,
+        "descendant::" - только среди потомков элемента, к которому применяется запрос.
+    :return: Скомпилированный запрос, который можно вызывать для элемента: xpath(element).
+    """
+    return etree.XPath(_TRANSLATOR.css_to_xpath(selector.replace("[@", "["), prefix))
+
+
+def _get_bbox(element: LayoutElement) -> Optional[Bbox]:
+    try:
+        return tuple(float(element.get(attribute)) for attribute in _BBOX_ATTRIBUTES)
+    except (TypeError, ValueError):
+        # У элементов без координат (например, LTAnno) атрибутов нет
+        return None
+
+
+class PageIndex:
+    """
+    Индекс элементов одной загруженной страницы.
+    Элементы во всех результатах возвращаются в порядке документа,
+    как в результатах запросов PDFQuery.
+    """
+
+    def __init__(self, page_element: LayoutElement, grid_size: Optional[float] = None):
+        """
+        :param page_element: Элемент LTPage из дерева PDFQuery.
+        :param grid_size: Размер ячейки сетки в пунктах. Если задан, то элементы
+            дополнительно раскладываются по ячейкам сетки, и поиск по области
+            просматривает только элементы из ячеек, которые пересекаются с этой областью.
+        """
+        self.page_element = page_element
+        # Все потомки страницы, как в запросе "LTPage[page_index=...] *"
+        self.elements: list[LayoutElement] = list(page_element.iterdescendants())
+        self._bboxes = [_get_bbox(element) for element in self.elements]
+        # Для каждого типа - номера элементов в списке elements по возрастанию
+        self._positions_by_tag: dict[str, list[int]] = {}
+        for position, element in enumerate(self.elements):
+            self._positions_by_tag.setdefault(element.tag, []).append(position)
+        self._grid_size = grid_size
+        self._grid: dict[tuple[int, int], list[int]] = {}
+        if grid_size is not None:
+            for position, bbox in enumerate(self._bboxes):
+                if bbox is not None:
+                    for cell in self._iter_cells(bbox):
+                        self._grid.setdefault(cell, []).append(position)
+        # Крайние занятые ячейки сетки: (первая колонка, первая строка, последняя колонка, последняя строка)
+        self._grid_bounds: Optional[tuple[int, int, int, int]] = None
+        if self._grid:
+            self._grid_bounds = (min(column for column, _ in self._grid), min(row for _, row in self._grid),
+                                 max(column for column, _ in self._grid), max(row for _, row in self._grid))
+        self._query_results: dict[str, list[LayoutElement]] = {}
+
+    @property
+    def tags(self) -> list[str]:
+        return list(self._positions_by_tag.keys())
+
+    def find_elements(self, *tags: str) -> list[LayoutElement]:
+        """
+        :param tags: Названия классов pdfminer, например "LTLine".
+        :return: Все элементы страницы указанных типов.
+        """
+        if len(tags) == 1:
+            return [self.elements[position] for position in self._positions_by_tag.get(tags[0], ())]
+        positions = heapq.merge(*(self._positions_by_tag.get(tag, ()) for tag in set(tags)))
+        return [self.elements[position] for position in positions]
+
+    def query(self, selector: str) -> list[LayoutElement]:
+        """
+        Выполняет запрос по селектору среди потомков страницы.
+        Результат запоминается, поэтому повторный запрос с тем же селектором не обходит дерево.
+
+        :param selector: CSS-селектор, например "LTImage" или "LTTextLineHorizontal:contains('Дата')".
+        :return: То же, что и запрос pq.pq("LTPage[page_index=\"...\"] " + selector).
+        """
+        results = self._query_results.get(selector)
+        if results is None:
+            results = compile_selector(selector, "descendant::")(self.page_element)
+            self._query_results[selector] = results
+        return list(results)
+
+    def find_in_bbox(self, bbox: Iterable[float], *tags: str) -> list[LayoutElement]:
+        """
+        :param bbox: Область страницы (x0, y0, x1, y1).
+        :param tags: Названия классов pdfminer, если не заданы - элементы любых типов.
+        :return: Элементы, целиком лежащие в области, как при запросе с селектором :in_bbox.
+        """
+        x0, y0, x1, y1 = bbox
+        return self._find(
+            (x0, y0, x1, y1), tags,
+            lambda box: box[0] >= x0 and box[1] >= y0 and box[2] <= x1 and box[3] <= y1
+        )
+
+    def find_overlapping(self, bbox: Iterable[float], *tags: str) -> list[LayoutElement]:
+        """
+        :param bbox: Область страницы (x0, y0, x1, y1).
+        :param tags: Названия классов pdfminer, если не заданы - элементы любых типов.
+        :return: Элементы, пересекающиеся с областью, как при запросе с селектором :overlaps_bbox.
+        """
+        x0, y0, x1, y1 = bbox
+        return self._find(
+            (x0, y0, x1, y1), tags,
+            lambda box: box[0] <= x1 and box[1] <= y1 and box[2] >= x0 and box[3] >= y0
+        )
+
+    def _find(self, bbox: Bbox, tags: tuple[str, ...], matches) -> list[LayoutElement]:
+        if self._grid_size is not None:
+            positions = sorted({position for cell in self._iter_cells(bbox, clip=True)
+                                for position in self._grid.get(cell, ())})
+        elif tags:
+            positions = heapq.merge(*(self._positions_by_tag.get(tag, ()) for tag in set(tags)))
+        else:
+            positions = range(len(self.elements))
+
+        found = []
+        for position in positions:
+            element_bbox = self._bboxes[position]
+            if element_bbox is None or not matches(element_bbox):
+                continue
+            element = self.elements[position]
+            if tags and element.tag not in tags:
+                continue
+            found.append(element)
+        return found
+
+    def _iter_cells(self, bbox: Bbox, clip: bool = False) -> Iterator[tuple[int, int]]:
+        x0, y0, x1, y1 = bbox
+        size = self._grid_size
+        first_column, last_column = math.floor(x0 / size), math.floor(x1 / size)
+        first_row, last_row = math.floor(y0 / size), math.floor(y1 / size)
+        if clip:
+            # Область запроса может быть намного больше страницы, а пустые ячейки смотреть незачем
+            if self._grid_bounds is None:
+                return
+            first_column = max(first_column, self._grid_bounds[0])
+            first_row = max(first_row, self._grid_bounds[1])
+            last_column = min(last_column, self._grid_bounds[2])
+            last_row = min(last_row, self._grid_bounds[3])
+        for column in range(first_column, last_column + 1):
+            for row in range(first_row, last_row + 1):
+                yield column, row
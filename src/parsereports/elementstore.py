@@ -0,0 +1,313 @@
+"""
+Этот модуль содержит компактное хранилище объектов страницы в виде массивов.
+
+Для каждого объекта страницы PDFQuery держит элемент lxml и объект pdfminer,
+а RawPdfParser - объект RawElement и тот же объект pdfminer.
+Каждый объект pdfminer занимает сотни байт, а с элементом lxml - больше килобайта.
+ElementStore хранит те же данные по столбцам: координаты, коды типов,
+толщину линий и коды цветов - в массивах numpy, а тексты всех объектов - в одной строке
+со смещениями. На один объект приходится несколько десятков байт, объекты pdfminer
+после построения хранилища не нужны, поэтому в памяти можно держать много разобранных страниц.
+
+Для совместимости с кодом, который работает с LayoutElement и RawElement
+(например, TableReportAnalyzer), хранилище при обходе выдаёт лёгкие объекты StoredElement
+со свойствами tag, text и layout. Они создаются на лету и ссылаются на хранилище.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Iterator, Optional
+
+import numpy as np
+from pdfminer.layout import LTAnno, LTChar, LTComponent, LTContainer, LTPage
+
+from parsereports.rawparsing import get_element_text
+
+# Код для объектов без цвета или шрифта
+NO_CODE = -1
+
+
+@dataclass(eq=False)
+class ElementStore:
+    """
+    Объекты одной страницы по столбцам. Объекты идут в порядке обхода иерархии pdfminer
+    сверху вниз, как в RawPdfParser.get_all_page_elements().
+    """
+    # Названия типов объектов; tag_codes - номера в этом списке
+    tag_names: list[str]
+    tag_codes: np.ndarray
+    # Номер родительского объекта, NO_CODE - объект лежит прямо на странице
+    parents: np.ndarray
+    # Координаты (x0, y0, x1, y1)
+    bboxes: np.ndarray
+    # Тексты всех объектов подряд; текст объекта i - text_buffer[text_offsets[i]:text_offsets[i + 1]]
+    text_buffer: str
+    text_offsets: np.ndarray
+    # Есть ли у объекта текст (у объектов без текста свойство text равно None)
+    has_text: np.ndarray
+    # Толщина линий, NaN - у объекта нет линий
+    linewidths: np.ndarray
+    # Различные цвета объектов; stroking_color_codes и non_stroking_color_codes - номера в этом списке
+    colors: list[Any]
+    stroking_color_codes: np.ndarray
+    non_stroking_color_codes: np.ndarray
+    # Шрифты символов (LTChar); font_codes - номера в этом списке, size - размер символа
+    font_names: list[str]
+    font_codes: np.ndarray
+    sizes: np.ndarray
+
+    @classmethod
+    def from_layout(
+            cls,
+            page_layout: LTPage,
+            normalize_spaces: bool = True,
+            include_chars: bool = False
+    ) -> "ElementStore":
+        """
+        :param page_layout: Результат анализа разметки страницы в pdfminer.
+        :param normalize_spaces: Заменять последовательности пробельных символов в текстах
+            на один пробел, см. RawPdfParser.
+        :param include_chars: Включать ли отдельные символы (LTChar), см. RawPdfParser.
+        """
+        builder = _ElementStoreBuilder(normalize_spaces, include_chars)
+        builder.add_children(page_layout, NO_CODE)
+        return builder.build()
+
+    def __len__(self) -> int:
+        return len(self.tag_codes)
+
+    def __getitem__(self, position: int) -> "StoredElement":
+        if not -len(self) <= position < len(self):
+            raise IndexError(position)
+        return StoredElement(self, position % len(self))
+
+    def __iter__(self) -> Iterator["StoredElement"]:
+        for position in range(len(self)):
+            yield StoredElement(self, position)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        :return: Примерный объём памяти, занимаемой хранилищем, в байтах.
+        """
+        arrays = (self.tag_codes, self.parents, self.bboxes, self.text_offsets, self.has_text,
+                  self.linewidths, self.stroking_color_codes, self.non_stroking_color_codes,
+                  self.font_codes, self.sizes)
+        return sum(array.nbytes for array in arrays) + len(self.text_buffer.encode("utf-8"))
+
+    def get_positions(self, *tags: str) -> np.ndarray:
+        """
+        :param tags: Названия типов объектов, например "LTLine".
+        :return: Номера объектов указанных типов по возрастанию.
+        """
+        codes = [code for code, tag in enumerate(self.tag_names) if tag in tags]
+        return np.flatnonzero(np.isin(self.tag_codes, codes))
+
+    def find_elements(self, *tags: str) -> list["StoredElement"]:
+        """
+        :param tags: Названия типов объектов, например "LTLine".
+        :return: Объекты указанных типов.
+        """
+        return [StoredElement(self, int(position)) for position in self.get_positions(*tags)]
+
+    def get_text(self, position: int) -> Optional[str]:
+        if not self.has_text[position]:
+            return None
+        return self.text_buffer[self.text_offsets[position]:self.text_offsets[position + 1]]
+
+
+class _ElementStoreBuilder:
+    """
+    Собирает столбцы ElementStore в списки, которые потом превращаются в массивы.
+    """
+
+    def __init__(self, normalize_spaces: bool, include_chars: bool):
+        self._normalize_spaces = normalize_spaces
+        self._include_chars = include_chars
+        self._tag_codes_by_name: dict[str, int] = {}
+        self._color_codes: dict[Any, int] = {}
+        self.colors: list[Any] = []
+        self._font_codes: dict[str, int] = {}
+        self.tag_codes: list[int] = []
+        self.parents: list[int] = []
+        self.bboxes: list[tuple[float, float, float, float]] = []
+        self.texts: list[str] = []
+        self.text_offsets: list[int] = [0]
+        self.has_text: list[bool] = []
+        self.linewidths: list[float] = []
+        self.stroking_color_codes: list[int] = []
+        self.non_stroking_color_codes: list[int] = []
+        self.font_codes: list[int] = []
+        self.sizes: list[float] = []
+
+    def add_children(self, container: LTContainer, parent_position: int) -> None:
+        for item in container:
+            if isinstance(item, LTAnno) or (isinstance(item, LTChar) and not self._include_chars):
+                continue
+            position = len(self.tag_codes)
+            self._add_item(item, container, parent_position)
+            if isinstance(item, LTContainer):
+                self.add_children(item, position)
+
+    def _add_item(self, item: LTComponent, parent: LTContainer, parent_position: int) -> None:
+        tag = type(item).__name__
+        self.tag_codes.append(self._tag_codes_by_name.setdefault(tag, len(self._tag_codes_by_name)))
+        self.parents.append(parent_position)
+        self.bboxes.append(item.bbox)
+
+        text = get_element_text(item, parent, self._normalize_spaces)
+        self.has_text.append(text is not None)
+        if text:
+            self.texts.append(text)
+        self.text_offsets.append(self.text_offsets[-1] + len(text or ""))
+
+        linewidth = getattr(item, "linewidth", None)
+        self.linewidths.append(np.nan if linewidth is None else linewidth)
+        self.stroking_color_codes.append(self._get_color_code(getattr(item, "stroking_color", None)))
+        self.non_stroking_color_codes.append(self._get_color_code(getattr(item, "non_stroking_color", None)))
+        if isinstance(item, LTChar):
+            self.font_codes.append(self._font_codes.setdefault(item.fontname, len(self._font_codes)))
+            self.sizes.append(item.size)
+        else:
+            self.font_codes.append(NO_CODE)
+            self.sizes.append(np.nan)
+
+    def _get_color_code(self, color: Any) -> int:
+        if color is None:
+            return NO_CODE
+        if isinstance(color, list):
+            color = tuple(color)
+        try:
+            code = self._color_codes.get(color)
+        except TypeError:
+            # Нехэшируемые значения (например, узоры) храним без объединения одинаковых
+            self.colors.append(color)
+            return len(self.colors) - 1
+        if code is None:
+            code = self._color_codes[color] = len(self.colors)
+            self.colors.append(color)
+        return code
+
+    def build(self) -> ElementStore:
+        tag_names = [""] * len(self._tag_codes_by_name)
+        for tag, code in self._tag_codes_by_name.items():
+            tag_names[code] = tag
+        font_names = [""] * len(self._font_codes)
+        for font_name, code in self._font_codes.items():
+            font_names[code] = font_name
+        return ElementStore(
+            tag_names=tag_names,
+            tag_codes=np.array(self.tag_codes, dtype=np.uint8 if len(tag_names) <= 256 else np.int32),
+            parents=np.array(self.parents, dtype=np.int32),
+            bboxes=np.array(self.bboxes, dtype=float).reshape(-1, 4),
+            text_buffer="".join(self.texts),
+            text_offsets=np.array(self.text_offsets, dtype=np.int64),
+            has_text=np.array(self.has_text, dtype=bool),
+            linewidths=np.array(self.linewidths, dtype=float),
+            colors=self.colors,
+            stroking_color_codes=np.array(self.stroking_color_codes, dtype=np.int32),
+            non_stroking_color_codes=np.array(self.non_stroking_color_codes, dtype=np.int32),
+            font_names=font_names,
+            font_codes=np.array(self.font_codes, dtype=np.int32),
+            sizes=np.array(self.sizes, dtype=float),
+        )
+
+
+class StoredElement:
+    """
+    Лёгкое представление одного объекта из ElementStore.
+    Повторяет свойства tag, text и layout у LayoutElement и RawElement.
+    Вместо объекта pdfminer свойство layout возвращает сам StoredElement,
+    у которого есть те же координаты и атрибуты линий и символов.
+    """
+    __slots__ = ("store", "position")
+
+    def __init__(self, store: ElementStore, position: int):
+        self.store = store
+        self.position = position
+
+    def __repr__(self) -> str:
+        return f"<{self.tag}>"
+
+    def __eq__(self, other: Any) -> bool:
+        return (isinstance(other, StoredElement)
+                and other.store is self.store and other.position == self.position)
+
+    def __hash__(self) -> int:
+        return hash((id(self.store), self.position))
+
+    @property
+    def tag(self) -> str:
+        return self.store.tag_names[self.store.tag_codes[self.position]]
+
+    @property
+    def text(self) -> Optional[str]:
+        return self.store.get_text(self.position)
+
+    @property
+    def layout(self) -> "StoredElement":
+        return self
+
+    @property
+    def parent(self) -> Optional["StoredElement"]:
+        parent_position = self.store.parents[self.position]
+        return None if parent_position == NO_CODE else StoredElement(self.store, int(parent_position))
+
+    @property
+    def bbox(self) -> tuple[float, float, float, float]:
+        x0, y0, x1, y1 = self.store.bboxes[self.position].tolist()
+        return x0, y0, x1, y1
+
+    @property
+    def x0(self) -> float:
+        return float(self.store.bboxes[self.position, 0])
+
+    @property
+    def y0(self) -> float:
+        return float(self.store.bboxes[self.position, 1])
+
+    @property
+    def x1(self) -> float:
+        return float(self.store.bboxes[self.position, 2])
+
+    @property
+    def y1(self) -> float:
+        return float(self.store.bboxes[self.position, 3])
+
+    @property
+    def width(self) -> float:
+        return self.x1 - self.x0
+
+    @property
+    def height(self) -> float:
+        return self.y1 - self.y0
+
+    @property
+    def linewidth(self) -> Optional[float]:
+        linewidth = float(self.store.linewidths[self.position])
+        return None if np.isnan(linewidth) else linewidth
+
+    @property
+    def stroking_color(self) -> Any:
+        return self._get_color(self.store.stroking_color_codes[self.position])
+
+    @property
+    def non_stroking_color(self) -> Any:
+        return self._get_color(self.store.non_stroking_color_codes[self.position])
+
+    @property
+    def fontname(self) -> Optional[str]:
+        code = self.store.font_codes[self.position]
+        return None if code == NO_CODE else self.store.font_names[code]
+
+    @property
+    def size(self) -> Optional[float]:
+        size = float(self.store.sizes[self.position])
+        return None if np.isnan(size) else size
+
+    def get_text(self) -> str:
+        return self.text or ""
+
+    def _get_color(self, code: int) -> Any:
+        if code == NO_CODE:
+            return None
+        return self.store.colors[code]
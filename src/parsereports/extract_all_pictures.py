@@ -0,0 +1,372 @@
+"""
+Пакетное извлечение всех растровых изображений из документа в папку.
+
+В отличие от примеров extract_picture.py и extract_picture_xobject.py, скрипт:
+- обходит все страницы документа, включая изображения внутри Form XObject (вложенных рисунков);
+- не выполняет анализ разметки: изображения берутся напрямую из ресурсов страниц;
+- сохраняет изображения в формате JPEG (DCTDecode) и JPEG 2000 (JPXDecode) как есть, без раскодирования;
+- поддерживает цветовые пространства DeviceGray, DeviceRGB, DeviceCMYK, CalGray, CalRGB, ICCBased,
+  Indexed (палитра) и 1-битные изображения, в том числе маски (ImageMask);
+- сохраняет изображение, на которое ссылаются несколько страниц, только один раз;
+- ошибки подготовки и раскодирования отдельных изображений (например, неподдерживаемое
+  цветовое пространство) записываются в результат и не прерывают извлечение остальных;
+- раскодирует изображения в нескольких потоках (zlib и PIL освобождают GIL на время работы),
+  при этом в памяти одновременно находится лишь ограниченное число изображений.
+Встроенные изображения (операторы BI/ID/EI в потоке данных страницы) не извлекаются.
+
+Используется файл отчёта, созданный скриптом makereports/figures.py.
+"""
+
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from PIL import Image, ImageOps
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import LITERALS_DCT_DECODE, LITERALS_JPX_DECODE, PDFObjRef, PDFStream, \
+    resolve1, resolve_all
+from pdfminer.psparser import PSLiteral
+
+import pdf_storage
+from parsereports.basicparsing import open_pdf_file
+
+INPUT_FILE_PATH = pdf_storage.figures_file_path
+OUTPUT_DIR_PATH = str(pdf_storage.PDF_STORAGE_PATH / "images")
+
+# Названия цветовых пространств и соответствующие им режимы PIL
+_COLOR_SPACE_MODES = {
+    "DeviceGray": "L", "CalGray": "L", "G": "L",
+    "DeviceRGB": "RGB", "CalRGB": "RGB", "RGB": "RGB",
+    "DeviceCMYK": "CMYK", "CMYK": "CMYK",
+}
+# Режимы PIL по количеству компонентов цвета (для ICCBased)
+_COMPONENTS_MODES = {1: "L", 3: "RGB", 4: "CMYK"}
+# Фильтры, данные после которых сохраняются в файл как есть
+_PASSTHROUGH_FILTERS = {
+    **{str(literal.name): ".jpg" for literal in LITERALS_DCT_DECODE},
+    **{str(literal.name): ".jp2" for literal in LITERALS_JPX_DECODE},
+}
+
+
+@dataclass
+class ImageSpec:
+    """
+    Всё, что нужно для сохранения одного изображения.
+    Подготавливается в основном потоке и не ссылается на объекты документа,
+    поэтому с ним можно работать в других потоках: pdfminer не рассчитан
+    на одновременное чтение документа из нескольких потоков.
+    """
+    page_index: int
+    name: str
+    objid: Optional[int]
+    width: int
+    height: int
+    bits: int
+    # Режим PIL: "L", "RGB" или "CMYK", "P" для палитры, "1" для масок,
+    # None для JPEG и JPEG 2000, которые сохраняются как есть
+    mode: Optional[str]
+    stream: Optional[PDFStream]
+    filters: list[str] = field(default_factory=list)
+    image_mask: bool = False
+    decode: Optional[list[float]] = None
+    # Палитра в режиме RGB для цветового пространства Indexed
+    palette: Optional[bytes] = None
+    # Ошибка подготовки изображения; такое изображение не сохраняется, а stream равен None
+    error: Optional[str] = None
+
+    @property
+    def passthrough(self) -> bool:
+        return bool(self.filters) and self.filters[-1] in _PASSTHROUGH_FILTERS
+
+
+@dataclass
+class ExtractedImage:
+    """
+    Результат извлечения одного изображения.
+    """
+    page_index: int
+    name: str
+    objid: Optional[int]
+    width: int = 0
+    height: int = 0
+    file_path: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _literal_name(value: Any) -> Optional[str]:
+    return str(value.name) if isinstance(value, PSLiteral) else None
+
+
+def _stream_bytes(value: Any) -> bytes:
+    value = resolve1(value)
+    if isinstance(value, PDFStream):
+        return value.get_data()
+    return value if isinstance(value, bytes) else str(value).encode("latin-1")
+
+
+def _palette_to_rgb(palette: bytes, mode: str) -> bytes:
+    if mode == "RGB":
+        return palette
+    num_colors = len(palette) // len(mode)
+    return Image.frombytes(mode, (num_colors, 1), palette[:num_colors * len(mode)]).convert("RGB").tobytes()
+
+
+def resolve_color_space(color_space: Any, resources: dict) -> tuple[str, Optional[bytes]]:
+    """
+    :param color_space: Значение атрибута ColorSpace изображения.
+    :param resources: Ресурсы страницы или рисунка, в которых ищутся именованные цветовые пространства.
+    :return: Режим PIL ("L", "RGB" или "CMYK") и палитра в режиме RGB для Indexed (иначе None).
+    """
+    color_space = resolve1(color_space)
+    name = _literal_name(color_space)
+    if name is not None:
+        if name in _COLOR_SPACE_MODES:
+            return _COLOR_SPACE_MODES[name], None
+        named_spaces = resolve1(resources.get("ColorSpace")) or {}
+        if name in named_spaces:
+            return resolve_color_space(named_spaces[name], resources)
+        raise ValueError(f"Цветовое пространство {name} не поддерживается")
+
+    if isinstance(color_space, list) and color_space:
+        family = _literal_name(resolve1(color_space[0]))
+        if family in _COLOR_SPACE_MODES:
+            return _COLOR_SPACE_MODES[family], None
+        if family == "ICCBased":
+            profile = resolve1(color_space[1]) if len(color_space) > 1 else None
+            attrs = profile.attrs if isinstance(profile, PDFStream) else {}
+            num_components = resolve1(attrs.get("N"))
+            if num_components in _COMPONENTS_MODES:
+                return _COMPONENTS_MODES[num_components], None
+            if attrs.get("Alternate") is None:
+                raise ValueError("В профиле ICCBased не указаны ни N, ни Alternate")
+            return resolve_color_space(attrs["Alternate"], resources)
+        if family in ("Indexed", "I"):
+            base_mode, _ = resolve_color_space(color_space[1], resources)
+            return "P", _palette_to_rgb(_stream_bytes(color_space[3]), base_mode)
+        raise ValueError(f"Цветовое пространство {family} не поддерживается")
+
+    raise ValueError(f"Неизвестное цветовое пространство: {color_space!r}")
+
+
+def make_image_spec(
+        page_index: int,
+        name: str,
+        objid: Optional[int],
+        stream: PDFStream,
+        resources: dict
+) -> ImageSpec:
+    """
+    Готовит изображение к сохранению в другом потоке: разрешает все ссылки
+    в атрибутах и создаёт отдельную копию потока, не связанную с документом.
+    """
+    attrs = resolve_all(stream.attrs)
+    detached_stream = PDFStream(attrs, stream.rawdata, stream.decipher)
+    detached_stream.set_objid(stream.objid, stream.genno)
+    if stream.rawdata is None:
+        # Поток уже был раскодирован ранее
+        detached_stream.data = stream.data
+    filters = [str(f.name) for f, _ in detached_stream.get_filters() if isinstance(f, PSLiteral)]
+
+    image_mask = bool(attrs.get("ImageMask", attrs.get("IM", False)))
+    if image_mask:
+        mode, palette = "1", None
+    elif filters and filters[-1] in _PASSTHROUGH_FILTERS:
+        # JPEG и JPEG 2000 сохраняются как есть, цветовое пространство записано в самом файле
+        # (у JPEG 2000 атрибута ColorSpace может и не быть), поэтому оно не разбирается
+        mode, palette = None, None
+    else:
+        mode, palette = resolve_color_space(attrs.get("ColorSpace", attrs.get("CS")), resources)
+
+    return ImageSpec(
+        page_index=page_index,
+        name=name,
+        objid=objid,
+        width=attrs.get("Width", attrs.get("W")),
+        height=attrs.get("Height", attrs.get("H")),
+        bits=1 if image_mask else attrs.get("BitsPerComponent", attrs.get("BPC", 8)),
+        mode=mode,
+        stream=detached_stream,
+        filters=filters,
+        image_mask=image_mask,
+        decode=attrs.get("Decode", attrs.get("D")),
+        palette=palette
+    )
+
+
+def iter_image_specs(doc: PDFDocument) -> Iterator[ImageSpec]:
+    """
+    Обходит ресурсы всех страниц документа и вложенных рисунков.
+    Каждое изображение возвращается один раз, даже если оно используется на нескольких страницах.
+    После обработки каждой страницы кэш разобранных объектов документа очищается,
+    поэтому память не растёт с количеством страниц.
+    """
+    visited_objids: set[int] = set()
+
+    def _walk_resources(page_index: int, resources: dict) -> Iterator[ImageSpec]:
+        xobjects = resolve1(resources.get("XObject")) or {}
+        for name, xobject_ref in xobjects.items():
+            objid = xobject_ref.objid if isinstance(xobject_ref, PDFObjRef) else None
+            if objid is not None:
+                if objid in visited_objids:
+                    continue
+                visited_objids.add(objid)
+            xobject = resolve1(xobject_ref)
+            if not isinstance(xobject, PDFStream):
+                continue
+            subtype = _literal_name(resolve1(xobject.attrs.get("Subtype")))
+            if subtype == "Image":
+                try:
+                    spec = make_image_spec(page_index, name, objid, xobject, resources)
+                except Exception as e:
+                    # Ошибка в одном изображении не должна прерывать обход документа
+                    spec = ImageSpec(page_index, name, objid, width=0, height=0, bits=0, mode=None, stream=None,
+                                     error=f"{type(e).__name__}: {e}")
+                yield spec
+            elif subtype == "Form":
+                form_resources = resolve1(xobject.attrs.get("Resources")) or resources
+                yield from _walk_resources(page_index, form_resources)
+
+    for page_index, page in enumerate(PDFPage.create_pages(doc)):
+        yield from _walk_resources(page_index, page.resources or {})
+        doc._cached_objs.clear()
+        doc._parsed_objs.clear()
+
+
+def decode_image(spec: ImageSpec) -> Image.Image:
+    """
+    :return: Раскодированное изображение для всех форматов, кроме JPEG и JPEG 2000.
+    """
+    data = spec.stream.get_data()
+    size = (spec.width, spec.height)
+    if spec.mode == "1" or (spec.mode == "L" and spec.bits == 1):
+        image = Image.frombytes("1", size, data)
+        if spec.decode is not None and list(spec.decode[:2]) == [1, 0]:
+            image = ImageOps.invert(image.convert("L")).convert("1")
+        return image
+    if spec.mode == "P":
+        if spec.bits not in (1, 2, 4, 8):
+            raise ValueError(f"Неподдерживаемая глубина цвета палитры: {spec.bits}")
+        rawmode = "P" if spec.bits == 8 else f"P;{spec.bits}"
+        image = Image.frombytes("P", size, data, "raw", rawmode)
+        image.putpalette(spec.palette)
+        return image
+    if spec.bits == 8:
+        image = Image.frombytes(spec.mode, size, data)
+    elif spec.mode == "L" and spec.bits in (2, 4):
+        image = Image.frombytes("L", size, data, "raw", f"L;{spec.bits}")
+    elif spec.mode == "L" and spec.bits == 16:
+        image = Image.frombytes("I;16", size, data, "raw", "I;16B")
+    else:
+        raise ValueError(f"Неподдерживаемая глубина цвета {spec.bits} для режима {spec.mode}")
+    if spec.mode == "L" and spec.decode is not None and list(spec.decode[:2]) == [1, 0]:
+        image = ImageOps.invert(image)
+    if spec.mode == "CMYK":
+        # PNG не поддерживает CMYK
+        image = image.convert("RGB")
+    return image
+
+
+def save_image(spec: ImageSpec, output_dir: str) -> ExtractedImage:
+    """
+    Сохраняет изображение в папку. Имя файла содержит номер страницы,
+    имя ресурса и номер объекта документа.
+    Ошибки раскодирования не прерывают работу, а записываются в результат.
+    """
+    result = ExtractedImage(spec.page_index, spec.name, spec.objid, spec.width, spec.height)
+    if spec.error is not None:
+        result.error = spec.error
+        return result
+    base_path = os.path.join(output_dir, f"page{spec.page_index}_{spec.name}_{spec.objid}")
+    try:
+        if spec.passthrough:
+            # pdfminer не раскодирует DCTDecode и JPXDecode: get_data() снимает только
+            # предшествующие фильтры (например, ASCII85) и возвращает готовый файл JPEG или JPEG 2000
+            result.file_path = base_path + _PASSTHROUGH_FILTERS[spec.filters[-1]]
+            Path(result.file_path).write_bytes(spec.stream.get_data())
+        else:
+            image = decode_image(spec)
+            result.file_path = base_path + ".png"
+            image.save(result.file_path)
+    except Exception as e:
+        result.file_path = None
+        result.error = f"{type(e).__name__}: {e}"
+    # Освобождаем данные изображения сразу, не дожидаясь удаления самого описания
+    spec.stream.data = spec.stream.rawdata = None
+    return result
+
+
+def extract_images(
+        pdf_file_path: str,
+        output_dir: str,
+        max_workers: Optional[int] = None,
+        use_mmap: bool = False
+) -> Iterator[ExtractedImage]:
+    """
+    :param pdf_file_path: Путь к документу.
+    :param output_dir: Папка для сохранения изображений, создаётся при необходимости.
+    :param max_workers: Количество потоков для раскодирования и сохранения изображений.
+        1 - всё делается в текущем потоке, None - по числу ядер.
+    :param use_mmap: Читать документ через отображение файла в память, см. open_pdf_file().
+    :return: Генератор результатов в порядке следования изображений в документе.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with open_pdf_file(pdf_file_path, use_mmap) as pdf_file:
+        parser = PDFParser(pdf_file)
+        doc = PDFDocument(parser)
+        parser.set_document(doc)
+
+        if max_workers == 1:
+            for spec in iter_image_specs(doc):
+                yield save_image(spec, output_dir)
+            return
+
+        max_workers = max_workers or os.cpu_count() or 1
+        # Ограничиваем количество изображений, ожидающих обработки,
+        # чтобы не держать в памяти данные всех изображений документа
+        max_pending = 2 * max_workers
+        pending: deque[Future] = deque()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for spec in iter_image_specs(doc):
+                pending.append(executor.submit(save_image, spec, output_dir))
+                if len(pending) >= max_pending:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+
+def main():
+    input_path = input("Введите путь к файлу PDF или нажмите Enter "
+                       f"(по умолчанию будет прочитан файл \"{INPUT_FILE_PATH}\"): ") or INPUT_FILE_PATH
+    output_dir = input("Введите путь к папке для изображений или нажмите Enter "
+                       f"(по умолчанию \"{OUTPUT_DIR_PATH}\"): ") or OUTPUT_DIR_PATH
+    workers_str = input("Количество потоков (по умолчанию - по числу ядер): ")
+    max_workers = int(workers_str) if workers_str else None
+
+    num_images, num_failed = 0, 0
+    start = time.monotonic()
+    for result in extract_images(input_path, output_dir, max_workers=max_workers):
+        num_images += 1
+        if result.ok:
+            print(f"OK    страница {result.page_index}, {result.name}: {result.width}x{result.height} "
+                  f"-> {result.file_path}")
+        else:
+            num_failed += 1
+            print(f"ERROR страница {result.page_index}, {result.name}: {result.error}")
+    total_time = time.monotonic() - start
+
+    print(f"Извлечено изображений: {num_images - num_failed}, с ошибками: {num_failed}, "
+          f"время: {total_time:.03f} s")
+
+
+if __name__ == '__main__':
+    main()
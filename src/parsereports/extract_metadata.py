@@ -1,20 +1,221 @@
 """
 Пример с извлечением метаданных из документа.
-Используется файл отчёта, созданный скриптом makereports/tablereport.py.
+По умолчанию читаются все файлы из папки pdf_storage,
+табличный отчёт в ней создаётся скриптом makereports/tablereport.py.
+
+Метаданные читаются без PDFQuery и без обработки страниц: pdfminer при открытии документа
+читает только таблицу ссылок на объекты (xref) и трейлер, а из остальных объектов
+загружаются только словарь Info, каталог документа, корень дерева страниц
+и поток метаданных XMP. Поэтому чтение занимает миллисекунды даже для больших файлов,
+и его удобно выполнять для множества файлов параллельно.
 """
 
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Iterable, Iterator, Optional, Union
+
+from lxml import etree
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import PDFStream, resolve1
+from pdfminer.psparser import PSLiteral
+from pdfminer.utils import decode_text
+
 import pdf_storage
-from parsereports.basicparsing import BasicPdfParser
+from parsereports.basicparsing import open_pdf_file
+from parsereports.batch_validation import collect_pdf_files
+
+INPUT_DIR_PATH = str(pdf_storage.PDF_STORAGE_PATH)
+
+# Сколько байт с начала файла просматривается в поисках заголовка "%PDF-x.y"
+_HEADER_SEARCH_SIZE = 1024
+_RDF_LI_TAG = "{http://www.w3.org/1999/02/22-rdf-syntax-ns#}li"
+# Пространства имён XMP, свойства из которых попадают в DocumentMetadata.xmp_fields
+_XMP_NAMESPACES = {
+    "http://purl.org/dc/elements/1.1/": "dc",
+    "http://ns.adobe.com/xap/1.0/": "xmp",
+    "http://ns.adobe.com/pdf/1.3/": "pdf",
+    "http://ns.adobe.com/xap/1.0/mm/": "xmpMM",
+}
+
+
+@dataclass
+class DocumentMetadata:
+    """
+    Метаданные одного файла.
+    Содержит только простые типы, чтобы его можно было передать между процессами.
+    """
+    file_path: str
+    # Версия формата из заголовка файла, например "1.4"
+    pdf_version: Optional[str] = None
+    num_pages: Optional[int] = None
+    encrypted: bool = False
+    # Словарь Info документа: Title, Author, Producer, CreationDate и т.п.
+    info: dict[str, str] = field(default_factory=dict)
+    # Исходный XML метаданных XMP, если они есть в документе
+    xmp: Optional[str] = None
+    # Свойства XMP в виде "префикс:название" -> значение, например "dc:title"
+    xmp_fields: dict[str, str] = field(default_factory=dict)
+    error: Optional[str] = None
+    elapsed_s: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _to_text(value: Any) -> str:
+    value = resolve1(value)
+    if isinstance(value, bytes):
+        return decode_text(value)
+    if isinstance(value, PSLiteral):
+        return str(value.name)
+    return str(value)
+
+
+def _read_pdf_version(pdf_file: Any) -> Optional[str]:
+    pdf_file.seek(0)
+    header = pdf_file.read(_HEADER_SEARCH_SIZE)
+    position = header.find(b"%PDF-")
+    if position < 0:
+        return None
+    return header[position + 5:position + 8].decode("ascii", "replace")
+
 
-INPUT_FILE_PATH = pdf_storage.table_report_file_path
-PAGE_INDEX = 0
+def parse_xmp_fields(xmp: bytes) -> dict[str, str]:
+    """
+    :param xmp: Содержимое потока метаданных XMP.
+    :return: Простые свойства из основных пространств имён XMP.
+        Для списков и альтернатив (rdf:Seq, rdf:Alt) значения элементов объединяются через "; ".
+    """
+    xmp_fields = {}
+    root = etree.fromstring(xmp, etree.XMLParser(recover=True, resolve_entities=False))
+    if root is None:
+        return xmp_fields
+    for element in root.iter():
+        if not isinstance(element.tag, str):
+            continue
+        qname = etree.QName(element)
+        prefix = _XMP_NAMESPACES.get(qname.namespace)
+        if prefix is None:
+            continue
+        items = [item.text.strip() for item in element.iter(_RDF_LI_TAG) if item.text and item.text.strip()]
+        if items:
+            xmp_fields[f"{prefix}:{qname.localname}"] = "; ".join(items)
+        elif element.text and element.text.strip() and len(element) == 0:
+            xmp_fields[f"{prefix}:{qname.localname}"] = element.text.strip()
+
+    # Свойства могут быть записаны и в виде атрибутов rdf:Description
+    for element in root.iter():
+        if not isinstance(element.tag, str):
+            continue
+        for attribute_name, value in element.attrib.items():
+            attribute_qname = etree.QName(attribute_name)
+            attribute_prefix = _XMP_NAMESPACES.get(attribute_qname.namespace)
+            if attribute_prefix is not None:
+                xmp_fields[f"{attribute_prefix}:{attribute_qname.localname}"] = value
+    return xmp_fields
+
+
+def read_metadata(
+        file_path: str,
+        include_xmp: bool = True,
+        use_mmap: bool = False
+) -> DocumentMetadata:
+    """
+    Читает метаданные одного файла, не обрабатывая страницы.
+    Функция может выполняться в дочернем процессе, поэтому исключения не пробрасываются,
+    а записываются в результат.
+
+    :param file_path: Путь к документу.
+    :param include_xmp: Читать ли поток метаданных XMP.
+    :param use_mmap: Читать документ через отображение файла в память, см. open_pdf_file().
+    """
+    result = DocumentMetadata(file_path=file_path)
+    start = time.monotonic()
+    try:
+        with open_pdf_file(file_path, use_mmap) as pdf_file:
+            result.pdf_version = _read_pdf_version(pdf_file)
+            parser = PDFParser(pdf_file)
+            doc = PDFDocument(parser)
+            result.encrypted = doc.encryption is not None
+
+            # Если документ дописывался, словарей Info может быть несколько, более поздние - первыми
+            for info in reversed(doc.info):
+                result.info.update((str(key), _to_text(value)) for key, value in info.items())
+
+            pages = resolve1(doc.catalog.get("Pages"))
+            if isinstance(pages, dict) and "Count" in pages:
+                result.num_pages = resolve1(pages["Count"])
+
+            metadata_stream = resolve1(doc.catalog.get("Metadata"))
+            if include_xmp and isinstance(metadata_stream, PDFStream):
+                xmp = metadata_stream.get_data()
+                result.xmp = xmp.decode("utf-8", "replace")
+                result.xmp_fields = parse_xmp_fields(xmp)
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.elapsed_s = time.monotonic() - start
+    return result
+
+
+def iter_metadata(
+        inputs: Union[str, os.PathLike, Iterable[Union[str, os.PathLike]]],
+        max_workers: Optional[int] = None,
+        chunksize: int = 16,
+        include_xmp: bool = True,
+        use_mmap: bool = False
+) -> Iterator[DocumentMetadata]:
+    """
+    Читает метаданные файлов в пуле процессов и возвращает результаты по мере готовности,
+    в том же порядке, в котором были найдены файлы.
+
+    :param inputs: Путь к папке, путь к файлу или список таких путей.
+    :param max_workers: Количество процессов, по умолчанию - по числу ядер.
+        Если 1, то файлы читаются в текущем процессе.
+    :param chunksize: Сколько файлов передаётся в процесс за один раз.
+        Чтение метаданных занимает мало времени, поэтому файлы выгодно передавать пачками.
+    :param include_xmp: Читать ли поток метаданных XMP.
+    :param use_mmap: Читать файлы через отображение в память, см. open_pdf_file().
+    """
+    file_paths = collect_pdf_files(inputs)
+    if not file_paths:
+        return
+
+    worker = partial(read_metadata, include_xmp=include_xmp, use_mmap=use_mmap)
+    if max_workers == 1:
+        yield from map(worker, file_paths)
+        return
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(worker, file_paths, chunksize=chunksize)
 
 
 def main():
-    parser = BasicPdfParser(INPUT_FILE_PATH)
-    metadata = parser.pq.doc.info[0]
-    print(metadata)
-    parser.close()
+    input_path = input("Введите путь к папке или файлу PDF или нажмите Enter "
+                       f"(по умолчанию будет прочитана папка \"{INPUT_DIR_PATH}\"): ") or INPUT_DIR_PATH
+    workers_str = input("Количество процессов (по умолчанию - по числу ядер): ")
+    max_workers = int(workers_str) if workers_str else None
+
+    num_files, num_failed = 0, 0
+    start = time.monotonic()
+    for result in iter_metadata(input_path, max_workers=max_workers):
+        num_files += 1
+        if result.ok:
+            print(f"OK    {result.file_path}: PDF {result.pdf_version}, страниц: {result.num_pages}, "
+                  f"{result.elapsed_s * 1000:.01f} ms")
+            for key, value in result.info.items():
+                print(f"      {key}: {value}")
+            for key, value in result.xmp_fields.items():
+                print(f"      XMP {key}: {value}")
+        else:
+            num_failed += 1
+            print(f"ERROR {result.file_path}: {result.error}")
+    total_time = time.monotonic() - start
+
+    print(f"Обработано файлов: {num_files}, с ошибками: {num_failed}, время: {total_time:.03f} s")
 
 
 if __name__ == '__main__':
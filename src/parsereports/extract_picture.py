@@ -5,6 +5,8 @@
 настроенной по умолчанию в системе.
 """
 
+from typing import Union
+
 from PIL import Image
 from pdfminer.pdftypes import PDFStream
 from pdfquery import PDFQuery
@@ -12,6 +14,7 @@ from pdfquery.pdfquery import LayoutElement
 
 import pdf_storage
 from parsereports.basicparsing import BasicPdfParser
+from parsereports.rawparsing import RawElement
 
 INPUT_FILE_PATH = pdf_storage.figures_file_path
 PAGE_INDEX = 0
@@ -23,7 +26,7 @@ def find_first_image_element(pq: PDFQuery, page_index: int) -> LayoutElement:
     return pq.pq(f"LTPage[page_index=\"{page_index}\"] LTImage")[0]
 
 
-def decode_image(image_element: LayoutElement, image_data: PDFStream) -> Image.Image:
+def decode_image(image_element: Union[LayoutElement, RawElement], image_data: PDFStream) -> Image.Image:
     # В этом примере показан только пример работы с изображением,
     # сохранённым в режиме RGB, по 8 бит на каждый компонент цвета.
     # Режим сохранения изображений в ваших документах может отличаться.
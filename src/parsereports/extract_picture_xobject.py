@@ -7,6 +7,8 @@
 настроенной по умолчанию в системе.
 """
 
+from typing import Union
+
 from PIL import Image
 from pdfminer.pdftypes import PDFStream
 from pdfquery import PDFQuery
@@ -14,6 +16,7 @@ from pdfquery.pdfquery import LayoutElement
 
 import pdf_storage
 from parsereports.basicparsing import BasicPdfParser
+from parsereports.rawparsing import RawElement
 
 INPUT_FILE_PATH = pdf_storage.figures_file_path
 PAGE_INDEX = 0
@@ -34,7 +37,7 @@ def extract_image_data(pq: PDFQuery, page_index: int, image_element: LayoutEleme
     return page["Resources"]["XObject"][image_element.layout.name].resolve()
 
 
-def decode_image(image_element: LayoutElement, image_data: PDFStream) -> Image.Image:
+def decode_image(image_element: Union[LayoutElement, RawElement], image_data: PDFStream) -> Image.Image:
     color_spaces = [str(literal.name) for literal in image_element.layout.colorspace]
     if color_spaces == ["DeviceRGB"] and image_element.layout.bits == 8:
         PIL_color_mode = "RGB"
@@ -0,0 +1,51 @@
+"""
+Скрипт выводит статистику операторов в потоках данных (content stream) всех страниц документа.
+Помогает найти страницы с аномально большим количеством операторов, например,
+тысячами отрезков (операторы m, l, S) в больших таблицах.
+Страницы обрабатываются по одной, без интерпретации и анализа разметки,
+поэтому скрипт подходит и для очень больших документов.
+По умолчанию используется файл отчёта, созданный скриптом makereports/tablereport.py.
+"""
+
+import time
+
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfparser import PDFParser
+
+import pdf_storage
+from parsereports.basicparsing import open_pdf_file
+from parsereports.contentstream import iter_page_stats
+
+INPUT_FILE_PATH = pdf_storage.table_report_file_path
+# Количество самых частых операторов, выводимых для каждой страницы
+NUM_TOP_OPERATORS = 8
+
+
+def main():
+    input_file_path = input("Введите путь к файлу PDF или нажмите Enter "
+                            f"(по умолчанию будет прочитан файл \"{INPUT_FILE_PATH}\"): ") or INPUT_FILE_PATH
+
+    total_counts: dict[str, int] = {}
+    heaviest_page = None
+    start = time.monotonic()
+    with open_pdf_file(input_file_path, use_mmap=True) as pdf_file:
+        pdf_doc = PDFDocument(PDFParser(pdf_file))
+        for stats in iter_page_stats(pdf_doc):
+            top_text = ", ".join(f"{operator} {count}" for operator, count in stats.most_common(NUM_TOP_OPERATORS))
+            print(f"Страница {stats.page_index}: операторов {stats.num_operations}, "
+                  f"поток данных {stats.content_size_bytes} байт, рисунков {stats.num_forms}, "
+                  f"изображений {stats.num_images}, встроенных изображений {stats.num_inline_images}")
+            print(f"    {top_text}")
+            for operator, count in stats.operator_counts.items():
+                total_counts[operator] = total_counts.get(operator, 0) + count
+            if heaviest_page is None or stats.num_operations > heaviest_page.num_operations:
+                heaviest_page = stats
+    total_time = time.monotonic() - start
+
+    if heaviest_page is not None:
+        print(f"Больше всего операторов на странице {heaviest_page.page_index}: {heaviest_page.num_operations}")
+    print(f"Всего операторов: {sum(total_counts.values())}, время: {total_time:.03f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,295 @@
+"""
+Этот модуль содержит дисковый кэш результатов анализа страниц для BasicPdfParser.
+
+Анализ разметки в pdfminer и построение дерева PDFQuery - самые долгие этапы парсинга,
+поэтому при повторном разборе того же файла с теми же параметрами
+дерево элементов страницы можно взять из кэша.
+Ключ кэша строится по хэшу содержимого файла и параметрам PDFQuery,
+поэтому изменённый или перезаписанный файл никогда не будет прочитан из старого кэша.
+
+У элементов, прочитанных из кэша, свойство layout содержит не объекты pdfminer,
+а объекты CachedLayout только с простыми атрибутами: координатами, текстом,
+толщиной и цветом линий, точками кривых, шрифтом и т.п.
+Данные картинок (layout.stream) и прочие ссылки на объекты документа не кэшируются,
+поэтому для извлечения изображений кэш использовать нельзя.
+
+Записи читаются через pickle, поэтому каталог кэша должен быть доступен на запись
+только текущему пользователю, а чужие записи не читаются.
+"""
+
+import hashlib
+import os
+import pickle
+import stat
+import tempfile
+import zlib
+from pathlib import Path
+from typing import Any, Optional
+
+from lxml import etree
+from pdfquery.pdfquery import LayoutElement, parser as pq_xml_parser
+
+# Версия формата: при изменении структуры записей старые файлы кэша перестают находиться
+CACHE_FORMAT_VERSION = 1
+CACHE_FILE_SUFFIX = ".layout"
+DEFAULT_MAX_SIZE_BYTES = 512 * 2 ** 20
+# До какой доли предельного размера вытесняются записи: с запасом,
+# чтобы каталог не просматривался заново после каждой новой записи
+EVICTION_TARGET_RATIO = 0.9
+
+# Атрибуты объектов pdfminer, которые сохраняются в кэше
+_LAYOUT_ATTRIBUTES = (
+    "x0", "y0", "x1", "y1", "width", "height", "bbox",
+    "linewidth", "stroke", "fill", "evenodd", "stroking_color", "non_stroking_color",
+    "pts", "original_path", "dashing_style",
+    "fontname", "size", "adv", "upright", "matrix",
+    "name", "bits", "srcsize", "imagemask",
+)
+
+
+class CachedLayout:
+    """
+    Заменитель объекта pdfminer для элементов, прочитанных из кэша.
+    Содержит только атрибуты из списка _LAYOUT_ATTRIBUTES, которые были у исходного объекта.
+    """
+
+    def __init__(self, attributes: dict[str, Any], text: Optional[str] = None):
+        self.__dict__.update(attributes)
+        self._text = text
+        if text is not None:
+            # Метод есть только у текстовых объектов, как и в pdfminer
+            self.get_text = self._get_text
+
+    def _get_text(self) -> str:
+        return self._text
+
+    def __repr__(self) -> str:
+        return f"<CachedLayout {getattr(self, 'bbox', None)}>"
+
+
+def _is_plain_value(value: Any) -> bool:
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return True
+    if isinstance(value, (tuple, list)):
+        return all(_is_plain_value(item) for item in value)
+    return False
+
+
+def _extract_layout_record(layout: Any) -> tuple[dict[str, Any], Optional[str]]:
+    attributes = {}
+    for attribute in _LAYOUT_ATTRIBUTES:
+        value = getattr(layout, attribute, None)
+        if value is not None and _is_plain_value(value):
+            attributes[attribute] = value
+    text = layout.get_text() if hasattr(layout, "get_text") else None
+    return attributes, text
+
+
+def serialize_page_element(page_element: LayoutElement) -> bytes:
+    """
+    :param page_element: Элемент LTPage из дерева PDFQuery.
+    :return: Сжатое представление страницы: XML дерева, атрибуты объектов pdfminer
+        и тексты элементов в порядке обхода элементов дерева.
+    """
+    xml = etree.tostring(page_element, encoding="utf-8")
+    records = [(*_extract_layout_record(element.layout), element.text) for element in page_element.iter()]
+    return zlib.compress(pickle.dumps((CACHE_FORMAT_VERSION, xml, records),
+                                      protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def deserialize_page_element(data: bytes, element_refs: list[LayoutElement]) -> Optional[LayoutElement]:
+    """
+    :param data: Данные, полученные из serialize_page_element().
+    :param element_refs: Список, в который добавляются все элементы дерева.
+        lxml не сохраняет Python-объекты элементов, на которые нет ссылок,
+        и без этого списка свойство layout будет потеряно (см. PDFQuery._elements).
+    :return: Восстановленный элемент LTPage или None, если данные в устаревшем формате.
+    """
+    format_version, xml, records = pickle.loads(zlib.decompress(data))
+    if format_version != CACHE_FORMAT_VERSION:
+        return None
+    page_element = etree.fromstring(xml, pq_xml_parser)
+    elements = list(page_element.iter())
+    for element, (attributes, layout_text, element_text) in zip(elements, records):
+        element.layout = CachedLayout(attributes, layout_text)
+        # Пустой текст не отличается от отсутствующего в XML, поэтому восстанавливаем его явно
+        if element.text != element_text:
+            element.text = element_text
+    element_refs.extend(elements)
+    return page_element
+
+
+def _is_private(file_stat: os.stat_result) -> bool:
+    # В Windows права на личные каталоги пользователя задаются списками доступа, а не битами режима
+    if os.name == "nt":
+        return True
+    return file_stat.st_uid == os.getuid() and not file_stat.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+
+def make_params_key(pq_params: dict[str, Any]) -> str:
+    """
+    Строковое представление параметров PDFQuery для ключа кэша.
+    Параметры, у которых нет стабильного repr (например, функции),
+    приводят к промахам кэша, но не к ошибкам.
+    """
+    return repr(sorted((key, repr(value) if not isinstance(value, dict) else repr(sorted(value.items())))
+                       for key, value in pq_params.items()))
+
+
+def hash_file(file_path: str, chunk_size: int = 2 ** 20) -> str:
+    file_hasher = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            file_hasher.update(chunk)
+    return file_hasher.hexdigest()
+
+
+class LayoutCache:
+    """
+    Дисковый кэш страниц с вытеснением давно не использованных записей
+    при превышении заданного общего размера.
+    Каждая страница хранится в отдельном файле, поэтому кэш работает и в ленивом режиме парсера.
+    Один каталог кэша можно использовать из нескольких процессов:
+    файлы записываются атомарно, а испорченные или удалённые записи считаются промахом.
+
+    Общий размер кэша подсчитывается в памяти, а каталог просматривается целиком
+    только при первой записи и когда размер превышает предел. Записи других процессов
+    учитываются при таком просмотре, поэтому предел может быть ненадолго превышен.
+    """
+
+    def __init__(
+            self,
+            cache_dir: str,
+            max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES
+    ):
+        """
+        :param cache_dir: Каталог для файлов кэша, создаётся при необходимости с правами 0700.
+        :param max_size_bytes: Предельный общий размер файлов кэша.
+        :raise PermissionError: Если каталог принадлежит другому пользователю или доступен ему на запись:
+            иначе другой пользователь мог бы подложить запись кэша и выполнить свой код при её чтении.
+        """
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        dir_stat = os.lstat(cache_dir)
+        if not stat.S_ISDIR(dir_stat.st_mode) or not _is_private(dir_stat):
+            raise PermissionError(
+                f"Каталог кэша страниц {cache_dir} должен принадлежать текущему пользователю "
+                "и не должен быть доступен на запись другим пользователям"
+            )
+        self._cache_dir = Path(cache_dir)
+        self._max_size_bytes = max_size_bytes
+        # Общий размер файлов кэша, None - каталог ещё не просматривался
+        self._total_size_bytes: Optional[int] = None
+        # Количество попаданий и промахов, для статистики
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_document_key(pdf_file_path: str, pq_params: dict[str, Any]) -> str:
+        """
+        :return: Ключ документа, зависящий от содержимого файла и параметров PDFQuery.
+        """
+        key_hasher = hashlib.sha256()
+        key_hasher.update(hash_file(pdf_file_path).encode())
+        key_hasher.update(make_params_key(pq_params).encode())
+        return key_hasher.hexdigest()
+
+    def _get_entry_path(self, document_key: str, page_index: int) -> Path:
+        return self._cache_dir / f"{document_key}_{page_index}{CACHE_FILE_SUFFIX}"
+
+    def get_page(
+            self,
+            document_key: str,
+            page_index: int,
+            element_refs: list[LayoutElement]
+    ) -> Optional[LayoutElement]:
+        """
+        :param element_refs: Список для хранения ссылок на элементы, см. deserialize_page_element().
+        :return: Восстановленный элемент LTPage или None, если страницы нет в кэше.
+        """
+        entry_path = self._get_entry_path(document_key, page_index)
+        try:
+            entry_stat = os.lstat(entry_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        if not stat.S_ISREG(entry_stat.st_mode) or not _is_private(entry_stat):
+            # Чужую запись не читаем; каталог принадлежит текущему пользователю, поэтому её можно удалить
+            entry_path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        try:
+            data = entry_path.read_bytes()
+            page_element = deserialize_page_element(data, element_refs)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (OSError, ValueError, EOFError, zlib.error, pickle.UnpicklingError, etree.XMLSyntaxError):
+            # Испорченную запись удаляем, она будет создана заново
+            entry_path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        if page_element is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        # Время изменения файла используется как время последнего обращения
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
+        return page_element
+
+    def put_page(self, document_key: str, page_index: int, page_element: LayoutElement) -> None:
+        entry_path = self._get_entry_path(document_key, page_index)
+        data = serialize_page_element(page_element)
+        try:
+            replaced_size = entry_path.stat().st_size
+        except FileNotFoundError:
+            replaced_size = 0
+        file_descriptor, temp_path = tempfile.mkstemp(dir=self._cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(file_descriptor, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, entry_path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+        if self._total_size_bytes is None:
+            self.evict()
+            return
+        self._total_size_bytes += len(data) - replaced_size
+        if self._total_size_bytes > self._max_size_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """
+        Просматривает каталог кэша и, если общий размер превышает предел,
+        удаляет самые давно использованные записи, пока размер не станет
+        меньше предела с запасом (EVICTION_TARGET_RATIO).
+        """
+        entries = []
+        total_size = 0
+        for entry_path in self._cache_dir.glob(f"*{CACHE_FILE_SUFFIX}"):
+            try:
+                stat = entry_path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+            total_size += stat.st_size
+
+        if total_size > self._max_size_bytes:
+            target_size = self._max_size_bytes * EVICTION_TARGET_RATIO
+            entries.sort()
+            for _, size, entry_path in entries:
+                if total_size <= target_size:
+                    break
+                entry_path.unlink(missing_ok=True)
+                total_size -= size
+        self._total_size_bytes = total_size
+
+    def clear(self) -> None:
+        for entry_path in self._cache_dir.glob(f"*{CACHE_FILE_SUFFIX}"):
+            entry_path.unlink(missing_ok=True)
+        self._total_size_bytes = 0
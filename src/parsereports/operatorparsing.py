@@ -0,0 +1,406 @@
+"""
+Этот модуль содержит самый быстрый парсер для машинно-сгенерированных отчётов:
+объекты страницы получаются прямо из операторов потока данных (content stream),
+без интерпретатора и анализа разметки pdfminer.
+
+Интерпретируются только операторы вывода текста и рисования отрезков,
+а из состояния графики отслеживаются только матрица преобразования (CTM),
+шрифт и параметры текста. Каждый оператор вывода текста (Tj, TJ, ', ")
+даёт один текстовый объект, а каждый обведённый отрезок (m, l, S) - объект LTLine.
+Группировка символов в строки и блоки не выполняется, поэтому результат
+совпадает с PDFQuery только для отчётов, где каждая надпись выводится одним оператором,
+как в отчётах из makereports (reportlab, метод drawString).
+Обрезка (clipping), цвета, кривые и заливки не учитываются.
+
+Объекты RawElement можно передавать в TableReportAnalyzer, как и объекты из RawPdfParser.
+"""
+
+from typing import Any, BinaryIO, Iterator, Optional
+
+from pdfminer.layout import LTComponent, LTLine
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdffont import PDFFont, PDFUnicodeNotDefined
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import PDFObjRef, resolve1
+from pdfminer.psparser import PSLiteral
+from pdfminer.utils import MATRIX_IDENTITY, Matrix, apply_matrix_pt, mult_matrix
+
+from parsereports.basicparsing import open_pdf_file
+from parsereports.contentstream import get_form, get_page_streams, iter_operations, iter_stream_chunks, \
+    iter_streams_chunks
+from parsereports.rawparsing import RawElement
+
+# Название типа текстовых объектов, как у строк текста в pdfminer
+TEXT_TAG = "LTTextLineHorizontal"
+
+
+class _TextState:
+    """
+    Параметры текста, которые сохраняются и восстанавливаются вместе с состоянием графики.
+    """
+    __slots__ = ("font", "font_size", "char_spacing", "word_spacing", "scaling", "leading", "rise")
+
+    def __init__(self):
+        self.font: Optional[PDFFont] = None
+        self.font_size = 0.0
+        self.char_spacing = 0.0
+        self.word_spacing = 0.0
+        # Горизонтальное масштабирование в процентах
+        self.scaling = 100.0
+        self.leading = 0.0
+        self.rise = 0.0
+
+    def copy(self) -> "_TextState":
+        state_copy = _TextState()
+        for name in self.__slots__:
+            setattr(state_copy, name, getattr(self, name))
+        return state_copy
+
+
+class _ContentInterpreter:
+    """
+    Минимальный интерпретатор потока данных одной страницы.
+    """
+
+    def __init__(self, resources_mgr: PDFResourceManager, normalize_spaces: bool):
+        self._resources_mgr = resources_mgr
+        self._normalize_spaces = normalize_spaces
+        self.elements: list[RawElement] = []
+
+        self._ctm: Matrix = MATRIX_IDENTITY
+        self._line_width = 1.0
+        self._text_state = _TextState()
+        self._state_stack: list[tuple[Matrix, float, _TextState]] = []
+        # Матрица текста и матрица начала строки, задаются в каждом блоке BT ... ET
+        self._text_matrix: Matrix = MATRIX_IDENTITY
+        self._line_matrix: Matrix = MATRIX_IDENTITY
+        # Точки текущего фрагмента контура (от последнего оператора m) и завершённые фрагменты
+        self._subpath: list[tuple[float, float]] = []
+        self._subpaths: list[list[tuple[float, float]]] = []
+        self._form_stack: list[int] = []
+
+    def interpret_page(self, page: PDFPage) -> list[RawElement]:
+        # Как и в pdfminer, начало координат переносится в левый нижний угол MediaBox
+        x0, y0 = page.mediabox[0], page.mediabox[1]
+        self._ctm = (1, 0, 0, 1, -x0, -y0)
+        self._interpret(iter_streams_chunks(get_page_streams(page)), page.resources or {})
+        return self.elements
+
+    def _interpret(self, chunks: Iterator[bytes], resources: dict) -> None:
+        for operator, operands in iter_operations(chunks):
+            handler = _HANDLERS.get(operator)
+            if handler is not None:
+                handler(self, operands, resources)
+
+    # Состояние графики
+
+    def _do_q(self, operands: list[Any], resources: dict) -> None:
+        self._state_stack.append((self._ctm, self._line_width, self._text_state.copy()))
+
+    def _do_Q(self, operands: list[Any], resources: dict) -> None:
+        if self._state_stack:
+            self._ctm, self._line_width, self._text_state = self._state_stack.pop()
+
+    def _do_cm(self, operands: list[Any], resources: dict) -> None:
+        self._ctm = mult_matrix(tuple(operands[-6:]), self._ctm)
+
+    def _do_w(self, operands: list[Any], resources: dict) -> None:
+        self._line_width = operands[-1]
+
+    def _do_Do(self, operands: list[Any], resources: dict) -> None:
+        form = get_form(resources, operands)
+        if form is None or id(form) in self._form_stack:
+            return
+        self._do_q([], resources)
+        matrix = resolve1(form.attrs.get("Matrix")) or MATRIX_IDENTITY
+        self._ctm = mult_matrix(tuple(matrix), self._ctm)
+        self._form_stack.append(id(form))
+        self._interpret(iter_stream_chunks(form), resolve1(form.attrs.get("Resources")) or resources)
+        self._form_stack.pop()
+        self._do_Q([], resources)
+
+    # Контуры
+
+    def _do_m(self, operands: list[Any], resources: dict) -> None:
+        self._close_subpath()
+        self._subpath = [apply_matrix_pt(self._ctm, tuple(operands[-2:]))]
+
+    def _do_l(self, operands: list[Any], resources: dict) -> None:
+        self._subpath.append(apply_matrix_pt(self._ctm, tuple(operands[-2:])))
+
+    def _do_curve(self, operands: list[Any], resources: dict) -> None:
+        # Кривые не нужны, но фрагмент с ними уже не является отрезком
+        self._subpath.append(apply_matrix_pt(self._ctm, tuple(operands[-2:])))
+        self._subpath.append(self._subpath[-1])
+
+    def _do_close_path(self, operands: list[Any], resources: dict) -> None:
+        if self._subpath:
+            self._subpath.append(self._subpath[0])
+
+    def _do_re(self, operands: list[Any], resources: dict) -> None:
+        # Прямоугольник в pdfminer - объект LTRect, а не линии, поэтому только завершаем фрагмент
+        self._close_subpath()
+
+    def _do_stroke(self, operands: list[Any], resources: dict) -> None:
+        self._close_subpath()
+        for subpath in self._subpaths:
+            if len(subpath) == 2:
+                line = LTLine(self._line_width, subpath[0], subpath[1], stroke=True)
+                self.elements.append(RawElement("LTLine", None, line))
+        self._subpaths = []
+
+    def _do_end_path(self, operands: list[Any], resources: dict) -> None:
+        self._subpath = []
+        self._subpaths = []
+
+    def _close_subpath(self) -> None:
+        if self._subpath:
+            self._subpaths.append(self._subpath)
+            self._subpath = []
+
+    # Текст
+
+    def _do_BT(self, operands: list[Any], resources: dict) -> None:
+        self._text_matrix = self._line_matrix = MATRIX_IDENTITY
+
+    def _do_Tf(self, operands: list[Any], resources: dict) -> None:
+        self._text_state.font = self._get_font(resources, operands[-2])
+        self._text_state.font_size = operands[-1]
+
+    def _do_Tc(self, operands: list[Any], resources: dict) -> None:
+        self._text_state.char_spacing = operands[-1]
+
+    def _do_Tw(self, operands: list[Any], resources: dict) -> None:
+        self._text_state.word_spacing = operands[-1]
+
+    def _do_Tz(self, operands: list[Any], resources: dict) -> None:
+        self._text_state.scaling = operands[-1]
+
+    def _do_TL(self, operands: list[Any], resources: dict) -> None:
+        self._text_state.leading = operands[-1]
+
+    def _do_Ts(self, operands: list[Any], resources: dict) -> None:
+        self._text_state.rise = operands[-1]
+
+    def _do_Td(self, operands: list[Any], resources: dict) -> None:
+        tx, ty = operands[-2:]
+        self._line_matrix = mult_matrix((1, 0, 0, 1, tx, ty), self._line_matrix)
+        self._text_matrix = self._line_matrix
+
+    def _do_TD(self, operands: list[Any], resources: dict) -> None:
+        self._text_state.leading = -operands[-1]
+        self._do_Td(operands, resources)
+
+    def _do_Tm(self, operands: list[Any], resources: dict) -> None:
+        self._text_matrix = self._line_matrix = tuple(operands[-6:])
+
+    def _do_T_star(self, operands: list[Any], resources: dict) -> None:
+        self._do_Td([0, -self._text_state.leading], resources)
+
+    def _do_Tj(self, operands: list[Any], resources: dict) -> None:
+        self._show_text([operands[-1]])
+
+    def _do_TJ(self, operands: list[Any], resources: dict) -> None:
+        self._show_text(operands[-1])
+
+    def _do_quote(self, operands: list[Any], resources: dict) -> None:
+        self._do_T_star([], resources)
+        self._show_text([operands[-1]])
+
+    def _do_double_quote(self, operands: list[Any], resources: dict) -> None:
+        self._text_state.word_spacing, self._text_state.char_spacing = operands[-3:-1]
+        self._do_quote(operands, resources)
+
+    def _get_font(self, resources: dict, name: PSLiteral) -> Optional[PDFFont]:
+        fonts = resolve1(resources.get("Font")) or {}
+        font_ref = fonts.get(str(name.name))
+        if font_ref is None:
+            return None
+        objid = font_ref.objid if isinstance(font_ref, PDFObjRef) else None
+        # PDFResourceManager сам кэширует шрифты по номеру объекта
+        return self._resources_mgr.get_font(objid, resolve1(font_ref))
+
+    def _show_text(self, items: list[Any]) -> None:
+        """
+        Вычисляет текст и границы надписи так же, как pdfminer вычисляет их для символов
+        (PDFTextDevice.render_string_horizontal и LTChar), но без создания объектов для каждого символа.
+        """
+        state = self._text_state
+        font = state.font
+        if font is None or not isinstance(items, list):
+            return
+        font_size = state.font_size
+        scaling = state.scaling * 0.01
+        char_spacing = state.char_spacing * scaling
+        word_spacing = state.word_spacing * scaling if not font.is_multibyte() else 0.0
+
+        chars = []
+        x = 0.0
+        need_char_space = False
+        for item in items:
+            if isinstance(item, (int, float)):
+                x -= item * 0.001 * font_size * scaling
+                need_char_space = True
+                continue
+            if not isinstance(item, bytes):
+                continue
+            for cid in font.decode(item):
+                if need_char_space:
+                    x += char_spacing
+                try:
+                    chars.append(font.to_unichr(cid))
+                except PDFUnicodeNotDefined:
+                    chars.append(f"(cid:{cid})")
+                x += font.char_width(cid) * font_size * scaling
+                if cid == 32 and word_spacing:
+                    x += word_spacing
+                need_char_space = True
+
+        matrix = mult_matrix(self._text_matrix, self._ctm)
+        descent = font.get_descent() * font_size + state.rise
+        corners = [apply_matrix_pt(matrix, point)
+                   for point in ((0, descent), (x, descent), (0, descent + font_size), (x, descent + font_size))]
+        xs = [point[0] for point in corners]
+        ys = [point[1] for point in corners]
+        text = "".join(chars)
+        if self._normalize_spaces:
+            text = " ".join(text.split())
+        if text:
+            self.elements.append(RawElement(TEXT_TAG, text, LTComponent((min(xs), min(ys), max(xs), max(ys)))))
+
+        # Следующая надпись продолжается с того места, где закончилась эта
+        self._text_matrix = mult_matrix((1, 0, 0, 1, x, 0), self._text_matrix)
+
+
+_HANDLERS = {
+    "q": _ContentInterpreter._do_q,
+    "Q": _ContentInterpreter._do_Q,
+    "cm": _ContentInterpreter._do_cm,
+    "w": _ContentInterpreter._do_w,
+    "Do": _ContentInterpreter._do_Do,
+    "m": _ContentInterpreter._do_m,
+    "l": _ContentInterpreter._do_l,
+    "c": _ContentInterpreter._do_curve,
+    "v": _ContentInterpreter._do_curve,
+    "y": _ContentInterpreter._do_curve,
+    "re": _ContentInterpreter._do_re,
+    "h": _ContentInterpreter._do_close_path,
+    "S": _ContentInterpreter._do_stroke,
+    "s": _ContentInterpreter._do_stroke,
+    "B": _ContentInterpreter._do_stroke,
+    "B*": _ContentInterpreter._do_stroke,
+    "b": _ContentInterpreter._do_stroke,
+    "b*": _ContentInterpreter._do_stroke,
+    "n": _ContentInterpreter._do_end_path,
+    "f": _ContentInterpreter._do_end_path,
+    "F": _ContentInterpreter._do_end_path,
+    "f*": _ContentInterpreter._do_end_path,
+    "BT": _ContentInterpreter._do_BT,
+    "Tf": _ContentInterpreter._do_Tf,
+    "Tc": _ContentInterpreter._do_Tc,
+    "Tw": _ContentInterpreter._do_Tw,
+    "Tz": _ContentInterpreter._do_Tz,
+    "TL": _ContentInterpreter._do_TL,
+    "Ts": _ContentInterpreter._do_Ts,
+    "Td": _ContentInterpreter._do_Td,
+    "TD": _ContentInterpreter._do_TD,
+    "Tm": _ContentInterpreter._do_Tm,
+    "T*": _ContentInterpreter._do_T_star,
+    "Tj": _ContentInterpreter._do_Tj,
+    "TJ": _ContentInterpreter._do_TJ,
+    "'": _ContentInterpreter._do_quote,
+    "\"": _ContentInterpreter._do_double_quote,
+}
+
+
+class OperatorPdfParser:
+    """
+    Парсер, возвращающий объекты страницы в виде списка RawElement,
+    полученных напрямую из операторов потока данных.
+    Интерфейс повторяет основные методы RawPdfParser.
+    """
+
+    def __init__(
+            self,
+            pdf_file_path: str,
+            normalize_spaces: bool = True,
+            use_mmap: bool = False
+    ):
+        """
+        :param pdf_file_path: Путь к документу.
+        :param normalize_spaces: Заменять последовательности пробельных символов
+            в текстах на один пробел и убирать пробелы по краям.
+        :param use_mmap: Читать документ через отображение файла в память, см. open_pdf_file().
+        """
+        self._file_path = pdf_file_path
+        self._normalize_spaces = normalize_spaces
+        self._use_mmap = use_mmap
+
+        self._file: Optional[BinaryIO] = None
+        self._doc: Optional[PDFDocument] = None
+        self._resources_mgr: Optional[PDFResourceManager] = None
+        self._pages: list[PDFPage] = []
+        self._pages_iter: Optional[Iterator[PDFPage]] = None
+
+    @property
+    def doc(self) -> PDFDocument:
+        """
+        :return: Документ pdfminer. После завершения работы необходимо вызвать close().
+        """
+        self._init_document()
+        return self._doc
+
+    def _init_document(self) -> None:
+        if self._doc is None:
+            self._file = open_pdf_file(self._file_path, self._use_mmap)
+            parser = PDFParser(self._file)
+            self._doc = PDFDocument(parser)
+            parser.set_document(self._doc)
+            self._resources_mgr = PDFResourceManager()
+            self._pages_iter = PDFPage.create_pages(self._doc)
+
+    def close(self) -> None:
+        """
+        Закрывает документ.
+        Вместо явного вызова можно использовать парсер как контекстный менеджер.
+        """
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self) -> "OperatorPdfParser":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def get_page(self, page_index: int) -> PDFPage:
+        """
+        :param page_index: Номер страницы, начиная с 0.
+        :return: Страница pdfminer. Страницы читаются из документа по мере необходимости.
+        """
+        self._init_document()
+        if page_index < 0:
+            raise IndexError(f"Номер страницы не может быть отрицательным: {page_index}")
+        while len(self._pages) <= page_index:
+            page = next(self._pages_iter, None)
+            if page is None:
+                raise IndexError(f"В документе нет страницы с номером {page_index}")
+            self._pages.append(page)
+        return self._pages[page_index]
+
+    def get_all_page_elements(self, page_index: int) -> list[RawElement]:
+        """
+        :param page_index: Номер страницы, начиная с 0.
+        :return: Тексты и отрезки, выведенные на странице, в порядке их вывода.
+        """
+        page = self.get_page(page_index)
+        return _ContentInterpreter(self._resources_mgr, self._normalize_spaces).interpret_page(page)
+
+    def find_elements(self, page_index: int, tag: str) -> list[RawElement]:
+        """
+        :param page_index: Номер страницы, начиная с 0.
+        :param tag: "LTLine" или TEXT_TAG.
+        """
+        return [element for element in self.get_all_page_elements(page_index) if element.tag == tag]
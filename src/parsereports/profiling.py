@@ -0,0 +1,154 @@
+"""
+Этот модуль содержит средства для профилирования этапов парсинга и анализа страниц.
+
+Профилировщик передаётся в BasicPdfParser и TableReportAnalyzer явно.
+Если он не передан, то вместо замеров используется один общий пустой контекстный менеджер,
+поэтому накладные расходы сводятся к одной проверке на каждый этап.
+
+Этапы, которые замеряются в BasicPdfParser и TableReportAnalyzer:
+- open - открытие документа и чтение его структуры,
+- scan - просмотр потока данных страницы в адаптивном режиме, см. модуль adaptiveparams,
+- interpret - интерпретация потока данных страницы в pdfminer,
+- layout - анализ разметки страницы в pdfminer (группировка символов в строки и блоки),
+- tree - построение дерева элементов PDFQuery, включая merge_tags и resort,
+- clean_text - очистка и нормализация текстов в дереве PDFQuery,
+- cache - чтение страницы из дискового кэша и запись в него,
+- query - запрос элементов страницы через PDFQuery,
+- analyze.* - этапы анализа в TableReportAnalyzer.
+Время вложенных этапов не входит во время внешнего этапа,
+поэтому сумма времени всех этапов равна общему времени работы.
+"""
+
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, ContextManager, Iterable, Iterator, Optional
+
+
+@dataclass
+class StageRecord:
+    """
+    Результат замера одного выполнения этапа.
+    """
+    stage: str
+    # Номер страницы, если этап относится к странице
+    page_index: Optional[int] = None
+    # Время выполнения без учёта вложенных этапов
+    elapsed_s: float = 0.0
+    # Количество обработанных или созданных элементов, если этап его сообщает
+    num_elements: Optional[int] = None
+    # Прирост памяти, выделенной Python за время этапа (только при trace_allocations)
+    allocated_bytes: Optional[int] = None
+
+
+# Общая запись для выключенного профилирования: значения, записанные в неё, никуда не попадают
+_DISABLED_RECORD = StageRecord("disabled")
+_DISABLED_STAGE = nullcontext(_DISABLED_RECORD)
+
+
+class ParseProfiler:
+    """
+    Собирает замеры этапов и передаёт каждый замер в функции обратного вызова,
+    например, для отправки в систему сбора метрик.
+    """
+
+    def __init__(
+            self,
+            callbacks: Iterable[Callable[[StageRecord], None]] = (),
+            trace_allocations: bool = False,
+            keep_records: bool = True
+    ):
+        """
+        :param callbacks: Функции, вызываемые после завершения каждого этапа.
+        :param trace_allocations: Замерять ли выделение памяти с помощью tracemalloc.
+            Это заметно замедляет работу, поэтому по умолчанию выключено.
+            Если трассировка не была включена заранее, то она включается
+            только на время выполнения этапов.
+        :param keep_records: Сохранять ли все замеры для отчёта report().
+            Для долгих процессов, которые только передают замеры в callbacks, можно выключить.
+        """
+        self.records: list[StageRecord] = []
+        self._callbacks = list(callbacks)
+        self._trace_allocations = trace_allocations
+        self._keep_records = keep_records
+        # Суммарное время вложенных этапов для каждого незавершённого этапа
+        self._children_time_stack: list[float] = []
+        self._started_tracing = False
+
+    @contextmanager
+    def stage(self, stage: str, page_index: Optional[int] = None) -> Iterator[StageRecord]:
+        """
+        Контекстный менеджер для замера этапа.
+        В возвращаемой записи можно заполнить num_elements.
+        """
+        record = StageRecord(stage, page_index)
+        if self._trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        start_memory = tracemalloc.get_traced_memory()[0] if self._trace_allocations else 0
+        self._children_time_stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter() - start
+            children_time = self._children_time_stack.pop()
+            if self._children_time_stack:
+                self._children_time_stack[-1] += elapsed
+            record.elapsed_s = elapsed - children_time
+            if self._trace_allocations:
+                record.allocated_bytes = tracemalloc.get_traced_memory()[0] - start_memory
+                if self._started_tracing and not self._children_time_stack:
+                    tracemalloc.stop()
+                    self._started_tracing = False
+            self._add_record(record)
+
+    def _add_record(self, record: StageRecord) -> None:
+        if self._keep_records:
+            self.records.append(record)
+        for callback in self._callbacks:
+            callback(record)
+
+    def report(self) -> dict[str, Any]:
+        """
+        :return: Сводка в виде словаря, который можно сохранить в JSON:
+            суммарные показатели по этапам, время этапов по страницам и все замеры.
+        """
+        stages: dict[str, dict[str, Any]] = {}
+        pages: dict[int, dict[str, float]] = {}
+        for record in self.records:
+            summary = stages.setdefault(record.stage, {
+                "count": 0, "total_s": 0.0, "max_s": 0.0, "num_elements": 0, "allocated_bytes": 0,
+            })
+            summary["count"] += 1
+            summary["total_s"] += record.elapsed_s
+            summary["max_s"] = max(summary["max_s"], record.elapsed_s)
+            summary["num_elements"] += record.num_elements or 0
+            summary["allocated_bytes"] += record.allocated_bytes or 0
+            if record.page_index is not None:
+                page_stages = pages.setdefault(record.page_index, {})
+                page_stages[record.stage] = page_stages.get(record.stage, 0.0) + record.elapsed_s
+
+        for summary in stages.values():
+            summary["mean_s"] = summary["total_s"] / summary["count"]
+        return {
+            "total_s": sum(summary["total_s"] for summary in stages.values()),
+            "stages": stages,
+            "pages": pages,
+            "records": [asdict(record) for record in self.records],
+        }
+
+
+def profile_stage(
+        profiler: Optional[ParseProfiler],
+        stage: str,
+        page_index: Optional[int] = None
+) -> ContextManager[StageRecord]:
+    """
+    :return: Контекстный менеджер замера этапа или пустой контекстный менеджер,
+        если профилировщик не задан.
+    """
+    if profiler is None:
+        return _DISABLED_STAGE
+    return profiler.stage(stage, page_index)
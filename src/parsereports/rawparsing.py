@@ -0,0 +1,205 @@
+"""
+Этот модуль содержит облегчённый парсер, который получает объекты страницы
+напрямую из pdfminer, без построения дерева lxml в PDFQuery
+и без запросов с CSS-селекторами.
+Пример прямой настройки pdfminer можно посмотреть в скрипте list_all_elements_raw_pdfminer.py.
+
+Объекты RawElement можно передавать в TableReportAnalyzer и в функции извлечения картинок
+вместо LayoutElement: у них есть те же свойства tag, text и layout.
+"""
+
+import re
+from typing import Any, BinaryIO, Iterator, Optional, Union
+
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams, LTAnno, LTChar, LTContainer, LTItem, LTPage, LTTextBox, \
+    LTTextLine
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+
+from parsereports.basicparsing import open_pdf_file
+from parsereports.elementfilter import ElementFilter, SelectivePageAggregator
+
+# Параметры анализа разметки, которые по умолчанию использует PDFQuery
+DEFAULT_LAPARAMS = dict(all_texts=True, detect_vertical=True)
+
+_SPACES_RE = re.compile(r"\s+")
+
+
+def get_element_text(item: LTItem, parent: LTContainer, normalize_spaces: bool = True) -> Optional[str]:
+    """
+    :param item: Объект pdfminer.
+    :param parent: Объект, в котором лежит item.
+    :param normalize_spaces: Заменять последовательности пробельных символов на один пробел.
+    :return: Текст объекта так, как его хранит PDFQuery, или None, если у объекта нет текста.
+    """
+    if isinstance(parent, LTTextBox) and isinstance(item, LTTextLine):
+        # Как и в PDFQuery, текст блока целиком хранится в самом блоке,
+        # а у строк внутри блока текст пустой
+        return ""
+    if not hasattr(item, "get_text"):
+        return None
+    text = item.get_text()
+    if normalize_spaces:
+        text = _SPACES_RE.sub(" ", text)
+    return text
+
+
+class RawElement:
+    """
+    Облегчённая замена LayoutElement из PDFQuery.
+    Хранит только название типа объекта, текст и сам объект pdfminer.
+    """
+    __slots__ = ("tag", "text", "layout")
+
+    def __init__(self, tag: str, text: Optional[str], layout: LTItem):
+        self.tag = tag
+        self.text = text
+        self.layout = layout
+
+    def __repr__(self) -> str:
+        return f"<{self.tag}>"
+
+
+class RawPdfParser:
+    """
+    Парсер, возвращающий объекты страницы в виде списка RawElement.
+    Интерфейс повторяет основные методы BasicPdfParser.
+    """
+
+    def __init__(
+            self,
+            pdf_file_path: str,
+            laparams: Optional[Union[LAParams, dict[str, Any]]] = None,
+            normalize_spaces: bool = True,
+            include_chars: bool = False,
+            use_mmap: bool = False,
+            element_filter: Optional[ElementFilter] = None
+    ):
+        """
+        :param pdf_file_path: Путь к документу.
+        :param laparams: Параметры анализа разметки pdfminer (объект LAParams или словарь
+            с параметрами его конструктора). По умолчанию - те же, что в PDFQuery.
+        :param normalize_spaces: Заменять последовательности пробельных символов
+            в текстах на один пробел, как это делает PDFQuery.
+        :param include_chars: Включать ли в результат отдельные символы (LTChar).
+            Обычно для анализа достаточно строк текста, поэтому по умолчанию символы пропускаются.
+        :param use_mmap: Читать документ через отображение файла в память, см. open_pdf_file().
+        :param element_filter: Фильтр объектов для выборочного извлечения, см. BasicPdfParser.
+        """
+        self._file_path = pdf_file_path
+        if laparams is None:
+            laparams = DEFAULT_LAPARAMS
+        self._laparams = LAParams(**laparams) if isinstance(laparams, dict) else laparams
+        self._normalize_spaces = normalize_spaces
+        self._include_chars = include_chars
+        self._use_mmap = use_mmap
+        self._element_filter = element_filter
+
+        self._file: Optional[BinaryIO] = None
+        self._doc: Optional[PDFDocument] = None
+        self._device: Optional[PDFPageAggregator] = None
+        self._interpreter: Optional[PDFPageInterpreter] = None
+        self._pages: list[PDFPage] = []
+        self._pages_iter: Optional[Iterator[PDFPage]] = None
+
+    @property
+    def doc(self) -> PDFDocument:
+        """
+        :return: Документ pdfminer, например, для доступа к ресурсам страниц.
+            После завершения работы необходимо вызвать close().
+        """
+        self._init_document()
+        return self._doc
+
+    def _init_document(self) -> None:
+        if self._doc is None:
+            self._file = open_pdf_file(self._file_path, self._use_mmap)
+            parser = PDFParser(self._file)
+            self._doc = PDFDocument(parser)
+            parser.set_document(self._doc)
+
+            resources_mgr = PDFResourceManager()
+            if self._element_filter is None:
+                self._device = PDFPageAggregator(resources_mgr, laparams=self._laparams)
+            else:
+                self._device = SelectivePageAggregator(resources_mgr, self._element_filter,
+                                                       laparams=self._laparams)
+            self._interpreter = PDFPageInterpreter(resources_mgr, self._device)
+            self._pages_iter = PDFPage.create_pages(self._doc)
+
+    def close(self) -> None:
+        """
+        Закрывает документ.
+        Вместо явного вызова можно использовать парсер как контекстный менеджер.
+        """
+        if self._file is not None:
+            self._file.close()
+
+    def __enter__(self) -> "RawPdfParser":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def get_page(self, page_index: int) -> PDFPage:
+        """
+        :param page_index: Номер страницы, начиная с 0.
+        :return: Страница pdfminer. Страницы читаются из документа по мере необходимости.
+        """
+        self._init_document()
+        if page_index < 0:
+            raise IndexError(f"Номер страницы не может быть отрицательным: {page_index}")
+        while len(self._pages) <= page_index:
+            page = next(self._pages_iter, None)
+            if page is None:
+                raise IndexError(f"В документе нет страницы с номером {page_index}")
+            self._pages.append(page)
+        return self._pages[page_index]
+
+    def get_page_layout(self, page_index: int) -> LTPage:
+        """
+        :param page_index: Номер страницы, начиная с 0.
+        :return: Результат анализа разметки страницы в pdfminer.
+        """
+        page = self.get_page(page_index)
+        self._interpreter.process_page(page)
+        return self._device.get_result()
+
+    def get_all_page_elements(self, page_index: int) -> list[RawElement]:
+        """
+        :param page_index: Номер страницы, начиная с 0.
+        :return: Список всех объектов, отрендеренных на странице,
+            в порядке обхода иерархии pdfminer сверху вниз.
+        """
+        return list(self._iter_elements(self.get_page_layout(page_index)))
+
+    def get_page_store(self, page_index: int) -> "ElementStore":
+        """
+        :param page_index: Номер страницы, начиная с 0.
+        :return: Объекты страницы в компактном хранилище ElementStore.
+            Объекты pdfminer в нём не хранятся, поэтому так удобно держать в памяти много страниц.
+        """
+        # Импорт внутри метода, т.к. модуль elementstore сам использует определения из этого модуля
+        from parsereports.elementstore import ElementStore
+        return ElementStore.from_layout(self.get_page_layout(page_index), self._normalize_spaces,
+                                        self._include_chars)
+
+    def find_elements(self, page_index: int, tag: str) -> list[RawElement]:
+        """
+        Аналог запроса к PDFQuery вида 'LTPage[page_index="0"] LTImage'.
+
+        :param page_index: Номер страницы, начиная с 0.
+        :param tag: Название класса объектов pdfminer, например, "LTImage".
+        """
+        return [element for element in self.get_all_page_elements(page_index) if element.tag == tag]
+
+    def _iter_elements(self, container: LTContainer) -> Iterator[RawElement]:
+        for item in container:
+            if isinstance(item, LTAnno) or (isinstance(item, LTChar) and not self._include_chars):
+                continue
+            yield RawElement(type(item).__name__, get_element_text(item, container, self._normalize_spaces), item)
+            if isinstance(item, LTContainer):
+                yield from self._iter_elements(item)
@@ -1,9 +1,16 @@
 """
 Этот скрипт демонстрирует, как можно получить доступ к потоку данных (content stream)
 страницы. Раскодированный поток данных будет сохранён в текстовый файл.
+Если поток данных страницы состоит из нескольких частей (атрибут Contents - массив),
+то части сохраняются подряд. Данные раскодируются и записываются в файл по частям.
 """
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+
 import pdf_storage
-from parsereports.basicparsing import BasicPdfParser
+from parsereports.basicparsing import open_pdf_file
+from parsereports.contentstream import get_page_streams, iter_streams_chunks
 
 INPUT_FILE_PATH = pdf_storage.table_report_file_path
 PAGE_INDEX = 0
@@ -19,15 +26,17 @@ def main():
                             f"(по умолчанию \"{SAVED_FILE_PATH}\"): ") or SAVED_FILE_PATH
     page_index = int(page_index_str)
 
-    parser = BasicPdfParser(input_file_path)
-    pdf_doc = parser.pq.doc
-    page_dict = pdf_doc.catalog["Pages"].resolve()["Kids"][page_index].resolve()
-    page_content_stream = page_dict["Contents"].resolve()
-    parser.close()
-
-    with open(saved_file_path, 'wb') as f:
-        f.write(page_content_stream.data)
-        f.flush()
+    with open_pdf_file(input_file_path) as pdf_file:
+        pdf_doc = PDFDocument(PDFParser(pdf_file))
+        for current_index, page in enumerate(PDFPage.create_pages(pdf_doc)):
+            if current_index == page_index:
+                break
+        else:
+            raise IndexError(f"В документе нет страницы с номером {page_index}")
+
+        with open(saved_file_path, 'wb') as f:
+            for chunk in iter_streams_chunks(get_page_streams(page)):
+                f.write(chunk)
 
     print("Сохранено в файл " + saved_file_path)
 
@@ -6,14 +6,20 @@
 Примеры использования этих определений можно увидеть в тестах:
 parsereports/tests/test_able_analysis.py.
 """
+from bisect import bisect_left, bisect_right
 from collections import defaultdict
 from dataclasses import dataclass, field
-from itertools import chain
-from typing import Optional, Iterable
+from typing import Optional, Iterable, Iterator
 
+import numpy as np
 from pdfquery.pdfquery import LayoutElement
 from reportlab.lib.units import mm
 
+from parsereports.profiling import ParseProfiler, profile_stage
+
+# Допустимое отклонение координат линий таблицы по умолчанию, в пунктах
+DEFAULT_COORDINATE_TOLERANCE = 0.1
+
 
 @dataclass
 class TableLegendField:
@@ -66,8 +72,8 @@ class TableReportPage:
     не исказили результаты анализа, но для этого нужно усложнять код.
     Для примера хватит простейшего варианта.
     """
-    legend = TableReportLegend()
-    table = TableReportTable()
+    legend: TableReportLegend = field(default_factory=TableReportLegend)
+    table: TableReportTable = field(default_factory=TableReportTable)
     all_elements: list[LayoutElement] = field(default_factory=list)
 
 
@@ -80,29 +86,60 @@ class TableReportAnalyzer:
     которая не нужна для последующей работы с элементами.
     Поэтому разумно отделять код анализатора от самого page object.
     """
-    def __init__(self):
+    def __init__(
+            self,
+            coordinate_tolerance: float = DEFAULT_COORDINATE_TOLERANCE,
+            profiler: Optional[ParseProfiler] = None,
+            detect_legend: bool = True
+    ):
         """
         Конструктор только создаёт анализатор с пустым page object.
+
+        :param coordinate_tolerance: Допустимое отклонение координат в пунктах.
+            Линии, координаты которых отличаются не больше, чем на эту величину,
+            считаются лежащими на одной прямой. Это нужно для документов,
+            в которых из-за погрешностей вычислений координаты одной линии таблицы
+            немного отличаются у разных отрезков.
+        :param profiler: Профилировщик для замера этапов анализа (analyze.*), см. модуль profiling.
+        :param detect_legend: Искать справочные сведения слева от таблицы.
+            Отключается, когда анализируется только область одной таблицы.
         """
         self.page_object = TableReportPage()
+        self._coordinate_tolerance = coordinate_tolerance
+        self._profiler = profiler
+        self._detect_legend = detect_legend
 
         self._all_elements: list[LayoutElement] = []
         self._all_text_elements: list[LayoutElement] = []
+        # Координаты (x0, y0, x1, y1) горизонтальных и вертикальных линий
+        self._table_line_bboxes = np.empty((0, 4))
 
     def analyze(self, page_elements: Iterable[LayoutElement]) -> None:
         """
         После вызова analyze из поля page_object можно забирать результат.
 
         :param page_elements: Набор объектов со страницы,
-            полученный от PDFQuery.
+            полученный от PDFQuery (BasicPdfParser), от RawPdfParser или от OperatorPdfParser,
+            либо компактное хранилище ElementStore (см. RawPdfParser.get_page_store()).
         """
+        profiler = self._profiler
         self._all_elements = list(page_elements)
         self.page_object.all_elements = self._all_elements
-        self._detect_text_elements()
-        self._detect_table_lines()
-        self._detect_table_rectangle()
-        self._detect_table_cell_contents()
-        self._detect_legend_elements()
+        with profile_stage(profiler, "analyze.texts") as record:
+            self._detect_text_elements()
+            record.num_elements = len(self._all_text_elements)
+        with profile_stage(profiler, "analyze.lines") as record:
+            self._detect_table_lines()
+            record.num_elements = len(self._table_line_bboxes)
+        with profile_stage(profiler, "analyze.rectangle"):
+            self._detect_table_rectangle()
+        with profile_stage(profiler, "analyze.cells") as record:
+            self._detect_table_cell_contents()
+            record.num_elements = sum(map(len, self.page_object.table.cells))
+        if self._detect_legend:
+            with profile_stage(profiler, "analyze.legend") as record:
+                self._detect_legend_elements()
+                record.num_elements = len(self.page_object.legend.fields)
 
     def _detect_text_elements(self) -> None:
         self._all_text_elements = [element for element in self._all_elements
@@ -110,27 +147,74 @@ class TableReportAnalyzer:
                                    and getattr(element, "text", None)]
 
     def _detect_table_lines(self) -> None:
+        # Координаты всех линий упаковываются в один массив (x0, y0, x1, y1),
+        # и дальше вся работа с координатами выполняется операциями над массивами
+        lines = [element for element in self._all_elements if element.tag == "LTLine"]
+        bboxes = np.array([(line.layout.x0, line.layout.y0, line.layout.x1, line.layout.y1)
+                           for line in lines], dtype=float).reshape(-1, 4)
+        tolerance = self._coordinate_tolerance
+        is_horizontal = np.abs(bboxes[:, 3] - bboxes[:, 1]) <= tolerance
+        is_vertical = np.abs(bboxes[:, 2] - bboxes[:, 0]) <= tolerance
+        self._table_line_bboxes = bboxes[is_horizontal | is_vertical]
+
         table = self.page_object.table
-        table.horizontal_lines = [element for element in self._all_elements
-                                  if element.tag == "LTLine"
-                                  and element.layout.y0 == element.layout.y1]
-        table.vertical_lines = [element for element in self._all_elements
-                                if element.tag == "LTLine"
-                                and element.layout.x0 == element.layout.x1]
-        for line in table.horizontal_lines:
-            table.horizontal_lines_by_y[line.layout.y0].append(line)
-        for line in table.vertical_lines:
-            table.vertical_lines_by_x[line.layout.x0].append(line)
+        horizontal_indices = np.flatnonzero(is_horizontal)
+        vertical_indices = np.flatnonzero(is_vertical)
+        table.horizontal_lines = [lines[i] for i in horizontal_indices]
+        table.vertical_lines = [lines[i] for i in vertical_indices]
+        self._cluster_lines_by_coordinate(
+            lines, horizontal_indices,
+            coordinates=bboxes[horizontal_indices, 1],
+            lines_by_coordinate=table.horizontal_lines_by_y
+        )
+        self._cluster_lines_by_coordinate(
+            lines, vertical_indices,
+            coordinates=bboxes[vertical_indices, 0],
+            lines_by_coordinate=table.vertical_lines_by_x
+        )
+
+    def _cluster_lines_by_coordinate(
+            self,
+            lines: list[LayoutElement],
+            indices: np.ndarray,
+            coordinates: np.ndarray,
+            lines_by_coordinate: dict[float, list[LayoutElement]]
+    ) -> None:
+        """
+        Раскладывает линии по прямым, на которых они лежат.
+        Координаты сортируются, и новая прямая начинается там, где разрыв
+        между соседними координатами больше допустимого отклонения.
+        Ключом прямой служит наименьшая из координат её линий.
+        Внутри каждой прямой линии с одинаковой координатой идут в исходном порядке.
+
+        :param indices: Номера линий в списке lines.
+        :param coordinates: Постоянная координата каждой линии (y для горизонтальных, x для вертикальных).
+        """
+        if not len(indices):
+            return
+
+        order = np.argsort(coordinates, kind="stable")
+        sorted_coordinates = coordinates[order]
+        is_cluster_start = np.empty(len(order), dtype=bool)
+        is_cluster_start[0] = True
+        np.greater(np.diff(sorted_coordinates), self._coordinate_tolerance, out=is_cluster_start[1:])
+        cluster_starts = np.flatnonzero(is_cluster_start)
+
+        for coordinate, cluster_order in zip(
+                sorted_coordinates[cluster_starts].tolist(),
+                np.split(order, cluster_starts[1:])
+        ):
+            lines_by_coordinate[coordinate].extend(lines[i] for i in indices[cluster_order])
 
     def _detect_table_rectangle(self) -> None:
         min_x, min_y, max_x, max_y = 1e5, 1e5, 0.0, 0.0
-        table = self.page_object.table
-        for line in chain(table.horizontal_lines, table.vertical_lines):
-            min_x = min(min_x, line.layout.x0)
-            max_x = max(max_x, line.layout.x1)
-            min_y = min(min_y, line.layout.y0)
-            max_y = max(max_y, line.layout.y1)
-        table.table_rect = (min_x, min_y, max_x, max_y)
+        bboxes = self._table_line_bboxes
+        if len(bboxes):
+            min_x = min(min_x, float(bboxes[:, 0].min()))
+            min_y = min(min_y, float(bboxes[:, 1].min()))
+            max_x = max(max_x, float(bboxes[:, 2].max()))
+            max_y = max(max_y, float(bboxes[:, 3].max()))
+        self.page_object.table.table_rect = (min_x, min_y, max_x, max_y)
 
     def _detect_table_cell_contents(self) -> None:
         table = self.page_object.table
@@ -141,33 +225,37 @@ class TableReportAnalyzer:
                                     *sorted(table.horizontal_lines_by_y.keys(), reverse=True),
                                     table.table_rect[1]]
         row_length = len(cell_borders_x_positions) - 1
+        table.cells = [[None] * row_length for _ in range(len(cell_borders_y_positions) - 1)]
 
-        # Цикл по строкам: ищем все тексты между верхней и нижней границами строки.
-        for row_top, row_bottom in zip(
-                cell_borders_y_positions[:-1],
-                cell_borders_y_positions[1:]
-        ):
-            row: list[Optional[LayoutElement]] = [None] * row_length
-            table.cells.append(row)
-
-            # Цикл по колонкам: ищем текст между левой и правой границами колонки.
-            for col_index, (col_left, col_right) in enumerate(zip(
-                    cell_borders_x_positions[:-1],
-                    cell_borders_x_positions[1:])
+        # Вместо перебора всех текстов для каждой ячейки определяем для каждого текста
+        # подходящие строки и колонки двоичным поиском по отсортированным границам.
+        # Границы строк идут сверху вниз, поэтому для поиска меняем знак координат Y.
+        negated_y_positions = [-y for y in cell_borders_y_positions]
+        for element in self._all_text_elements:
+            layout = element.layout
+            for row_index in self._find_enclosing_intervals(
+                    negated_y_positions, -layout.y1, -layout.y0
             ):
-                # Ищем подходящий текстовый элемент
-                # (В теории можно уменьшить алгоритмическую сложность перебора
-                # за счёт предварительных сортировок, но для примера мы оставляем
-                # наиболее очевидный код, который легче прочитать сверху вниз)
-                for element in self._all_text_elements:
-                    if (
-                            element.layout.x0 >= col_left and
-                            element.layout.x1 <= col_right and
-                            element.layout.y0 >= row_bottom and
-                            element.layout.y1 <= row_top
-                    ):
+                row = table.cells[row_index]
+                for col_index in self._find_enclosing_intervals(
+                        cell_borders_x_positions, layout.x0, layout.x1
+                ):
+                    # Ячейке достаётся первый подходящий текст, как и при полном переборе
+                    if row[col_index] is None:
                         row[col_index] = element
-                        break
+
+    @staticmethod
+    def _find_enclosing_intervals(borders: list[float], low: float, high: float) -> range:
+        """
+        :param borders: Отсортированные по возрастанию границы интервалов.
+        :return: Номера интервалов (borders[i], borders[i + 1]),
+            которые целиком содержат отрезок (low, high).
+        """
+        first = max(bisect_left(borders, high) - 1, 0)
+        last = min(bisect_right(borders, low) - 1, len(borders) - 2)
+        return range(first, last + 1) if (
+            first <= last and borders[first] <= low and high <= borders[last + 1]
+        ) else range(0)
 
     def _detect_legend_elements(self) -> None:
         table_left_border = self.page_object.table.table_rect[0]
@@ -191,11 +279,178 @@ class TableReportAnalyzer:
             value = None
             if (
                     legend_elements and
-                    (value := legend_elements[0]) is not None and
-                    abs(label.layout.y0 - value.layout.y0) <= max_vertical_shift
+                    abs(label.layout.y0 - legend_elements[0].layout.y0) <= max_vertical_shift
             ):
-                legend_elements.pop(0)
-
-            if label.layout.x0 > value.layout.x0:
-                label, value = value, label
+                value = legend_elements.pop(0)
+                if label.layout.x0 > value.layout.x0:
+                    label, value = value, label
+            # Метка без значения на той же строке остаётся полем с пустым значением
             legend.fields.append(TableLegendField(label, value))
+
+
+@dataclass
+class MergedTable:
+    """
+    Логическая таблица, которая может быть разбита на несколько страниц.
+    Хранит только тексты ячеек, а не объекты страниц,
+    поэтому страницы после анализа не удерживаются в памяти.
+    """
+    # Номера страниц, на которых расположены части таблицы
+    page_indices: list[int] = field(default_factory=list)
+    # Координаты x границ колонок на первой странице таблицы
+    col_borders_x: list[float] = field(default_factory=list)
+    # Тексты ячеек: первый индекс - номер строки, второй - номер столбца.
+    # Первая строка - заголовок таблицы.
+    rows: list[list[Optional[str]]] = field(default_factory=list)
+
+    @property
+    def num_rows(self) -> int:
+        return len(self.rows)
+
+    @property
+    def num_cols(self) -> int:
+        return len(self.rows[0]) if self.rows else 0
+
+
+class MultiPageTableAnalyzer:
+    """
+    Анализатор, который принимает страницы по одной, находит на каждой странице
+    все таблицы и склеивает таблицы, продолжающиеся на следующей странице.
+
+    Таблица на новой странице считается продолжением, если она первая на странице,
+    предыдущая таблица была последней на своей странице, и границы колонок у них совпадают.
+    Если первая строка продолжения повторяет заголовок таблицы, она пропускается.
+
+    Таблицы на странице отделяются друг от друга по промежуткам без линий:
+    сначала по вертикали, затем внутри каждой полосы - по горизонтали.
+    """
+
+    def __init__(self, coordinate_tolerance: float = DEFAULT_COORDINATE_TOLERANCE):
+        """
+        :param coordinate_tolerance: Допустимое отклонение координат в пунктах,
+            см. TableReportAnalyzer.
+        """
+        self._coordinate_tolerance = coordinate_tolerance
+        # Последняя таблица с предыдущей страницы, у которой ещё может быть продолжение
+        self._open_table: Optional[MergedTable] = None
+
+    def analyze_pages(self, pages: Iterable[tuple[int, Iterable[LayoutElement]]]) -> Iterator[MergedTable]:
+        """
+        Обрабатывает страницы по одной и возвращает таблицы по мере того,
+        как становится понятно, что у них не будет продолжения.
+        Подходит для обхода документа с помощью BasicPdfParser.iter_pages().
+
+        :param pages: Пары (номер страницы, объекты страницы).
+        """
+        for page_index, page_elements in pages:
+            yield from self.add_page(page_index, page_elements)
+        yield from self.finish()
+
+    def add_page(self, page_index: int, page_elements: Iterable[LayoutElement]) -> list[MergedTable]:
+        """
+        :return: Таблицы, которые завершились до этой страницы или на ней.
+        """
+        completed_tables = []
+        page_tables = self.detect_page_tables(page_elements)
+        for position, table in enumerate(page_tables):
+            open_table = self._open_table
+            if position == 0 and open_table is not None and self._is_continuation(open_table, table):
+                self._append_continuation(open_table, table, page_index)
+                continue
+            if open_table is not None:
+                completed_tables.append(open_table)
+            self._open_table = MergedTable(
+                page_indices=[page_index],
+                col_borders_x=self._get_col_borders_x(table),
+                rows=self._get_cell_texts(table)
+            )
+
+        if not page_tables and self._open_table is not None:
+            # Страница без таблиц прерывает таблицу
+            completed_tables.append(self._open_table)
+            self._open_table = None
+        return completed_tables
+
+    def finish(self) -> list[MergedTable]:
+        """
+        Завершает обработку документа.
+
+        :return: Последняя таблица, если она есть.
+        """
+        open_table, self._open_table = self._open_table, None
+        return [open_table] if open_table is not None else []
+
+    def detect_page_tables(self, page_elements: Iterable[LayoutElement]) -> list[TableReportTable]:
+        """
+        :return: Все таблицы на странице в порядке сверху вниз и слева направо.
+        """
+        all_elements = list(page_elements)
+        lines = [element for element in all_elements if element.tag == "LTLine"]
+        texts = [element for element in all_elements
+                 if "Text" in element.tag and getattr(element, "text", None)]
+        if not lines:
+            return []
+
+        line_bboxes = self._get_bboxes(lines)
+        text_bboxes = self._get_bboxes(texts)
+        tolerance = self._coordinate_tolerance
+        tables = []
+        for band in self._group_overlapping(line_bboxes[:, 1], line_bboxes[:, 3]):
+            for region in self._group_overlapping(line_bboxes[band, 0], line_bboxes[band, 2]):
+                region_indices = band[region]
+                x0, y0 = line_bboxes[region_indices, :2].min(axis=0)
+                x1, y1 = line_bboxes[region_indices, 2:].max(axis=0)
+                is_inside = ((text_bboxes[:, 0] >= x0 - tolerance) & (text_bboxes[:, 2] <= x1 + tolerance) &
+                             (text_bboxes[:, 1] >= y0 - tolerance) & (text_bboxes[:, 3] <= y1 + tolerance))
+
+                # Область содержит только одну таблицу, справочных сведений в ней нет
+                analyzer = TableReportAnalyzer(coordinate_tolerance=tolerance, detect_legend=False)
+                analyzer.analyze([*(lines[i] for i in region_indices),
+                                  *(texts[i] for i in np.flatnonzero(is_inside))])
+                tables.append(analyzer.page_object.table)
+
+        tables.sort(key=lambda table: (-table.table_rect[3], table.table_rect[0]))
+        return tables
+
+    @staticmethod
+    def _get_bboxes(elements: list[LayoutElement]) -> np.ndarray:
+        return np.array([(element.layout.x0, element.layout.y0, element.layout.x1, element.layout.y1)
+                         for element in elements], dtype=float).reshape(-1, 4)
+
+    def _group_overlapping(self, lows: np.ndarray, highs: np.ndarray) -> list[np.ndarray]:
+        """
+        Делит отрезки на группы, между которыми есть промежуток больше допустимого отклонения.
+
+        :return: Номера отрезков каждой группы.
+        """
+        order = np.argsort(lows, kind="stable")
+        reach = np.maximum.accumulate(highs[order])
+        is_group_start = np.empty(len(order), dtype=bool)
+        is_group_start[:1] = True
+        np.greater(lows[order][1:], reach[:-1] + self._coordinate_tolerance, out=is_group_start[1:])
+        return np.split(order, np.flatnonzero(is_group_start)[1:])
+
+    @staticmethod
+    def _get_col_borders_x(table: TableReportTable) -> list[float]:
+        return [table.table_rect[0], *sorted(table.vertical_lines_by_x.keys()), table.table_rect[2]]
+
+    @staticmethod
+    def _get_cell_texts(table: TableReportTable) -> list[list[Optional[str]]]:
+        return [[None if element is None else element.text.strip() for element in row]
+                for row in table.cells]
+
+    def _is_continuation(self, merged_table: MergedTable, table: TableReportTable) -> bool:
+        col_borders_x = self._get_col_borders_x(table)
+        return len(col_borders_x) == len(merged_table.col_borders_x) and all(
+            abs(x - merged_x) <= self._coordinate_tolerance
+            for x, merged_x in zip(col_borders_x, merged_table.col_borders_x)
+        )
+
+    def _append_continuation(self, merged_table: MergedTable, table: TableReportTable, page_index: int) -> None:
+        rows = self._get_cell_texts(table)
+        if rows and merged_table.rows and rows[0] == merged_table.rows[0]:
+            # Повторённый заголовок таблицы
+            rows = rows[1:]
+        merged_table.rows.extend(rows)
+        if merged_table.page_indices[-1] != page_index:
+            merged_table.page_indices.append(page_index)
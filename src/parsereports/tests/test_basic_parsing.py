@@ -0,0 +1,276 @@
+"""
+Тесты для обёртки BasicPdfParser.
+Для работы тестов необходимо заранее создать файл table_report.pdf,
+запустив скрипт makereports/tablereport.py.
+"""
+
+import os
+import pickle
+import random
+import tracemalloc
+
+import pytest
+from reportlab.lib.pagesizes import A4, landscape
+
+import pdf_storage
+from makereports.tablereport import TableReportDataGenerator, TableReportRenderer
+from parsereports.adaptiveparams import AdaptiveParams
+from parsereports.basicparsing import FAST_PARAMS, BasicPdfParser, open_pdf_file
+from parsereports.elementfilter import ElementFilter
+from parsereports.layoutcache import LayoutCache
+from parsereports.profiling import ParseProfiler
+from parsereports.tablereport_analysis import TableReportAnalyzer
+
+INPUT_FILE_PATH = pdf_storage.table_report_file_path
+
+
+def _describe_elements(parser: BasicPdfParser, page_index: int) -> list[tuple]:
+    return [(element.tag, element.layout.bbox, element.text)
+            for element in parser.get_all_page_elements(page_index)]
+
+
+def test_lazy_mode_gives_same_elements():
+    full_parser = BasicPdfParser(INPUT_FILE_PATH)
+    lazy_parser = BasicPdfParser(INPUT_FILE_PATH, lazy=True)
+    try:
+        assert len(lazy_parser.pq.pq("LTPage")) == 0, \
+            "В ленивом режиме страницы не должны загружаться при открытии"
+        assert _describe_elements(lazy_parser, 0) == _describe_elements(full_parser, 0)
+        assert len(lazy_parser.pq.pq("LTPage")) == 1
+    finally:
+        full_parser.close()
+        lazy_parser.close()
+
+
+def test_lazy_mode_missing_page():
+    parser = BasicPdfParser(INPUT_FILE_PATH, lazy=True)
+    try:
+        with pytest.raises(IndexError):
+            parser.load_pages(1000)
+    finally:
+        parser.close()
+
+
+def test_layout_cache_gives_same_elements(tmp_path, monkeypatch):
+    cache = LayoutCache(str(tmp_path))
+    reference_parser = BasicPdfParser(INPUT_FILE_PATH)
+    first_parser = BasicPdfParser(INPUT_FILE_PATH, layout_cache=cache)
+    cached_parser = BasicPdfParser(INPUT_FILE_PATH, layout_cache=cache)
+    try:
+        expected = _describe_elements(reference_parser, 0)
+        assert _describe_elements(first_parser, 0) == expected
+        assert len(list(tmp_path.glob("*.layout"))) == 1
+        assert (cache.hits, cache.misses) == (0, 1)
+
+        # Страница из кэша не должна разбираться заново
+        monkeypatch.setattr(BasicPdfParser, "_parse_page_element",
+                            lambda *args: pytest.fail("Страница из кэша разбирается заново"))
+        assert _describe_elements(cached_parser, 0) == expected
+        assert (cache.hits, cache.misses) == (1, 1)
+    finally:
+        reference_parser.close()
+        first_parser.close()
+        cached_parser.close()
+
+
+def test_layout_cache_eviction(tmp_path):
+    cache = LayoutCache(str(tmp_path), max_size_bytes=0)
+    parser = BasicPdfParser(INPUT_FILE_PATH, lazy=True, layout_cache=cache)
+    try:
+        parser.load_pages(0)
+    finally:
+        parser.close()
+    assert not list(tmp_path.glob("*.layout"))
+
+
+def test_layout_cache_scans_directory_only_when_full(tmp_path):
+    parser = BasicPdfParser(INPUT_FILE_PATH)
+    try:
+        parser.load_pages(0)
+        page_element = parser.pq.pq("LTPage")[0]
+        cache = LayoutCache(str(tmp_path))
+        num_evictions = 0
+        original_evict = cache.evict
+
+        def _counting_evict():
+            nonlocal num_evictions
+            num_evictions += 1
+            original_evict()
+
+        cache.evict = _counting_evict
+        for page_index in range(20):
+            cache.put_page("document", page_index, page_element)
+        assert num_evictions == 1, "Каталог должен просматриваться только при первой записи"
+
+        # Записи вытесняются с запасом, а не по одной после каждой новой записи
+        entry_size = next(tmp_path.glob("*.layout")).stat().st_size
+        small_cache = LayoutCache(str(tmp_path), max_size_bytes=entry_size * 10)
+        small_cache.put_page("document", 20, page_element)
+        assert len(list(tmp_path.glob("*.layout"))) == 9
+    finally:
+        parser.close()
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Права доступа задаются битами режима только в POSIX")
+def test_layout_cache_rejects_shared_dir(tmp_path):
+    cache_dir = tmp_path / "shared"
+    cache_dir.mkdir()
+    os.chmod(cache_dir, 0o777)
+    with pytest.raises(PermissionError):
+        LayoutCache(str(cache_dir))
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Права доступа задаются битами режима только в POSIX")
+def test_layout_cache_ignores_writable_entries(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    cache = LayoutCache(str(cache_dir))
+    with BasicPdfParser(INPUT_FILE_PATH, layout_cache=cache) as parser:
+        parser.load_pages(0)
+    entry_path = next(cache_dir.glob("*.layout"))
+    assert entry_path.stat().st_mode & 0o777 == 0o600
+    os.chmod(entry_path, 0o666)
+
+    monkeypatch.setattr(pickle, "loads", lambda *args: pytest.fail("Чужая запись не должна читаться"))
+    document_key = entry_path.name.rsplit("_", 1)[0]
+    assert cache.get_page(document_key, 0, []) is None
+    assert cache.misses == 2
+    assert not entry_path.exists()
+
+
+def test_iter_pages_gives_same_elements():
+    parser = BasicPdfParser(INPUT_FILE_PATH)
+    try:
+        pages = [(page_index, [(element.tag, element.layout.bbox, element.text) for element in elements])
+                 for page_index, elements in parser.iter_pages()]
+        assert pages == [(0, _describe_elements(parser, 0))]
+    finally:
+        parser.close()
+
+
+def test_iter_pages_memory_does_not_grow(tmp_path):
+    file_path = str(tmp_path / "multi_page.pdf")
+    random.seed(0)
+    data_generator = TableReportDataGenerator()
+    data_generator.create_random_data(num_cols=3, num_rows=26 * 8)
+    TableReportRenderer(data_generator.data, file_path, landscape(A4), paginate=True).render_and_save()
+
+    page_indices, memory_sizes = [], []
+    tracemalloc.start()
+    try:
+        for page_index, page_elements in BasicPdfParser(file_path, FAST_PARAMS).iter_pages():
+            assert len(page_elements) > 0
+            page_indices.append(page_index)
+            del page_elements
+            memory_sizes.append(tracemalloc.get_traced_memory()[0])
+    finally:
+        tracemalloc.stop()
+    assert page_indices == list(range(8))
+    # Объекты одной такой страницы занимают около 1,5 МБ. Если бы страницы накапливались,
+    # то к последней странице память выросла бы на несколько МБ
+    assert max(memory_sizes[1:]) - memory_sizes[0] < 1_000_000
+
+
+def test_mmap_mode_and_context_manager():
+    reference_parser = BasicPdfParser(INPUT_FILE_PATH)
+    try:
+        expected = _describe_elements(reference_parser, 0)
+    finally:
+        reference_parser.close()
+
+    with BasicPdfParser(INPUT_FILE_PATH, use_mmap=True) as parser:
+        assert _describe_elements(parser, 0) == expected
+    assert parser.pq.file.closed
+
+
+def test_mmap_mode_reads_empty_file(tmp_path):
+    file_path = tmp_path / "empty.pdf"
+    file_path.write_bytes(b"")
+    with open_pdf_file(str(file_path), use_mmap=True) as pdf_file:
+        assert pdf_file.read() == b""
+
+
+def test_element_filter_by_tags():
+    with BasicPdfParser(INPUT_FILE_PATH) as reference_parser:
+        expected = [description for description in _describe_elements(reference_parser, 0)
+                    if description[0] == "LTLine"]
+
+    with BasicPdfParser(INPUT_FILE_PATH, element_filter=ElementFilter.create(tags=["LTLine"])) as parser:
+        assert _describe_elements(parser, 0) == expected
+
+
+def test_element_filter_by_bbox():
+    with BasicPdfParser(INPUT_FILE_PATH) as reference_parser:
+        text_box = reference_parser.pq.pq("LTPage[page_index=\"0\"] LTTextBoxHorizontal")[0]
+        expected_text = text_box.text
+
+    element_filter = ElementFilter.create(bbox=text_box.layout.bbox, tags=["LTTextBoxHorizontal"])
+    with BasicPdfParser(INPUT_FILE_PATH, element_filter=element_filter) as parser:
+        elements = parser.get_all_page_elements(0)
+        assert [element.text for element in elements if element.tag == "LTTextBoxHorizontal"] == [expected_text]
+        assert all(element.tag.startswith("LTText") or element.tag in ("LTChar", "LTAnno")
+                   for element in elements)
+
+
+def test_adaptive_params_keep_requested_elements():
+    with BasicPdfParser(INPUT_FILE_PATH) as reference_parser:
+        expected = sorted(description for description in _describe_elements(reference_parser, 0)
+                          if description[0] == "LTLine")
+
+    # Без текстовых объектов анализ разметки не нужен совсем
+    adaptive_params = AdaptiveParams.create(element_tags=["LTLine"])
+    with BasicPdfParser(INPUT_FILE_PATH, adaptive_params=adaptive_params) as parser:
+        lines = sorted(description for description in _describe_elements(parser, 0)
+                       if description[0] == "LTLine")
+        assert lines == expected
+        assert parser.page_params[0].laparams is None
+
+    # Табличный отчёт плотный, поэтому пересортировка и группировка блоков текста отключаются
+    adaptive_params = AdaptiveParams.create(element_tags=["LTTextLineHorizontal", "LTLine"])
+    with BasicPdfParser(INPUT_FILE_PATH, adaptive_params=adaptive_params) as parser:
+        parser.load_pages(0)
+        page_params = parser.page_params[0]
+        assert page_params.dense and not page_params.resort
+        assert page_params.laparams.boxes_flow is None and not page_params.laparams.detect_vertical
+
+
+def test_page_index_matches_queries():
+    with BasicPdfParser(INPUT_FILE_PATH, index_grid_size=72) as parser:
+        page_query = "LTPage[page_index=\"0\"] "
+        assert parser.find_elements(0, "LTLine") == list(parser.pq.pq(page_query + "LTLine"))
+        assert parser.find_elements(0, "LTLine", "LTTextLineHorizontal") == \
+            list(parser.pq.pq(f"{page_query}LTLine, {page_query}LTTextLineHorizontal"))
+
+        selector = "LTTextLineHorizontal:in_bbox(\"0,0,400,300\")"
+        expected = list(parser.pq.pq(page_query + selector))
+        assert expected
+        assert parser.query(0, selector) == expected
+        # Повторный запрос берётся из индекса
+        assert parser.query(0, selector) == expected
+
+        page_index = parser.get_page_index(0)
+        assert page_index.find_in_bbox((0, 0, 400, 300), "LTTextLineHorizontal") == expected
+        assert page_index.find_overlapping((100, 100, 200, 200), "LTLine") == \
+            list(parser.pq.pq(page_query + "LTLine:overlaps_bbox(\"100,100,200,200\")"))
+
+
+def test_profiler_records_stages():
+    received_records = []
+    profiler = ParseProfiler(callbacks=[received_records.append])
+    with BasicPdfParser(INPUT_FILE_PATH) as reference_parser:
+        expected = _describe_elements(reference_parser, 0)
+    with BasicPdfParser(INPUT_FILE_PATH, profiler=profiler) as parser:
+        assert _describe_elements(parser, 0) == expected
+        page_elements = parser.get_all_page_elements(0)
+    TableReportAnalyzer(profiler=profiler).analyze(page_elements)
+    # Замер памяти сильно замедляет работу, поэтому проверяем его только на анализе страницы
+    allocations_profiler = ParseProfiler(trace_allocations=True)
+    TableReportAnalyzer(profiler=allocations_profiler).analyze(page_elements)
+
+    report = profiler.report()
+    assert {"open", "interpret", "layout", "tree", "clean_text", "query", "analyze.cells"} <= \
+        set(report["stages"])
+    assert set(report["pages"]) == {0}
+    assert report["stages"]["query"]["num_elements"] == 2 * len(expected)
+    assert allocations_profiler.report()["stages"]["analyze.cells"]["allocated_bytes"] > 0
+    assert not tracemalloc.is_tracing()
+    assert received_records == profiler.records
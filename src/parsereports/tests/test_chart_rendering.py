@@ -0,0 +1,55 @@
+"""
+Тесты для прореживания точек графиков в отчёте с графиками.
+Отчёты создаются во временной папке, заранее создавать файлы не нужно.
+"""
+
+import numpy as np
+import pytest
+from reportlab.lib.pagesizes import A4, portrait
+
+from makereports.chartsreport import ChartReportData, ChartsReportRenderer, LineChartData, decimate_line_points
+from parsereports.rawparsing import RawPdfParser
+
+
+def _noisy_points(num_points: int) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 1000, num_points)
+    y = np.sin(x / 50) * 40 + 50 + rng.normal(0, 5, num_points)
+    return np.column_stack((x, y))
+
+
+def test_decimation_keeps_column_extremes():
+    points = _noisy_points(100_000)
+    columns_per_pt = 0.5
+    decimated = decimate_line_points(points, columns_per_pt)
+    assert len(decimated) <= 4 * (1000 * columns_per_pt + 1)
+    assert decimated[0].tolist() == points[0].tolist()
+    assert decimated[-1].tolist() == points[-1].tolist()
+
+    columns = np.floor(points[:, 0] * columns_per_pt)
+    decimated_columns = np.floor(decimated[:, 0] * columns_per_pt)
+    for column in (0, 123, 500):
+        column_y = points[columns == column, 1]
+        decimated_y = decimated[decimated_columns == column, 1]
+        assert (decimated_y.min(), decimated_y.max()) == (column_y.min(), column_y.max())
+
+
+def test_decimation_skips_unsorted_points():
+    points = np.array([(0.0, 0.0), (2.0, 1.0), (1.0, 2.0), (3.0, 3.0)] * 10)
+    assert decimate_line_points(points, 0.1) is points
+
+
+def test_decimated_chart_has_same_bbox(tmp_path):
+    points = _noisy_points(20_000)
+    chart = LineChartData(title="Noise", line_points=[tuple(point) for point in points.tolist()])
+    curves = []
+    for decimation_dpi in (None, 300):
+        file_path = str(tmp_path / f"chart_{decimation_dpi}.pdf")
+        ChartsReportRenderer(ChartReportData(charts=[chart]), file_path, portrait(A4),
+                             decimation_dpi=decimation_dpi).render_and_save()
+        with RawPdfParser(file_path) as parser:
+            curves.append(max(parser.find_elements(0, "LTCurve"), key=lambda element: len(element.layout.pts)))
+
+    full_curve, decimated_curve = curves
+    assert len(decimated_curve.layout.pts) < len(full_curve.layout.pts) / 2
+    assert decimated_curve.layout.bbox == pytest.approx(full_curve.layout.bbox)
@@ -0,0 +1,95 @@
+"""
+Тесты для чтения потоков данных страниц.
+Для работы тестов необходимо заранее создать файл table_report.pdf,
+запустив скрипт makereports/tablereport.py.
+"""
+
+import zlib
+
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFContentParser
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import PDFStream
+from pdfminer.psparser import LIT, PSKeyword, PSEOF
+from reportlab.pdfgen.canvas import Canvas
+
+import pdf_storage
+from parsereports.contentstream import get_page_streams, iter_content_operations, iter_operations, \
+    iter_page_stats, iter_stream_chunks
+
+INPUT_FILE_PATH = pdf_storage.table_report_file_path
+
+CONTENT_SAMPLE = (b"q 1 0 0 1 .5 -2 cm BT /F1 12 Tf (a\\(b\\) \\101) Tj <41 42> Tj [(x) -3.5 (y)] TJ ET "
+                  b"% comment\n/GS#201 gs BI /W 2 /H 1 /BPC 8 /CS /G ID \x00\xff EI "
+                  b"/Tag <</MCID 3>> BDC EMC Q")
+
+
+def test_iter_operations_with_any_chunks():
+    expected = [
+        ("q", []), ("cm", [1, 0, 0, 1, 0.5, -2]), ("BT", []), ("Tf", [LIT("F1"), 12]),
+        ("Tj", [b"a(b) A"]), ("Tj", [b"AB"]), ("TJ", [[b"x", -3.5, b"y"]]), ("ET", []),
+        ("gs", [LIT("GS 1")]), ("BI", [{"W": 2, "H": 1, "BPC": 8, "CS": LIT("G")}, b"\x00\xff"]),
+        ("BDC", [LIT("Tag"), {"MCID": 3}]), ("EMC", []), ("Q", []),
+    ]
+    assert list(iter_operations([CONTENT_SAMPLE])) == expected
+    for chunk_size in (1, 2, 3, 7):
+        chunks = [CONTENT_SAMPLE[i:i + chunk_size] for i in range(0, len(CONTENT_SAMPLE), chunk_size)]
+        assert list(iter_operations(chunks)) == expected
+
+
+def test_iter_stream_chunks_decodes_flate_incrementally():
+    data = b"10 20 m 30 40 l S\n" * 1000
+    stream = PDFStream({"Filter": LIT("FlateDecode")}, zlib.compress(data))
+    chunks = list(iter_stream_chunks(stream, chunk_size=100))
+    assert max(map(len, chunks)) <= 100
+    assert b"".join(chunks) == data
+
+
+def test_operators_match_pdfminer():
+    with open(INPUT_FILE_PATH, "rb") as f:
+        doc = PDFDocument(PDFParser(f))
+        page = next(PDFPage.create_pages(doc))
+        content_parser = PDFContentParser(get_page_streams(page))
+        expected = []
+        while True:
+            try:
+                _, obj = content_parser.nextobject()
+            except PSEOF:
+                break
+            if isinstance(obj, PSKeyword):
+                expected.append(obj.name.decode() if isinstance(obj.name, bytes) else obj.name)
+
+        operators = [operator for operator, _ in
+                     iter_content_operations(get_page_streams(page), page.resources, chunk_size=64)]
+    assert operators == expected
+
+
+def test_page_stats_follow_forms_and_contents_arrays(tmp_path):
+    pdf_file_path = str(tmp_path / "forms.pdf")
+    canvas = Canvas(pdf_file_path, pageCompression=1)
+    canvas.beginForm("grid")
+    for i in range(10):
+        canvas.line(0, i, 100, i)
+    canvas.endForm()
+    canvas.doForm("grid")
+    canvas.doForm("grid")
+    # Изображение тоже выводится оператором Do, но рисунком не считается
+    canvas.drawImage(str(pdf_storage.PDF_STORAGE_PATH / "little_lamb.png"), 200, 200)
+    canvas.showPage()
+    canvas.save()
+
+    with open(pdf_file_path, "rb") as f:
+        doc = PDFDocument(PDFParser(f))
+        stats = next(iter_page_stats(doc))
+        # Поток данных страницы, разделённый на две части по границе токенов
+        page = next(PDFPage.create_pages(doc))
+        data = b"".join(iter_stream_chunks(get_page_streams(page)[0]))
+        split_position = data.index(b" Do") + 3
+        split_streams = [PDFStream({}, data[:split_position]), PDFStream({}, data[split_position:])]
+        split_operators = [operator for operator, _ in iter_content_operations(split_streams, page.resources)]
+
+    assert stats.num_forms == 2
+    assert stats.num_images == 1
+    assert stats.operator_counts["l"] == 20
+    assert split_operators.count("l") == 20
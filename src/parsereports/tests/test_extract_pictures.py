@@ -0,0 +1,151 @@
+"""
+Тесты для пакетного извлечения изображений.
+Документ с изображениями разных форматов создаётся в самих тестах.
+"""
+
+from PIL import Image
+from pdfminer.pdftypes import PDFStream
+from pdfminer.psparser import LIT
+from reportlab.pdfgen.canvas import Canvas
+
+from parsereports.extract_all_pictures import ImageSpec, decode_image, extract_images, make_image_spec, save_image
+
+
+def _create_images(tmp_path) -> dict[str, str]:
+    gradient = Image.linear_gradient("L").resize((64, 32))
+    images = {
+        "rgb": Image.merge("RGB", (gradient, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT), gradient)),
+        "gray": gradient,
+        "palette": gradient.convert("RGB").quantize(16),
+    }
+    paths = {}
+    for name, image in images.items():
+        paths[name] = str(tmp_path / f"{name}.png")
+        image.save(paths[name])
+    paths["jpeg"] = str(tmp_path / "photo.jpg")
+    images["rgb"].save(paths["jpeg"], quality=90)
+    return paths
+
+
+def _create_pdf(tmp_path, image_paths: dict[str, str]) -> str:
+    pdf_file_path = str(tmp_path / "images.pdf")
+    canvas = Canvas(pdf_file_path)
+    # Рисунок (Form XObject) с вложенным изображением
+    canvas.beginForm("nested")
+    canvas.drawImage(image_paths["palette"], 300, 300)
+    canvas.endForm()
+    for x, name in enumerate(("rgb", "gray", "jpeg")):
+        canvas.drawImage(image_paths[name], 100 * x, 100)
+    canvas.doForm("nested")
+    canvas.showPage()
+    # Те же изображения на второй странице не должны сохраняться повторно
+    canvas.drawImage(image_paths["rgb"], 100, 100)
+    canvas.doForm("nested")
+    canvas.showPage()
+    canvas.save()
+    return pdf_file_path
+
+
+def test_extract_all_images(tmp_path):
+    image_paths = _create_images(tmp_path)
+    pdf_file_path = _create_pdf(tmp_path, image_paths)
+    output_dir = tmp_path / "output"
+
+    sequential = list(extract_images(pdf_file_path, str(output_dir / "sequential"), max_workers=1))
+    parallel = list(extract_images(pdf_file_path, str(output_dir / "parallel"), max_workers=4))
+
+    assert all(result.ok for result in sequential), [result.error for result in sequential]
+    assert [(result.page_index, result.name) for result in parallel] == \
+           [(result.page_index, result.name) for result in sequential]
+    assert len(sequential) == 4, "Общие изображения должны сохраняться один раз"
+
+    extensions = sorted(result.file_path.rsplit(".", 1)[1] for result in sequential)
+    assert extensions == ["jpg", "png", "png", "png"]
+    jpeg_result = next(result for result in sequential if result.file_path.endswith(".jpg"))
+    assert open(jpeg_result.file_path, "rb").read() == open(image_paths["jpeg"], "rb").read(), \
+        "JPEG должен сохраняться без перекодирования"
+
+    for result in sequential:
+        with Image.open(result.file_path) as image:
+            assert image.size == (64, 32)
+
+
+def _make_spec(color_space, bits: int, data: bytes, **attrs) -> ImageSpec:
+    stream = PDFStream({"Width": 4, "Height": 2, "BitsPerComponent": bits, "ColorSpace": color_space,
+                        "Subtype": LIT("Image"), **attrs}, data)
+    return make_image_spec(0, "Im1", None, stream, {})
+
+
+def test_decode_image_formats():
+    indexed = _make_spec([LIT("Indexed"), LIT("DeviceRGB"), 1, b"\xff\x00\x00\x00\x00\xff"], 1, b"\x50\xa0")
+    assert decode_image(indexed).convert("RGB").tobytes()[:12] == b"\xff\x00\x00\x00\x00\xff" * 2
+
+    bilevel = _make_spec(LIT("DeviceGray"), 1, b"\xf0\x0f")
+    assert decode_image(bilevel).convert("L").tobytes() == b"\xff" * 4 + b"\x00" * 4
+
+    inverted_mask = _make_spec(None, 1, b"\xf0\x0f", ImageMask=True, Decode=[1, 0])
+    assert decode_image(inverted_mask).convert("L").tobytes() == b"\x00" * 4 + b"\xff" * 4
+
+    cmyk = _make_spec(LIT("DeviceCMYK"), 8, b"\x00\x00\x00\x00" * 4 + b"\x00\x00\x00\xff" * 4)
+    assert decode_image(cmyk).tobytes() == b"\xff" * 12 + b"\x00" * 12
+
+
+def test_passthrough_images_skip_color_space(tmp_path):
+    jpx_without_color_space = _make_spec(None, 8, b"jp2 data", Filter=LIT("JPXDecode"))
+    dct_in_separation = _make_spec([LIT("Separation"), LIT("Spot"), LIT("DeviceCMYK"), {}], 8, b"jpeg data",
+                                   Filter=LIT("DCTDecode"))
+    for spec, extension in ((jpx_without_color_space, ".jp2"), (dct_in_separation, ".jpg")):
+        expected_data = spec.stream.get_data()
+        result = save_image(spec, str(tmp_path))
+        assert result.ok, result.error
+        assert result.file_path.endswith(extension)
+        assert open(result.file_path, "rb").read() == expected_data
+
+
+def _create_raw_pdf(pdf_file_path: str, images: dict[str, tuple[str, bytes]]) -> None:
+    """
+    Создаёт документ с одной страницей и изображениями 2x1 с заданными
+    цветовыми пространствами (в синтаксисе PDF) и данными.
+    """
+    names = list(images)
+    image_refs = " ".join(f"/{name} {4 + i} 0 R" for i, name in enumerate(names))
+    content = "".join(f"q 10 0 0 10 {20 * i} 0 cm /{name} Do Q " for i, name in enumerate(names)).encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 200 200] /Contents {4 + len(names)} 0 R "
+        f"/Resources << /XObject << {image_refs} >> >> >>".encode(),
+    ]
+    for color_space, data in images.values():
+        objects.append(f"<< /Type /XObject /Subtype /Image /Width 2 /Height 1 /BitsPerComponent 8 "
+                       f"/ColorSpace {color_space} /Length {len(data)} >>\nstream\n".encode()
+                       + data + b"\nendstream")
+    objects.append(f"<< /Length {len(content)} >>\nstream\n".encode() + content + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + obj + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    output += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    with open(pdf_file_path, "wb") as f:
+        f.write(output)
+
+
+def test_unsupported_color_space_does_not_stop_extraction(tmp_path):
+    pdf_file_path = str(tmp_path / "color_spaces.pdf")
+    _create_raw_pdf(pdf_file_path, {
+        "Lab": ("[/Lab << /WhitePoint [0.9505 1 1.089] >>]", b"\x00" * 6),
+        "Gray": ("/DeviceGray", b"\x00\xff"),
+        "ICC": ("[/ICCBased << /Length 0 >>]", b"\x00\xff"),
+    })
+
+    results = {result.name: result for result in extract_images(pdf_file_path, str(tmp_path / "output"),
+                                                                  max_workers=1)}
+    assert list(results) == ["Lab", "Gray", "ICC"]
+    assert results["Gray"].ok, results["Gray"].error
+    assert "Lab" in results["Lab"].error
+    assert "ValueError" in results["ICC"].error
@@ -0,0 +1,100 @@
+"""
+Тесты для кэша шрифтов отчётов.
+Для работы тестов должен быть установлен шрифт LiberationSans, см. makereports/fontstyles.py.
+"""
+
+import os
+import shutil
+
+import pytest
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+
+from makereports import fontstyles
+from makereports.fontstyles import FONT_BOLD, FONT_REGULAR, find_font_files, load_font, register_fonts, \
+    string_width
+
+
+@pytest.fixture
+def font_file(tmp_path, monkeypatch) -> str:
+    # Копия файла шрифта, чтобы менять время изменения, и пустой кэш шрифтов в памяти процесса
+    file_path = str(tmp_path / "font.ttf")
+    shutil.copyfile(find_font_files()[FONT_REGULAR], file_path)
+    monkeypatch.setattr(fontstyles, "_loaded_fonts", {})
+    return file_path
+
+
+def _count_parsing(monkeypatch) -> list[str]:
+    parsed_file_paths = []
+
+    class _CountingTTFont(TTFont):
+        def __init__(self, name: str, file_path: str):
+            parsed_file_paths.append(file_path)
+            TTFont.__init__(self, name, file_path)
+
+    monkeypatch.setattr(fontstyles, "TTFont", _CountingTTFont)
+    return parsed_file_paths
+
+
+def test_font_cache_hit(tmp_path, font_file, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    parsed_font = load_font("CachedFont", font_file, cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    assert os.stat(cache_dir).st_mode & 0o777 == 0o700
+
+    monkeypatch.setattr(fontstyles, "_loaded_fonts", {})
+    parsed_file_paths = _count_parsing(monkeypatch)
+    cached_font = load_font("CachedFont", font_file, cache_dir)
+    assert not parsed_file_paths, "Шрифт из кэша не должен разбираться заново"
+    assert cached_font is not parsed_font
+    assert cached_font.face.charWidths == parsed_font.face.charWidths
+
+
+def test_font_cache_invalidated_by_mtime(tmp_path, font_file, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    load_font("CachedFont", font_file, cache_dir)
+    file_stat = os.stat(font_file)
+    os.utime(font_file, ns=(file_stat.st_atime_ns, file_stat.st_mtime_ns + 10 ** 9))
+
+    monkeypatch.setattr(fontstyles, "_loaded_fonts", {})
+    parsed_file_paths = _count_parsing(monkeypatch)
+    load_font("CachedFont", font_file, cache_dir)
+    assert parsed_file_paths == [font_file]
+    assert len(os.listdir(cache_dir)) == 2
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Права доступа задаются битами режима только в POSIX")
+def test_font_cache_rejects_shared_dir(tmp_path, font_file):
+    cache_dir = tmp_path / "shared"
+    cache_dir.mkdir()
+    os.chmod(cache_dir, 0o777)
+    with pytest.raises(PermissionError):
+        load_font("CachedFont", font_file, str(cache_dir))
+
+
+@pytest.mark.skipif(os.name == "nt", reason="Права доступа задаются битами режима только в POSIX")
+def test_font_cache_ignores_writable_entries(tmp_path, font_file, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    load_font("CachedFont", font_file, cache_dir)
+    entry_path = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    os.chmod(entry_path, 0o666)
+
+    monkeypatch.setattr(fontstyles, "_loaded_fonts", {})
+    load_font("CachedFont", font_file, cache_dir)
+    assert os.stat(entry_path).st_mode & 0o777 != 0o666, "Запись должна быть создана заново"
+
+
+def test_register_fonts_fills_later_cache_dir(tmp_path):
+    register_fonts()
+    cache_dir = str(tmp_path / "cache")
+    register_fonts(cache_dir)
+    assert len(os.listdir(cache_dir)) == len(find_font_files())
+
+
+@pytest.mark.parametrize("text", ["", "Дата", "-123.45", "Ф.И.О. пациента"])
+@pytest.mark.parametrize("font_name", [FONT_REGULAR, FONT_BOLD])
+def test_string_width_matches_pdfmetrics(text, font_name):
+    register_fonts()
+    assert string_width(text, font_name, 10) == pdfmetrics.stringWidth(text, font_name, 10)
+    # Повторный вызов берётся из кэша и даёт то же значение
+    assert string_width(text, font_name, 10) == pdfmetrics.stringWidth(text, font_name, 10)
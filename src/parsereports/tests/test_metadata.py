@@ -0,0 +1,53 @@
+"""
+Тесты для чтения метаданных.
+Для работы тестов необходимо заранее создать файл table_report.pdf,
+запустив скрипт makereports/tablereport.py.
+"""
+
+import shutil
+
+import pdf_storage
+from parsereports.extract_metadata import iter_metadata, parse_xmp_fields, read_metadata
+
+INPUT_FILE_PATH = pdf_storage.table_report_file_path
+
+XMP_SAMPLE = b"""<?xpacket begin="" id="W5M0MpCehiHzreSzNTczkc9d"?>
+<x:xmpmeta xmlns:x="adobe:ns:meta/">
+  <rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#">
+    <rdf:Description rdf:about="" xmlns:pdf="http://ns.adobe.com/pdf/1.3/" pdf:Producer="Test producer"/>
+    <rdf:Description rdf:about="" xmlns:dc="http://purl.org/dc/elements/1.1/"
+        xmlns:xmp="http://ns.adobe.com/xap/1.0/">
+      <dc:title><rdf:Alt><rdf:li xml:lang="x-default">Report</rdf:li></rdf:Alt></dc:title>
+      <dc:creator><rdf:Seq><rdf:li>First</rdf:li><rdf:li>Second</rdf:li></rdf:Seq></dc:creator>
+      <xmp:CreateDate>2024-01-02T03:04:05Z</xmp:CreateDate>
+    </rdf:Description>
+  </rdf:RDF>
+</x:xmpmeta>
+<?xpacket end="w"?>"""
+
+
+def test_read_metadata():
+    metadata = read_metadata(INPUT_FILE_PATH)
+    assert metadata.ok, metadata.error
+    assert metadata.num_pages == 1
+    assert metadata.pdf_version is not None and metadata.pdf_version.startswith("1.")
+    assert "ReportLab" in metadata.info["Producer"]
+    assert not metadata.encrypted
+
+
+def test_parse_xmp_fields():
+    assert parse_xmp_fields(XMP_SAMPLE) == {
+        "pdf:Producer": "Test producer",
+        "dc:title": "Report",
+        "dc:creator": "First; Second",
+        "xmp:CreateDate": "2024-01-02T03:04:05Z",
+    }
+
+
+def test_iter_metadata(tmp_path):
+    shutil.copy(INPUT_FILE_PATH, tmp_path / "a_report.pdf")
+    (tmp_path / "b_broken.pdf").write_bytes(b"not a pdf")
+
+    results = list(iter_metadata(tmp_path, max_workers=2, chunksize=1))
+    assert [result.ok for result in results] == [True, False]
+    assert results[0].info == read_metadata(INPUT_FILE_PATH).info
@@ -5,14 +5,27 @@
 Чтобы выполнить тесты, достаточно запустить команду pytest в папке проекта.
 """
 
+import random
+from collections import defaultdict
 from itertools import chain
-from typing import Generator
+from types import SimpleNamespace
+from typing import Generator, Iterator
 
 import pytest
+from pdfminer.pdfpage import PDFPage
+from reportlab.lib.pagesizes import A4, landscape
 
 import pdf_storage
+from makereports.bulkrender import generate_random_reports, iter_render_results
+from makereports.tablereport import TableData, TableReportDataGenerator, TableReportRenderer
+from parsereports.adaptiveparams import AdaptiveParams
 from parsereports.basicparsing import BasicPdfParser
-from parsereports.tablereport_analysis import TableReportAnalyzer, TableReportPage
+from parsereports.batch_validation import iter_batch_results
+from parsereports.operatorparsing import OperatorPdfParser
+from parsereports.rawparsing import RawPdfParser
+from parsereports.tablereport_analysis import (
+    DEFAULT_COORDINATE_TOLERANCE, MultiPageTableAnalyzer, TableReportAnalyzer, TableReportPage
+)
 
 INPUT_FILE_PATH = pdf_storage.table_report_file_path
 
@@ -40,3 +53,327 @@ def test_table_cells_are_not_empty(table_page):
         "Заголовки колонок должны быть заполнены"
     assert all((element is not None) for element in chain(*cells[1:])), \
         "Все ячейки в строках с данными должны быть заполнены"
+
+
+def test_batch_validation_of_table_report():
+    results = list(iter_batch_results([INPUT_FILE_PATH, INPUT_FILE_PATH], max_workers=2))
+    assert [result.file_path for result in results] == [INPUT_FILE_PATH, INPUT_FILE_PATH]
+    for result in results:
+        assert result.ok, result.error
+        assert (result.num_rows, result.num_cols) == (25, 9)
+        assert result.legend_labels == ["Дата", "Ф.И.О. пациента", "Возраст", "Ф.И.О. врача"]
+
+
+def test_bulk_rendered_reports_are_valid(tmp_path):
+    render_results = list(iter_render_results(generate_random_reports(5), str(tmp_path),
+                                              max_workers=2, batch_size=2))
+    assert [result.index for result in render_results] == list(range(5))
+    assert all(result.ok for result in render_results), [result.error for result in render_results]
+
+    file_paths = [result.file_path for result in render_results]
+    # Файлы передаются в процессы пачками, но результаты идут в исходном порядке
+    results = list(iter_batch_results(file_paths, max_workers=2, chunksize=2))
+    assert [result.file_path for result in results] == file_paths
+    for result in results:
+        assert result.ok, result.error
+        assert (result.num_rows, result.num_cols) == (25, 9)
+
+
+def _fake_element(tag: str, x0: float, y0: float, x1: float, y1: float, text: str = "") -> SimpleNamespace:
+    return SimpleNamespace(tag=tag, text=text, layout=SimpleNamespace(x0=x0, y0=y0, x1=x1, y1=y1))
+
+
+def test_cell_contents_match_full_search():
+    rng = random.Random(0)
+    xs, ys = [100.0 + 20 * i for i in range(6)], [100.0 + 10 * i for i in range(8)]
+    # Как в отчёте, линии рисуются только между ячейками, а внешняя граница не рисуется
+    lines = [_fake_element("LTLine", xs[0], y, xs[-1], y) for y in ys[1:-1]]
+    lines += [_fake_element("LTLine", x, ys[0], x, ys[-1]) for x in xs[1:-1]]
+    texts = []
+    for i in range(300):
+        x0, y0 = rng.uniform(90, 220), rng.uniform(90, 180)
+        texts.append(_fake_element("LTTextLineHorizontal", x0, y0,
+                                   x0 + rng.uniform(0, 12), y0 + rng.uniform(0, 6), str(i)))
+
+    analyzer = TableReportAnalyzer()
+    analyzer.analyze(lines + texts)
+    cells = analyzer.page_object.table.cells
+
+    # Ожидаемый результат получаем полным перебором текстов для каждой ячейки
+    expected = [[next((text for text in texts
+                       if left <= text.layout.x0 and text.layout.x1 <= right
+                       and bottom <= text.layout.y0 and text.layout.y1 <= top), None)
+                 for left, right in zip(xs[:-1], xs[1:])]
+                for top, bottom in zip(ys[::-1][:-1], ys[::-1][1:])]
+    assert cells == expected
+
+
+def _detect_table_lines_by_loops(page_elements: list) -> tuple[list, list, dict, dict, tuple]:
+    """
+    Поиск линий таблицы и её границ перебором элементов, как до перехода на NumPy.
+    """
+    lines = [element for element in page_elements if element.tag == "LTLine"]
+    horizontal_lines = [line for line in lines if line.layout.y0 == line.layout.y1]
+    vertical_lines = [line for line in lines if line.layout.x0 == line.layout.x1]
+    horizontal_lines_by_y, vertical_lines_by_x = defaultdict(list), defaultdict(list)
+    for line in horizontal_lines:
+        horizontal_lines_by_y[line.layout.y0].append(line)
+    for line in vertical_lines:
+        vertical_lines_by_x[line.layout.x0].append(line)
+    min_x, min_y, max_x, max_y = 1e5, 1e5, 0.0, 0.0
+    for line in chain(horizontal_lines, vertical_lines):
+        min_x, max_x = min(min_x, line.layout.x0), max(max_x, line.layout.x1)
+        min_y, max_y = min(min_y, line.layout.y0), max(max_y, line.layout.y1)
+    return horizontal_lines, vertical_lines, horizontal_lines_by_y, vertical_lines_by_x, (min_x, min_y, max_x, max_y)
+
+
+def test_table_lines_match_loop_implementation():
+    rng = random.Random(0)
+    xs, ys = [100.0 + 20 * i for i in range(6)], [100.0 + 10 * i for i in range(8)]
+    # Линии сетки нарисованы отрезками между соседними пересечениями, в перемешанном порядке
+    elements = [_fake_element("LTLine", left, y, right, y) for y in ys for left, right in zip(xs[:-1], xs[1:])]
+    elements += [_fake_element("LTLine", x, bottom, x, top) for x in xs for bottom, top in zip(ys[:-1], ys[1:])]
+    # Диагональные линии не относятся к таблице, даже если выходят за её границы
+    elements += [_fake_element("LTLine", 50, 50, 250, 250), _fake_element("LTLine", 120, 175, 140, 185)]
+    # Линия нулевой длины считается и горизонтальной, и вертикальной, в том числе вне сетки
+    elements += [_fake_element("LTLine", 130, 130, 130, 130), _fake_element("LTLine", 90, 95, 90, 95)]
+    elements += [_fake_element("LTTextBoxHorizontal", 102, 102, 118, 108, "text ")]
+    rng.shuffle(elements)
+
+    horizontal_lines, vertical_lines, horizontal_lines_by_y, vertical_lines_by_x, table_rect = \
+        _detect_table_lines_by_loops(elements)
+    for coordinate_tolerance in (0.0, DEFAULT_COORDINATE_TOLERANCE):
+        analyzer = TableReportAnalyzer(coordinate_tolerance=coordinate_tolerance)
+        analyzer.analyze(elements)
+        table = analyzer.page_object.table
+        assert table.horizontal_lines == horizontal_lines
+        assert table.vertical_lines == vertical_lines
+        assert table.horizontal_lines_by_y == horizontal_lines_by_y
+        assert table.vertical_lines_by_x == vertical_lines_by_x
+        assert table.table_rect == table_rect
+
+
+def _analyze_page(page_elements) -> TableReportPage:
+    analyzer = TableReportAnalyzer()
+    analyzer.analyze(page_elements)
+    return analyzer.page_object
+
+
+def assert_same_page_object(expected: TableReportPage, actual: TableReportPage, strip_texts: bool = False) -> None:
+    """
+    Сравнивает положение таблицы, тексты ячеек и поля справочных сведений.
+
+    :param strip_texts: Сравнивать тексты без пробелов по краям: не все парсеры,
+        в отличие от pdfminer, добавляют пробел в конце строки.
+    """
+    def _texts(elements):
+        return [None if element is None else (element.text.strip() if strip_texts else element.text)
+                for element in elements]
+
+    assert actual.table.table_rect == pytest.approx(expected.table.table_rect)
+    assert [_texts(row) for row in actual.table.cells] == [_texts(row) for row in expected.table.cells]
+    assert [_texts((field.label, field.value)) for field in actual.legend.fields] == \
+        [_texts((field.label, field.value)) for field in expected.legend.fields]
+
+
+@pytest.mark.parametrize("create_parser, get_page_elements, strip_texts", [
+    pytest.param(lambda: RawPdfParser(INPUT_FILE_PATH),
+                 lambda parser: parser.get_all_page_elements(0), False, id="raw"),
+    pytest.param(lambda: RawPdfParser(INPUT_FILE_PATH),
+                 lambda parser: parser.get_page_store(0), False, id="element_store"),
+    pytest.param(lambda: OperatorPdfParser(INPUT_FILE_PATH),
+                 lambda parser: parser.get_all_page_elements(0), True, id="operators"),
+    pytest.param(lambda: BasicPdfParser(INPUT_FILE_PATH, adaptive_params=AdaptiveParams.create(
+                     element_tags=["LTTextLineHorizontal", "LTLine"])),
+                 lambda parser: parser.get_all_page_elements(0), False, id="adaptive"),
+])
+def test_parser_gives_same_page_object(table_page, create_parser, get_page_elements, strip_texts):
+    with create_parser() as parser:
+        page_object = _analyze_page(get_page_elements(parser))
+    assert_same_page_object(table_page, page_object, strip_texts)
+
+
+def test_element_store_matches_raw_elements():
+    with RawPdfParser(INPUT_FILE_PATH) as parser:
+        raw_elements = parser.get_all_page_elements(0)
+        store = parser.get_page_store(0)
+    assert [(element.tag, element.text, tuple(element.layout.bbox)) for element in raw_elements] == \
+        [(element.tag, element.text, element.layout.bbox) for element in store]
+    assert store.nbytes < 100 * len(store)
+
+
+def test_table_grid_with_coordinate_noise():
+    rng = random.Random(0)
+    xs, ys = [100.0 + 20 * i for i in range(6)], [100.0 + 10 * i for i in range(8)]
+
+    def _noise() -> float:
+        return rng.uniform(-0.01, 0.01)
+
+    # Каждая линия сетки нарисована отдельными отрезками по границам ячеек,
+    # и у каждого отрезка координаты немного отличаются
+    lines = []
+    for y in ys[1:-1]:
+        for left, right in zip(xs[:-1], xs[1:]):
+            line_y = y + _noise()
+            lines.append(_fake_element("LTLine", left + _noise(), line_y, right + _noise(), line_y + _noise() / 10))
+    for x in xs[1:-1]:
+        for bottom, top in zip(ys[:-1], ys[1:]):
+            line_x = x + _noise()
+            lines.append(_fake_element("LTLine", line_x, bottom + _noise(), line_x + _noise() / 10, top + _noise()))
+
+    analyzer = TableReportAnalyzer()
+    analyzer.analyze(lines)
+    table = analyzer.page_object.table
+    assert (table.num_rows, table.num_cols) == (len(ys) - 1, len(xs) - 1)
+    assert [len(lines) for lines in table.horizontal_lines_by_y.values()] == [len(xs) - 1] * (len(ys) - 2)
+    assert [len(lines) for lines in table.vertical_lines_by_x.values()] == [len(ys) - 1] * (len(xs) - 2)
+
+    exact_analyzer = TableReportAnalyzer(coordinate_tolerance=0.0)
+    exact_analyzer.analyze(lines)
+    exact_table = exact_analyzer.page_object.table
+    assert (exact_table.num_rows, exact_table.num_cols) != (table.num_rows, table.num_cols)
+
+
+def _fake_table(x0: float, y_top: float, rows: list[list[str]]) -> list[SimpleNamespace]:
+    """
+    Объекты таблицы, нарисованной так же, как в отчёте:
+    линии только между ячейками, текст в каждой непустой ячейке.
+    """
+    cell_width, cell_height = 20.0, 10.0
+    x1, y_bottom = x0 + cell_width * len(rows[0]), y_top - cell_height * len(rows)
+    elements = [_fake_element("LTLine", x0, y_top - cell_height * i, x1, y_top - cell_height * i)
+                for i in range(1, len(rows))]
+    elements += [_fake_element("LTLine", x0 + cell_width * i, y_bottom, x0 + cell_width * i, y_top)
+                 for i in range(1, len(rows[0]))]
+    for row_index, row in enumerate(rows):
+        for col_index, text in enumerate(row):
+            if not text:
+                continue
+            left, top = x0 + cell_width * col_index, y_top - cell_height * row_index
+            elements.append(_fake_element("LTTextBoxHorizontal", left + 2, top - 8, left + 18, top - 2, text + " "))
+    return elements
+
+
+def test_multi_page_tables_are_merged():
+    header = ["", "A", "B"]
+    first_table = [header, ["1", "a1", "b1"]]
+    long_table_part_1 = [header, ["1", "x1", "y1"], ["2", "x2", "y2"]]
+    long_table_part_2 = [header, ["3", "x3", "y3"]]
+    pages = [
+        (0, _fake_table(100, 500, first_table) + _fake_table(100, 300, long_table_part_1)),
+        (1, _fake_table(100, 500, long_table_part_2)),
+    ]
+
+    tables = list(MultiPageTableAnalyzer().analyze_pages(pages))
+    assert [table.page_indices for table in tables] == [[0], [0, 1]]
+    assert tables[0].rows == [[None, "A", "B"], ["1", "a1", "b1"]]
+    assert tables[1].rows == [[None, "A", "B"], ["1", "x1", "y1"], ["2", "x2", "y2"], ["3", "x3", "y3"]]
+
+
+def test_multi_page_analyzer_on_single_page_report(table_page):
+    parser = BasicPdfParser(INPUT_FILE_PATH)
+    tables = list(MultiPageTableAnalyzer().analyze_pages(parser.iter_pages()))
+    assert len(tables) == 1
+    assert (tables[0].num_rows, tables[0].num_cols) == (table_page.table.num_rows, table_page.table.num_cols)
+
+
+def test_text_straddling_table_left_border():
+    table_elements = _fake_table(100, 500, [["", "A", "B"], ["1", "a1", "b1"]])
+    title = _fake_element("LTTextBoxHorizontal", 20, 520, 60, 530, "Заголовок ")
+    # Текст начинается левее таблицы и заходит на неё, пары на той же строке у него нет
+    straddling_text = _fake_element("LTTextBoxHorizontal", 80, 482, 110, 488, "Метка ")
+    # Текст в первой колонке, выступающий за границу таблицы меньше, чем на допуск
+    overhanging_text = _fake_element("LTTextBoxHorizontal", 99.95, 472, 110, 478, "2 ")
+
+    analyzer = TableReportAnalyzer()
+    analyzer.analyze([*table_elements, title, straddling_text])
+    legend = analyzer.page_object.legend
+    assert legend.title is title
+    assert [(field.label, field.value) for field in legend.fields] == [(straddling_text, None)]
+
+    # Область одной таблицы анализируется без поиска справочных сведений
+    tables = list(MultiPageTableAnalyzer().analyze_pages([(0, [*table_elements, title, overhanging_text])]))
+    assert len(tables) == 1
+    assert tables[0].rows[0] == [None, "A", "B"]
+
+
+def _render_paginated_table(
+        file_path: str,
+        num_cols: int,
+        num_rows: int,
+        streamed: bool = False,
+        **renderer_params
+) -> tuple[TableData, list[str]]:
+    """
+    :return: Данные таблицы и пути к файлам отчёта. Если строки создаются по мере вывода,
+        то ожидаемые данные получаются повторной генерацией с тем же начальным значением.
+    """
+    random.seed(num_cols * num_rows)
+    expected_generator = TableReportDataGenerator()
+    expected_generator.create_random_data(num_cols=num_cols, num_rows=num_rows)
+    random.seed(num_cols * num_rows)
+    data_generator = TableReportDataGenerator()
+    data_generator.create_random_data(num_cols=num_cols, num_rows=num_rows, streamed=streamed)
+
+    renderer = TableReportRenderer(data_generator.data, file_path, landscape(A4), paginate=True, **renderer_params)
+    renderer.render_and_save()
+    return expected_generator.data.table_data, renderer.file_paths
+
+
+def _iter_files_pages(file_paths: list[str]) -> Iterator[tuple[int, list]]:
+    pages = chain.from_iterable(BasicPdfParser(file_path).iter_pages() for file_path in file_paths)
+    for page_index, (_, page_elements) in enumerate(pages):
+        yield page_index, page_elements
+
+
+def test_paginated_table_rows_are_merged(tmp_path):
+    file_path = str(tmp_path / "paginated.pdf")
+    table_data, file_paths = _render_paginated_table(file_path, num_cols=5, num_rows=60, streamed=True,
+                                                     max_pages_per_file=2)
+    assert file_paths == [file_path, str(tmp_path / "paginated_002.pdf")]
+
+    tables = list(MultiPageTableAnalyzer().analyze_pages(_iter_files_pages(file_paths)))
+    assert len(tables) == 1
+    assert len(tables[0].page_indices) == 3
+    expected_rows = [[None, *table_data.col_headers]]
+    expected_rows.extend([row_header, *row] for row_header, row in zip(table_data.row_headers, table_data.data))
+    assert tables[0].rows == expected_rows
+
+
+def test_paginated_table_files_are_bounded(tmp_path):
+    file_path = str(tmp_path / "paginated.pdf")
+    max_pages_per_file = 4
+    _, file_paths = _render_paginated_table(file_path, num_cols=3, num_rows=26 * 10, streamed=True,
+                                            batch_cells=True, max_pages_per_file=max_pages_per_file)
+    # 10 страниц при 4 страницах на файл: каждый файл сохраняется и освобождается, как только заполнен
+    assert file_paths == [file_path, str(tmp_path / "paginated_002.pdf"), str(tmp_path / "paginated_003.pdf")]
+    num_file_pages = []
+    for part_file_path in file_paths:
+        with open(part_file_path, "rb") as f:
+            num_file_pages.append(sum(1 for _ in PDFPage.get_pages(f)))
+    assert num_file_pages == [4, 4, 2]
+
+
+def test_paginated_table_columns_are_split(tmp_path):
+    file_path = str(tmp_path / "paginated.pdf")
+    table_data, _ = _render_paginated_table(file_path, num_cols=20, num_rows=30)
+
+    pages = [_analyze_page(page_elements) for _, page_elements in BasicPdfParser(file_path).iter_pages()]
+    # Колонки разбиваются на 3 части, строки - на 2, сначала идут все колонки первых строк
+    assert len(pages) == 3 * 2
+    col_headers = [cell.text.strip() for page in pages[:3] for cell in page.table.cells[0][1:]]
+    assert col_headers == table_data.col_headers
+    first_row_headers = [page.table.cells[1][0].text.strip() for page in pages]
+    assert first_row_headers == [table_data.row_headers[0]] * 3 + [table_data.row_headers[26]] * 3
+
+
+def test_batched_cells_give_same_page_object(tmp_path):
+    data_generator = TableReportDataGenerator()
+    data_generator.create_random_data()
+    page_objects = []
+    for batch_cells in (False, True):
+        file_path = str(tmp_path / f"batch_cells_{batch_cells}.pdf")
+        TableReportRenderer(data_generator.data, file_path, landscape(A4), batch_cells=batch_cells).render_and_save()
+        with BasicPdfParser(file_path) as parser:
+            page_objects.append(_analyze_page(parser.get_all_page_elements(0)))
+    assert_same_page_object(*page_objects)